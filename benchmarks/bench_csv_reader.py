@@ -0,0 +1,102 @@
+"""
+Benchmark for raw CSV readers in the intermediate layer.
+
+Compares the pandas reader (with type inference and `pd.to_datetime`
+casting) against the pyarrow reader with a declared schema, on a wide
+CSV (many columns) and a tall CSV (many rows).
+
+Usage: python -m benchmarks.bench_csv_reader --rows 2000000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.intermediate.nodes import read_csv
+
+
+def make_csv(path: Path, n_rows: int, n_metrics: int, seed: int = 0) -> Dict[str, str]:
+    """
+    Write a synthetic raw CSV shaped like consumer.csv.
+
+    :param path: Path to write the CSV to
+    :param n_rows: Number of rows
+    :param n_metrics: Number of float metric columns
+    :param seed: Random seed
+    :return: Schema declaring the types of the generated columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2015-01-01", periods=n_rows // 100 + 1, freq="D")
+
+    df = pd.DataFrame(
+        {
+            "consumer_id": rng.integers(0, 100, n_rows),
+            "Date": dates[np.arange(n_rows) // 100].strftime("%Y-%m-%d"),
+            "Timestamp": (
+                dates[np.arange(n_rows) // 100] + pd.Timedelta(hours=18)
+            ).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    )
+    metrics_df = pd.DataFrame(
+        rng.normal(size=(n_rows, n_metrics)).round(4),
+        columns=[f"Metric{i}" for i in range(n_metrics)],
+    )
+    pd.concat([df, metrics_df], axis=1).to_csv(path)
+
+    schema = {
+        "consumer_id": "int64",
+        "Date": "timestamp[ns]",
+        "Timestamp": "timestamp[ns]",
+    }
+    schema.update({f"Metric{i}": "double" for i in range(n_metrics)})
+
+    return schema
+
+
+def time_readers(path: Path, schema: Dict[str, str]) -> None:
+    """
+    Time both readers on a CSV and check that they agree.
+
+    :param path: Path to the CSV
+    :param schema: Schema declaring column types for the pyarrow reader
+    """
+    start = time.perf_counter()
+    pandas_df = read_csv(path)
+    for col in ["Date", "Timestamp"]:
+        pandas_df[col] = pd.to_datetime(pandas_df[col])
+    pandas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    arrow_df = read_csv(path, schema)
+    arrow_time = time.perf_counter() - start
+
+    assert_frame_equal(pandas_df, arrow_df)
+
+    size_mb = path.stat().st_size / 1e6
+    print(f"{path.stem}: {pandas_df.shape}, {size_mb:.0f} MB")
+    print(f"  pandas:  {pandas_time:.2f}s")
+    print(f"  pyarrow: {arrow_time:.2f}s ({pandas_time / arrow_time:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, n_rows, n_metrics in [
+            ("wide", args.rows // 20, 200),
+            ("tall", args.rows, 3),
+        ]:
+            path = Path(tmp_dir) / f"{name}.csv"
+            schema = make_csv(path, n_rows, n_metrics)
+            time_readers(path, schema)
+
+
+if __name__ == "__main__":
+    main()
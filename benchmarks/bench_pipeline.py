@@ -0,0 +1,338 @@
+"""
+Benchmark suite timing and memory-profiling every pipeline node.
+
+Generates synthetic raw data, see `benchmarks.synthetic_data`, runs each node
+of the intermediate, primary, and feature layers in order, then loads the
+dashboard and calls each of its callbacks. Every node runs in a fresh worker
+process, which reports its wall time, CPU time, and peak resident memory above
+its start. Results are written as JSON, keyed by node, together with the commit
+and parameters they were measured at, so that runs of different commits can be
+compared offline with --baseline.
+
+Usage: python -m benchmarks.bench_pipeline --companies 500 --years 5
+       --baseline benchmarks/results/<commit>.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.synthetic_data import make_raw_data
+from src.feature.pipeline import get_feature_steps
+from src.intermediate.nodes import preprocess_raw_data
+from src.intermediate.pipeline import get_intermediate_steps
+from src.io import run_node
+from src.metrics import peak_memory, reset_peak_memory
+from src.primary.pipeline import get_primary_steps
+
+DATA_DIRS = [
+    "data/01_raw",
+    "data/02_intermediate",
+    "data/03_primary",
+    "data/04_feature",
+]
+METRICS = ["wall_seconds", "cpu_seconds", "peak_mib"]
+
+
+def measure(function: Callable, *args: Any) -> Dict[str, Optional[float]]:
+    """
+    Call a function and measure its wall time, CPU time, and memory growth.
+
+    :param function: Function to call
+    :param args: Arguments to call it with
+    :return: Wall and CPU seconds, and peak resident memory above the start of
+        the call in MiB, None if peak memory can't be read on this platform
+    """
+    reset_peak_memory()
+    start_memory = peak_memory()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    function(*args)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+    end_memory = peak_memory()
+    return dict(
+        wall_seconds=wall,
+        cpu_seconds=cpu,
+        peak_mib=(
+            (end_memory - start_memory) / 1024**2
+            if start_memory is not None and end_memory is not None
+            else None
+        ),
+    )
+
+
+def measure_dashboard(repeat: int) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Load the dashboard and call each of its callbacks.
+
+    Dash and plotly are imported and warmed up first, so that the startup and
+    first calls measure the dashboard rather than the libraries.
+
+    :param repeat: Number of memoized calls per callback after the first one,
+        the median of each metric is kept
+    :return: Measurements of the dashboard startup and of each callback
+    """
+    import dash  # noqa: F401
+    import plotly.express
+
+    # Plotly validates figures with lazily built validators, build them too
+    plotly.express.imshow([[0.0]]).to_dict()
+
+    results = {}
+    results["dashboard[startup]"] = measure(
+        importlib.import_module, "src.reporting.dashboard"
+    )
+    dashboard = importlib.import_module("src.reporting.dashboard")
+
+    # Query the first companies over the whole date range
+    companies = dashboard.agg_companies[:5]
+    labels = dashboard.agg_dt_labels["M"]
+    calls = {
+        "update_corr_heatmap": (
+            dashboard.corr_companies[0],
+            dashboard.min_date,
+            dashboard.max_date,
+        ),
+        "update_historical_trend": (
+            companies,
+            "M",
+            "price_mean",
+            dashboard.min_date,
+            dashboard.max_date,
+        ),
+        "update_datapoint_dropdown_options": ("M",),
+        "update_comparison_chart": (
+            companies[0],
+            "M",
+            "price_mean",
+            labels[0],
+            labels[-1],
+        ),
+        "update_screener": (
+            "price_mean_prev_pct",
+            "Q",
+            dashboard.agg_dt_labels["Q"][-1],
+            "top",
+            20,
+        ),
+        "update_company_corr_heatmap": (
+            "price",
+            [],
+            "cluster",
+            dashboard.min_date,
+            dashboard.max_date,
+        ),
+        "update_rolling_chart": (
+            companies,
+            "price_volatility_63",
+            dashboard.min_date,
+            dashboard.max_date,
+        ),
+    }
+    # The first call computes results, later calls measure memoized lookups
+    for name, args in calls.items():
+        callback = getattr(dashboard, name)
+        results[f"dashboard[{name}]"] = measure(callback, *args)
+        if not hasattr(callback, "cache_info"):
+            continue
+
+        runs = [measure(callback, *args) for _ in range(repeat)]
+        results[f"dashboard[{name}:memoized]"] = {
+            metric: (
+                statistics.median(run[metric] for run in runs)
+                if runs[0][metric] is not None
+                else None
+            )
+            for metric in METRICS
+        }
+
+    return results
+
+
+def run_suite(repeat: int) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Run every pipeline node in order, then the dashboard, each in a fresh
+    worker process, from a directory holding synthetic raw data.
+
+    :param repeat: Number of memoized calls per dashboard callback
+    :return: Measurements by node
+    """
+    nodes = [(preprocess_raw_data, step) for step in get_intermediate_steps()]
+    nodes += [(run_node, step) for step in get_primary_steps()]
+    nodes += [(run_node, step) for step in get_feature_steps()]
+
+    results = {}
+    for runner, step in nodes:
+        function = step.get("function", runner)
+        name = f"{function.__name__}[{Path(step['output']).stem}]"
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[name] = executor.submit(measure, runner, step).result()
+        print(f"{name}: {_format(results[name])}")
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        dashboard_results = executor.submit(measure_dashboard, repeat).result()
+    for name, result in dashboard_results.items():
+        print(f"{name}: {_format(result)}")
+
+    return {**results, **dashboard_results}
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    params: Dict[str, Any],
+    baseline: Dict[str, Any],
+) -> None:
+    """
+    Print the ratio of each measurement to a baseline run of the suite.
+
+    :param results: Measurements by node
+    :param params: Parameters the suite was run with
+    :param baseline: Baseline run, as written to the JSON output
+    """
+    print(f"\nCompared to {baseline.get('commit')} (ratio to baseline):")
+    if baseline.get("params") != params:
+        print(f"  warning: baseline was run with {baseline.get('params')}")
+
+    for name, result in results.items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            print(f"  {name}: not in baseline")
+            continue
+
+        ratios = []
+        for metric in METRICS:
+            value, baseline_value = result[metric], baseline_result.get(metric)
+            ratio = value / baseline_value if value and baseline_value else None
+            ratios.append(f"{metric} {ratio:.2f}x" if ratio else f"{metric} n/a")
+        print(f"  {name}: {', '.join(ratios)}")
+
+
+def _format(result: Dict[str, Optional[float]]) -> str:
+    """
+    Format measurements for printing.
+
+    :param result: Measurements of a node
+    :return: Human-readable measurements
+    """
+    peak = result["peak_mib"]
+    return f"{result['wall_seconds']:.3f}s wall, {result['cpu_seconds']:.3f}s CPU, " + (
+        f"{peak:.1f} MiB peak" if peak is not None else "peak n/a"
+    )
+
+
+def _git_commit() -> Optional[str]:
+    """
+    Look up the commit being benchmarked.
+
+    :return: Commit hash, with a "-dirty" suffix if the tree has local
+        changes, None outside of a git checkout
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return f"{commit}-dirty" if status.strip() else commit
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--restatement-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of memoized calls per dashboard callback",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="JSON file to write results to (default: benchmarks/results/<commit>.json)",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="JSON results to compare against"
+    )
+    args = parser.parse_args()
+
+    params = dict(
+        companies=args.companies,
+        years=args.years,
+        restatement_rate=args.restatement_rate,
+        seed=args.seed,
+        repeat=args.repeat,
+    )
+    commit = _git_commit()
+    output = args.output or Path("benchmarks/results") / f"{commit or 'unknown'}.json"
+    output = output.resolve()
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+
+    # Nodes read and write paths relative to the working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for data_dir in DATA_DIRS:
+                Path(data_dir).mkdir(parents=True)
+            n_rows = make_raw_data(
+                Path("data/01_raw"),
+                args.companies,
+                args.years,
+                args.restatement_rate,
+                args.seed,
+            )
+            print(f"Raw data: {n_rows}")
+            results = run_suite(args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            dict(
+                commit=commit,
+                created=datetime.now().isoformat(timespec="seconds"),
+                params=params,
+                rows=n_rows,
+                versions=dict(
+                    python=platform.python_version(),
+                    pandas=pd.__version__,
+                    pyarrow=pa.__version__,
+                ),
+                cpu_count=os.cpu_count(),
+                results=results,
+            ),
+            indent=2,
+        )
+    )
+    print(f"Results written to {output}")
+
+    if baseline is not None:
+        compare(results, params, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark for peak memory of pipeline nodes run by `src.io.run_node`.
+
+Runs the feature layer join on synthetic primary layer data, once reading
+whole inputs into consolidated DataFrames and once in copy-free mode, reading
+only declared columns into per-column blocks. Each run happens in a fresh
+worker process, whose peak resident memory is reported.
+
+Usage: python -m benchmarks.bench_run_node --companies 2000 --days 2500
+"""
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+from src.feature.nodes import fea_join_all
+from src.io import run_node, write_feather
+from src.metrics import peak_memory, reset_peak_memory
+
+
+def make_primary_data(data_dir: Path, n_companies: int, n_days: int) -> None:
+    """
+    Write synthetic primary layer outputs, sorted as by the primary layer.
+
+    :param data_dir: Directory to write consumer, prices, and web data to
+    :param n_companies: Number of companies
+    :param n_days: Number of days per company
+    """
+    rng = np.random.default_rng(0)
+    companies = np.repeat(np.arange(n_companies), n_days)
+    n_rows = len(companies)
+
+    base_df = pd.DataFrame(
+        {
+            "consumer_id": companies + 1,
+            "date": pd.Timestamp("2010-01-01")
+            + pd.to_timedelta(np.tile(np.arange(n_days), n_companies), unit="D"),
+            "price_id": companies + 1001,
+            "web_id": companies + 2001,
+            "company_name": [f"Company {i:05d}" for i in companies],
+            "symbol": [f"S{i:05d}" for i in companies],
+        }
+    )
+    metrics = {
+        "consumer": dict(
+            credit_card_spend=rng.normal(1e5, 1e4, n_rows).round(2),
+            transaction_count=rng.integers(0, 1000, n_rows),
+        ),
+        "prices": dict(price=rng.normal(100, 10, n_rows).round(2)),
+        "web": dict(website_visits=rng.integers(0, 100_000, n_rows)),
+    }
+    for source, columns in metrics.items():
+        write_feather(
+            base_df.assign(**columns),
+            data_dir / f"{source}.feather",
+            sort_cols=["company_name", "date", "consumer_id"],
+        )
+
+
+def measure_node(step: Dict[str, Any]) -> int:
+    """
+    Run a node and measure the growth of resident memory it caused.
+
+    :param step: Step dictionary passed on to `run_node`
+    :return: Peak resident memory above the start of the node, in bytes
+    """
+    reset_peak_memory()
+    start_memory = peak_memory()
+    run_node(step)
+
+    return peak_memory() - start_memory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=2500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = Path(tmp_dir)
+        make_primary_data(data_dir, args.companies, args.days)
+
+        step = dict(
+            function=fea_join_all,
+            inputs=[
+                data_dir / f"{source}.feather"
+                for source in ["consumer", "prices", "web"]
+            ],
+            output=data_dir / "master_df.feather",
+            input_columns={
+                data_dir
+                / "prices.feather": ["company_name", "date", "consumer_id", "price"],
+                data_dir
+                / "web.feather": [
+                    "company_name",
+                    "date",
+                    "consumer_id",
+                    "website_visits",
+                ],
+            },
+        )
+        print(f"fea_join_all: {args.companies * args.days:,} rows per input")
+        for copy_free in [False, True]:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                peak = executor.submit(measure_node, dict(step, copy_free=copy_free))
+                print(f"  copy_free={copy_free}: {peak.result() / 1024**2:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Synthetic raw data generator for benchmarks.
+
+Writes consumer.csv, prices.csv, web.csv, and sec_master.csv shaped like the
+files in data/01_raw, with one row per company and business day, shuffled,
+plus restatements: copies of random rows received a day later with revised
+values, which the primary layer resolves by keeping the latest ones.
+
+Usage: python -m benchmarks.synthetic_data --companies 500 --years 5
+"""
+import argparse
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+def make_raw_data(
+    raw_dir: Path,
+    n_companies: int = 100,
+    n_years: int = 3,
+    restatement_rate: float = 0.01,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """
+    Write synthetic raw CSV files.
+
+    :param raw_dir: Directory to write the CSV files to
+    :param n_companies: Number of companies
+    :param n_years: Number of years of business days
+    :param restatement_rate: Share of rows restated with revised values
+    :param seed: Random seed
+    :return: Number of rows written to each file, by file name
+    """
+    rng = np.random.default_rng(seed)
+    raw_dir.mkdir(parents=True, exist_ok=True)
+
+    # Format each date once and broadcast it to rows via codes
+    dates = pd.bdate_range(end="2023-12-29", periods=n_years * 261)
+    date_labels = np.asarray(dates.strftime("%Y-%m-%d"), dtype=object)
+    timestamp_labels = np.asarray(
+        (dates + pd.Timedelta(hours=18)).strftime("%Y-%m-%d %H:%M:%S"), dtype=object
+    )
+    restated_labels = np.asarray(
+        (dates + pd.Timedelta(days=1, hours=9)).strftime("%Y-%m-%d %H:%M:%S"),
+        dtype=object,
+    )
+    companies = np.repeat(np.arange(n_companies), len(dates))
+    date_codes = np.tile(np.arange(len(dates)), n_companies)
+    n_rows = len(companies)
+
+    # Each company follows its own level, with daily noise
+    levels = rng.lognormal(0, 1, n_companies)[companies]
+    sources = {
+        "consumer": (
+            "consumer_id",
+            1,
+            dict(
+                CreditCardSpend=(levels * rng.normal(1e5, 1e4, n_rows)).round(2),
+                TransactionCount=rng.poisson(levels * 500),
+            ),
+        ),
+        "prices": (
+            "price_id",
+            1001,
+            dict(Price=(levels * rng.normal(100, 5, n_rows)).round(2)),
+        ),
+        "web": (
+            "web_id",
+            2001,
+            dict(WebsiteVisits=rng.poisson(levels * 1e5)),
+        ),
+    }
+
+    n_written = {}
+    for source, (id_col, first_id, metrics) in sources.items():
+        df = pd.DataFrame(
+            {
+                id_col: companies + first_id,
+                "Date": date_labels[date_codes],
+                "Timestamp": timestamp_labels[date_codes],
+                **metrics,
+            }
+        )
+
+        # Restate random rows a day later, revising their values
+        restated = rng.random(n_rows) < restatement_rate
+        restated_df = df[restated].copy()
+        restated_df["Timestamp"] = restated_labels[date_codes[restated]]
+        for col, values in metrics.items():
+            revision = rng.normal(1, 0.05, restated.sum())
+            restated_df[col] = (
+                (values[restated] * revision)
+                .round(2 if values.dtype.kind == "f" else 0)
+                .astype(values.dtype)
+            )
+
+        df = pd.concat([df, restated_df], ignore_index=True)
+        df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+        df.to_csv(raw_dir / f"{source}.csv")
+        n_written[f"{source}.csv"] = len(df)
+
+    sec_master_df = pd.DataFrame(
+        {
+            "consumer_id": np.arange(n_companies) + 1,
+            "price_id": np.arange(n_companies) + 1001,
+            "web_id": np.arange(n_companies) + 2001,
+            "CompanyName": [f"Company {i + 1:04d}" for i in range(n_companies)],
+            "Symbol": [f"S{i + 1:04d}" for i in range(n_companies)],
+        }
+    )
+    sec_master_df.to_csv(raw_dir / "sec_master.csv")
+    n_written["sec_master.csv"] = len(sec_master_df)
+
+    return n_written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--restatement-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("data/01_raw"))
+    args = parser.parse_args()
+
+    n_written = make_raw_data(
+        args.output, args.companies, args.years, args.restatement_rate, args.seed
+    )
+    for name, n_rows in n_written.items():
+        print(f"{args.output / name}: {n_rows:,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Content-hash cache for pipeline node outputs.
+
+A node is keyed on the content hashes of its input files, the identity
+of its function, the sources of the project modules it depends on, and
+its parameters. When a node runs again with the same key, its output is
+restored from the cache instead of being recomputed. Entries are tracked
+in an on-disk manifest and evicted least recently used first once the
+cache exceeds its size budget.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import sysconfig
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import FunctionType, ModuleType
+from typing import Any, Callable, Dict, Iterator, List, Union
+
+DEFAULT_CACHE_DIR = Path("data/.cache")
+DEFAULT_MAX_BYTES = 10 * 1024**3
+
+
+def run_cached(
+    runner: Callable[[Dict[str, Any]], None],
+    args: Dict[str, Any],
+    cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> bool:
+    """
+    Run a pipeline node unless its output is already cached for the same
+    inputs, function, and parameters.
+
+    :param runner: Function running the node, e.g., run_node or preprocess_raw_data
+    :param args: Step dictionary passed on to the runner
+    :param cache_dir: Directory holding cached outputs and the manifest
+    :param max_bytes: Size budget of the cache, least recently used entries
+        are evicted beyond it
+    :return: True if the output was restored from the cache, False if the node ran
+    """
+    cache_dir = Path(cache_dir)
+    output = Path(args["output"])
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Hash inputs outside of the lock, reusing hashes of unchanged files
+    file_hashes = _read_manifest(cache_dir)["files"]
+    key = _node_key(runner, args, file_hashes)
+
+    with _locked_manifest(cache_dir) as manifest:
+        manifest["files"].update(file_hashes)
+        entry = manifest["entries"].get(key)
+        if entry is not None:
+            entry["last_used"] = time.time()
+
+    if entry is not None:
+        try:
+            _copy(cache_dir / key, output)
+            return True
+        except FileNotFoundError:
+            # Entry was evicted in the meantime, fall back to running the node
+            pass
+
+    runner(dict(args))
+
+    # Stage the copy before registering it, so readers never see partial entries
+    staging_path = cache_dir / f"{key}.{os.getpid()}.tmp"
+    _copy(output, staging_path)
+
+    with _locked_manifest(cache_dir) as manifest:
+        _remove(cache_dir / key)
+        staging_path.rename(cache_dir / key)
+        manifest["entries"][key] = dict(
+            output=str(output),
+            bytes=path_size(cache_dir / key),
+            last_used=time.time(),
+        )
+        _evict(cache_dir, manifest, max_bytes)
+
+    return False
+
+
+def path_size(path: Path, missing_ok: bool = False) -> int:
+    """
+    Get the size of a file, or the total size of files in a directory.
+
+    :param path: File or directory
+    :param missing_ok: Whether a missing path has size 0, rather than raising
+    :return: Size in bytes
+    :raises FileNotFoundError: If the path doesn't exist, unless missing_ok
+    """
+    if path.is_dir():
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    if missing_ok and not path.exists():
+        return 0
+
+    return path.stat().st_size
+
+
+def _node_key(
+    runner: Callable[[Dict[str, Any]], None],
+    args: Dict[str, Any],
+    file_hashes: Dict[str, Any],
+) -> str:
+    """
+    Build the cache key of a node.
+
+    :param runner: Function running the node
+    :param args: Step dictionary of the node
+    :param file_hashes: Memoized file hashes, updated with newly hashed files
+    :return: Hex digest identifying the node's inputs, function, and parameters
+    """
+    function = args.get("function", runner)
+    inputs = args["inputs"] if "inputs" in args else [args["input"]]
+    # Worker counts, e.g., handed out by `src.scheduler.run_dag`, change how a
+    # node runs but not its output
+    params = {
+        name: value
+        for name, value in args.items()
+        if name not in ["function", "inputs", "input", "output", "max_workers"]
+    }
+
+    key = dict(
+        runner=_function_version(runner),
+        function=_function_version(function),
+        inputs=[_file_hash(Path(path), file_hashes) for path in inputs],
+        params=_normalize(params),
+        output=str(args["output"]),
+    )
+
+    return hashlib.sha256(
+        json.dumps(key, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    """
+    Convert dictionary keys to strings, e.g., paths keying `input_columns`,
+    so that parameters can be serialized into the cache key.
+
+    :param value: Parameter value
+    :return: Value with string keys in all nested dictionaries
+    """
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+
+    return value
+
+
+def _function_version(function: Callable) -> str:
+    """
+    Identify a function by its name and the sources of its module and of the
+    project modules it imports, directly or through other project modules, so
+    that edits to the function or to the helpers it calls, wherever they live
+    in the project, invalidate the cache.
+
+    :param function: Function to identify
+    :return: Qualified name and source hash of the function
+    """
+    digest = hashlib.sha256()
+    for path in _project_sources(function):
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+
+    return f"{function.__module__}.{function.__qualname__}:{digest.hexdigest()}"
+
+
+def _project_sources(function: Callable) -> List[Path]:
+    """
+    Find the source files of a function's module and of the modules it
+        imports transitively, leaving out the standard library and installed
+        packages, whose versions don't change between runs of the pipeline.
+
+    Imports are found through the modules, functions, and classes bound in
+    each module's namespace, so imports within function bodies aren't followed.
+
+    :param function: Function to find the sources of
+    :return: Sorted paths to the source files, which include the function's own
+    """
+    installed = [
+        Path(sysconfig.get_paths()[name]).resolve()
+        for name in ["stdlib", "platstdlib", "purelib", "platlib"]
+    ]
+
+    sources = {Path(inspect.getsourcefile(function)).resolve()}
+    modules, seen = [inspect.getmodule(function)], set()
+    while modules:
+        module = modules.pop()
+        if module is None or module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+
+        path = getattr(module, "__file__", None)
+        if path is None or not path.endswith(".py"):
+            continue
+        path = Path(path).resolve()
+        if any(directory in path.parents for directory in installed):
+            continue
+        sources.add(path)
+
+        # Follow imported modules and the modules of imported functions and classes
+        for value in vars(module).values():
+            if isinstance(value, ModuleType):
+                modules.append(value)
+            elif isinstance(value, (FunctionType, type)):
+                modules.append(sys.modules.get(value.__module__))
+
+    return sorted(sources)
+
+
+def _file_hash(path: Path, file_hashes: Dict[str, Any]) -> str:
+    """
+    Hash the content of a file, or of all files in a directory. Hashes are
+    memoized and reused while the size and mtime of a file are unchanged.
+
+    :param path: Path to the file or directory
+    :param file_hashes: Memoized file hashes, updated with newly hashed files
+    :return: Hex digest of the content
+    """
+    files = sorted(path.rglob("*")) if path.is_dir() else [path]
+
+    digest = hashlib.sha256()
+    for file in files:
+        if file.is_dir():
+            continue
+
+        stat = file.stat()
+        memo = file_hashes.get(str(file))
+        if memo is None or [memo["size"], memo["mtime_ns"]] != [
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]:
+            file_digest = hashlib.sha256()
+            with open(file, "rb") as f:
+                for block in iter(lambda: f.read(1024**2), b""):
+                    file_digest.update(block)
+            memo = dict(
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                sha256=file_digest.hexdigest(),
+            )
+            file_hashes[str(file)] = memo
+
+        digest.update(f"{file.relative_to(path.parent)}:{memo['sha256']}".encode())
+
+    return digest.hexdigest()
+
+
+def _evict(cache_dir: Path, manifest: Dict[str, Any], max_bytes: int) -> None:
+    """
+    Evict least recently used entries until the cache fits its size budget.
+
+    :param cache_dir: Directory holding cached outputs
+    :param manifest: Cache manifest
+    :param max_bytes: Size budget of the cache
+    """
+    entries = manifest["entries"]
+    total_bytes = sum(entry["bytes"] for entry in entries.values())
+
+    for key in sorted(entries, key=lambda key: entries[key]["last_used"]):
+        if total_bytes <= max_bytes:
+            break
+        total_bytes -= entries.pop(key)["bytes"]
+        _remove(cache_dir / key)
+
+
+@contextmanager
+def _locked_manifest(
+    cache_dir: Path, timeout: float = 600.0
+) -> Iterator[Dict[str, Any]]:
+    """
+    Load the cache manifest under an exclusive lock shared across processes,
+    and save it back on exit.
+
+    :param cache_dir: Directory holding the manifest
+    :param timeout: Seconds after which a lock is considered stale
+    :return: Manifest with 'entries' and memoized 'files' hashes
+    """
+    lock_path = cache_dir / "manifest.lock"
+    manifest_path = cache_dir / "manifest.json"
+
+    # Creating the lock file is atomic, so only one process can hold it
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > timeout:
+                    lock_path.unlink()
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+
+    try:
+        manifest = _read_manifest(cache_dir)
+        yield manifest
+
+        # Write then rename, so that an interrupted write can't corrupt it
+        tmp_path = manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest))
+        tmp_path.replace(manifest_path)
+    finally:
+        lock_path.unlink()
+
+
+def _read_manifest(cache_dir: Path) -> Dict[str, Any]:
+    """
+    Read the cache manifest, or an empty one if there's none yet.
+
+    :param cache_dir: Directory holding the manifest
+    :return: Manifest with 'entries' and memoized 'files' hashes
+    """
+    manifest_path = cache_dir / "manifest.json"
+    if not manifest_path.exists():
+        return dict(entries={}, files={})
+
+    return json.loads(manifest_path.read_text())
+
+
+def _copy(source: Path, destination: Path) -> None:
+    """
+    Copy a file or directory, replacing the destination if it exists. The copy
+    is written next to the destination first and then renamed over it, so that
+    processes memory-mapping the previous file keep reading it unharmed.
+
+    :param source: File or directory to copy
+    :param destination: Path to copy to
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    _remove(tmp_path)
+    try:
+        if source.is_dir():
+            # Directories can't be renamed over non-empty ones, swap them instead
+            shutil.copytree(source, tmp_path)
+            old_path = tmp_path.with_suffix(".old")
+            _remove(old_path)
+            if destination.exists():
+                destination.rename(old_path)
+            tmp_path.rename(destination)
+            _remove(old_path)
+        else:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+    finally:
+        _remove(tmp_path)
+
+
+def _remove(path: Path) -> None:
+    """
+    Remove a file or directory if it exists.
+
+    :param path: File or directory to remove
+    """
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
@@ -11,9 +11,17 @@ given we are directly serving the reporting layer,
 this is the last step of the DE pipeline
 """
 
-from typing import List
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import combinations
+from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+# Metrics of the master DataFrame that rolling features and pivots cover by default
+DEFAULT_METRICS = ("credit_card_spend", "price", "website_visits")
 
 
 def fea_join_all(
@@ -22,6 +30,10 @@ def fea_join_all(
     """
     Join consumer, prices, and web data together into a master DataFrame.
 
+    When all inputs are sorted by company_name, date, and consumer_id, as
+    recorded in `df.attrs['sorted_by']` by the primary layer, they are joined
+    in one ordered pass, without hash tables or a final sort.
+
     :param pri_consumer: DataFrame containing primary layer consumer data
     :param pri_prices: DataFrame containing primary layer prices data
     :param pri_web: DataFrame containing primary layer web data
@@ -30,44 +42,876 @@ def fea_join_all(
     """
     # Remove duplicated columns and join keys
     duplicated_cols = ["company_name", "symbol", "price_id", "web_id"]
-    pri_prices.drop(columns=duplicated_cols, inplace=True)
-    pri_web.drop(columns=duplicated_cols, inplace=True)
+    join_cols = ["consumer_id", "date"]
 
     # Merge all data together and leave it to reporting layer for filtering
-    join_cols = ["consumer_id", "date"]
-    master_df = pri_consumer.merge(pri_prices, how="inner", on=join_cols).merge(
-        pri_web, how="inner", on=join_cols
-    )
+    master_df = None
+    if all(
+        df.attrs.get("sorted_by") == ["company_name", "date", "consumer_id"]
+        for df in [pri_consumer, pri_prices, pri_web]
+    ):
+        master_df = _merge_sorted(
+            pri_consumer, [pri_prices, pri_web], duplicated_cols + join_cols
+        )
 
-    # Remove redundant columns
-    master_df.drop(columns=["price_id", "web_id", "consumer_id"], inplace=True)
+    if master_df is None:
+        pri_prices.drop(columns=duplicated_cols, inplace=True, errors="ignore")
+        pri_web.drop(columns=duplicated_cols, inplace=True, errors="ignore")
+        master_df = (
+            pri_consumer.merge(pri_prices, how="inner", on=join_cols)
+            .merge(pri_web, how="inner", on=join_cols)
+            .sort_values(["company_name", "date"])
+        )
 
-    return master_df.sort_values(["company_name", "date"]).reset_index(drop=True)
+    # Remove redundant columns, which may not have been read in the first place
+    master_df.drop(
+        columns=["price_id", "web_id", "consumer_id"], inplace=True, errors="ignore"
+    )
+    master_df.reset_index(drop=True, inplace=True)
+
+    return master_df
 
 
-def fea_aggregate(master_df: pd.DataFrame, frequencies: List[str]) -> pd.DataFrame:
+def fea_aggregate(
+    master_df: pd.DataFrame,
+    frequencies: List[str],
+    engine: str = "groupby",
+    executor: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    n_shards: Optional[int] = None,
+    deltas: Optional[List[str]] = None,
+) -> pd.DataFrame:
     """
     Aggregate the master DataFrame at specified frequencies and
         add datetime indicators for reporting purposes.
 
+    Aggregates of different companies are independent, so with an executor,
+    the master DataFrame is partitioned into shards of contiguous companies,
+    shards are aggregated in parallel, and their outputs are concatenated
+    in company order, which leaves the result unchanged.
+
     :param master_df: The master DataFrame containing all data
     :param frequencies: List of aggregation frequencies, e.g., ['Y', 'Q', 'M', 'W']
+    :param engine: 'groupby' to scan the master DataFrame once per frequency,
+        or 'rollup' to scan it once for daily partials and roll those up
+    :param executor: Optional 'process' to aggregate shards in a process pool,
+        or 'thread' to aggregate them in a thread pool, which saves copying
+        shards to workers but only runs in parallel where pandas and numpy
+        release the GIL (default: aggregate in a single pass)
+    :param max_workers: Maximum number of workers (default: CPU count)
+    :param n_shards: Number of company shards (default: one per worker)
+    :param deltas: Aggregation stats to add period-over-period deltas of,
+        e.g., ['mean'], see `_add_period_deltas` (default: none)
     :return: The aggregated DataFrame, sorted by company_name, agg_freq, and date
+    :raises ValueError: If the engine or executor is not supported
     """
+    if executor not in [None, "process", "thread"]:
+        raise ValueError(f"Unsupported aggregation executor: {executor}")
+
+    if executor is not None:
+        shard_dfs = _shard_by_company(
+            master_df, n_shards or max_workers or os.cpu_count() or 1
+        )
+        if len(shard_dfs) > 1:
+            return _aggregate_shards(
+                shard_dfs, frequencies, engine, executor, max_workers, deltas
+            )
+
     # Gather each dataframe aggregated at each frequency
-    agg_dfs = [_aggregate_by_freq(master_df, freq) for freq in frequencies]
+    if engine == "groupby":
+        agg_dfs = [_aggregate_by_freq(master_df, freq) for freq in frequencies]
+    elif engine == "rollup":
+        agg_dfs = _aggregate_by_rollup(master_df, frequencies)
+    else:
+        raise ValueError(f"Unsupported aggregation engine: {engine}")
 
     # Union all individual dataframes
     unioned_df = pd.concat(agg_dfs, ignore_index=True)
 
     # Add several datetime indicators for reporting purposes
     unioned_df = _add_datetime_indicators(unioned_df)
+    unioned_df = unioned_df.sort_values(
+        ["company_name", "agg_freq", "date"]
+    ).reset_index(drop=True)
+
+    return _add_period_deltas(unioned_df, deltas) if deltas else unioned_df
+
+
+def fea_rolling(
+    master_df: pd.DataFrame,
+    windows: List[int],
+    metrics: Optional[List[str]] = None,
+    return_col: str = "price",
+    min_periods: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Compute rolling window features of each company over its last observations,
+        with grouped rolling kernels over all companies at once.
+
+    For each window of w observations, the following columns are added:
+    `<return_col>_return_<w>`, the return over the window,
+    `<return_col>_volatility_<w>`, the standard deviation of daily returns,
+    `<metric>_mean_<w>` and `<metric>_std_<w>` for each metric, and
+    `<x>_<y>_corr_<w>`, the Pearson correlation of each pair of metrics over
+    pairwise complete observations. Correlations are computed from rolling
+    moments of values centered by their company mean, which leaves them
+    unchanged but limits loss of precision.
+
+    :param master_df: The master DataFrame containing all data
+    :param windows: Window lengths in observations, e.g., [21, 63, 252] for
+        a month, a quarter, and a year of trading days
+    :param metrics: Metrics to compute rolling statistics and correlations of
+        (default: `DEFAULT_METRICS`)
+    :param return_col: Metric to compute returns and volatility of
+    :param min_periods: Minimum number of observations of a window, features
+        of shorter windows are missing (default: the window length)
+    :return: DataFrame with company_name, symbol, date, and feature columns,
+        sorted by company_name and date
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    df = master_df[master_df["company_name"].notna()]
+    df = df.sort_values(["company_name", "date"], kind="stable", ignore_index=True)
+    codes = pd.factorize(df["company_name"], sort=True)[0]
+
+    values = df[list(dict.fromkeys(metrics + [return_col]))].astype(float)
+    centered = values - values.groupby(codes).transform("mean")
+    returns = values[return_col] / values[return_col].groupby(codes).shift(1) - 1
+
+    # Moments of each pair over pairwise complete observations
+    pairs = list(combinations(metrics, 2))
+    moments = {}
+    for x, y in pairs:
+        is_complete = centered[x].notna() & centered[y].notna()
+        x_values = centered[x].where(is_complete)
+        y_values = centered[y].where(is_complete)
+        moments[(x, y, "x")] = x_values
+        moments[(x, y, "y")] = y_values
+        moments[(x, y, "xx")] = x_values * x_values
+        moments[(x, y, "yy")] = y_values * y_values
+        moments[(x, y, "xy")] = x_values * y_values
+    moments = pd.DataFrame(moments)
+
+    features = {}
+    for window in windows:
+        periods = window if min_periods is None else min(min_periods, window)
+
+        features[f"{return_col}_return_{window}"] = (
+            values[return_col] / values[return_col].groupby(codes).shift(window) - 1
+        )
+        features[f"{return_col}_volatility_{window}"] = _grouped_rolling(
+            returns.to_frame(), codes, window, periods, "std"
+        )[:, 0]
+
+        means = _grouped_rolling(values[metrics], codes, window, periods, "mean")
+        stds = _grouped_rolling(values[metrics], codes, window, periods, "std")
+        for i, metric in enumerate(metrics):
+            features[f"{metric}_mean_{window}"] = means[:, i]
+            features[f"{metric}_std_{window}"] = stds[:, i]
+
+        # Pearson correlation from rolling moments, requiring a non-zero variance,
+        # where tiny variances are leftovers of cancelling constant values
+        window_moments = pd.DataFrame(
+            _grouped_rolling(moments, codes, window, periods, "mean"),
+            columns=moments.columns,
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for x, y in pairs:
+                m = {
+                    stat: window_moments[(x, y, stat)].to_numpy()
+                    for stat in ["x", "y", "xx", "yy", "xy"]
+                }
+                var_x = m["xx"] - m["x"] ** 2
+                var_y = m["yy"] - m["y"] ** 2
+                valid = (var_x > 1e-12 * m["xx"]) & (var_y > 1e-12 * m["yy"])
+                features[f"{x}_{y}_corr_{window}"] = np.where(
+                    valid, (m["xy"] - m["x"] * m["y"]) / np.sqrt(var_x * var_y), np.nan
+                ).clip(-1, 1)
+
+    features_df = pd.DataFrame(features, index=df.index)
+    return pd.concat([df[["company_name", "symbol", "date"]], features_df], axis=1)
+
+
+def fea_corr_stats(master_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Precompute cumulative sufficient statistics of the master DataFrame, so that
+        the Pearson correlation matrix of any company and date window can be
+        computed from two rows instead of a scan over the window.
+
+    For each pair of numeric columns (x, y), the pairwise complete observation
+    count and the sums of x, y, x*x, y*y, and x*y are accumulated per company over
+    dates. Values are centered by their company mean beforehand, which leaves
+    correlations unchanged but keeps the running sums small, limiting loss of
+    precision when two of them are subtracted. The mean of each metric is kept
+    in a `<metric>_center` column, so that later dates can be accumulated onto
+    the same sums, see `fea_update_corr_stats`.
+
+    :param master_df: The master DataFrame containing all data
+    :return: DataFrame with company_name, date, one `<stat>__<x>__<y>` column
+        per statistic and pair of columns, and one `<metric>_center` column per
+        metric, sorted by company_name and date, see
+        `src.reporting.queries.window_corr`
+    """
+    metrics = master_df.select_dtypes(include=["number", "bool"]).columns.to_list()
+    df = master_df.sort_values(["company_name", "date"], kind="stable")
+
+    # Center each metric by its company mean
+    values = df[metrics].astype(float)
+    grouped = values.groupby(df["company_name"], sort=False, observed=True)
+    centers = grouped.transform("mean")
+
+    # Sum within each company and day, then accumulate over days
+    daily_df = _daily_corr_stats(df, values, centers)
+    cum_df = daily_df.groupby(level="company_name", observed=True).cumsum()
+
+    return _add_corr_centers(cum_df.reset_index(), df, centers)
+
+
+def fea_company_pivot(
+    master_df: pd.DataFrame,
+    metrics: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Pivot the master DataFrame into a date by company matrix of each metric,
+        so that company by company correlations of any window are a slice of
+        rows and a few matrix products, see `src.reporting.queries.company_corr`.
+
+    :param master_df: The master DataFrame containing all data
+    :param metrics: Metrics to pivot (default: `DEFAULT_METRICS`)
+    :return: DataFrame with metric and date columns and a column per company,
+        missing where the company has no data on a date, sorted by metric and date
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    df = master_df[master_df["company_name"].notna()]
+    codes, companies = pd.factorize(df["company_name"], sort=True)
+    date_codes, dates = pd.factorize(df["date"], sort=True)
+
+    # Scatter each metric into a dense matrix, averaging duplicated days
+    shape = (len(dates), len(companies))
+    cells = date_codes.astype(np.int64) * len(companies) + codes
+    pivot_dfs = []
+    for metric in metrics:
+        values = df[metric].to_numpy(dtype=float)
+        is_valid = ~np.isnan(values)
+        sums = np.bincount(
+            cells[is_valid], weights=values[is_valid], minlength=shape[0] * shape[1]
+        )
+        n = np.bincount(cells[is_valid], minlength=shape[0] * shape[1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.where(n > 0, sums / n, np.nan).reshape(shape)
+
+        pivot_df = pd.DataFrame(matrix, columns=[str(c) for c in companies])
+        pivot_df.insert(0, "date", dates)
+        pivot_df.insert(0, "metric", metric)
+        pivot_dfs.append(pivot_df)
+
+    return pd.concat(pivot_dfs, ignore_index=True)
+
+
+def fea_export(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pass a feature layer dataset through as is, so that it can be written in
+        another format, e.g., as a partitioned dataset, see `src.io.write_dataset`.
+
+    :param df: The DataFrame to export
+    :return: The same DataFrame
+    """
+    return df
+
+
+def fea_update_master(
+    master_df: pd.DataFrame,
+    pri_consumer: pd.DataFrame,
+    pri_prices: pd.DataFrame,
+    pri_web: pd.DataFrame,
+    changed_keys: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Rejoin only the companies and dates of changed keys and merge them into an
+    existing master DataFrame.
+
+    :param master_df: The master DataFrame from a previous run
+    :param pri_consumer: DataFrame containing primary layer consumer data, with
+        at least all rows of the companies and dates of changed keys
+    :param pri_prices: DataFrame containing primary layer prices data, likewise
+    :param pri_web: DataFrame containing primary layer web data, likewise
+    :param changed_keys: Keys touched by the delta, with consumer_id, date, and
+        company_name columns
+    :return: The updated master DataFrame, sorted by company_name and date
+    """
+    # Join all rows of affected companies and dates, as their master rows are
+    # replaced, including rows of other consumer ids of the same company
+    affected_cols = ["company_name", "date"]
+    delta_dfs = []
+    for pri_df in [pri_consumer, pri_prices, pri_web]:
+        is_affected = _isin_keys(pri_df, changed_keys, affected_cols)
+        delta_dfs.append(pri_df.take(np.flatnonzero(is_affected)))
+    delta_df = fea_join_all(*delta_dfs)
+
+    # Replace all affected company and date rows with the rejoined ones
+    is_affected = _isin_keys(master_df, changed_keys, affected_cols)
+    master_df = pd.concat([master_df[~is_affected], delta_df], ignore_index=True)
+
+    return master_df.sort_values(["company_name", "date"]).reset_index(drop=True)
 
-    return unioned_df.sort_values(["company_name", "agg_freq", "date"]).reset_index(
+
+def fea_update_aggregate(
+    agg_df: pd.DataFrame,
+    master_df: pd.DataFrame,
+    changed_keys: pd.DataFrame,
+    frequencies: List[str],
+    engine: str = "groupby",
+    deltas: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Re-aggregate only the periods containing changed dates and merge them
+        into an existing aggregated DataFrame. Period-over-period deltas
+        depend on other periods, so they are recomputed for all rows.
+
+    :param agg_df: The aggregated DataFrame from a previous run
+    :param master_df: The updated master DataFrame
+    :param changed_keys: Keys touched by the delta, see `fea_update_master`
+    :param frequencies: List of aggregation frequencies, e.g., ['Y', 'Q', 'M', 'W']
+    :param engine: Aggregation engine passed on to `fea_aggregate`
+    :param deltas: Aggregation stats to add period-over-period deltas of,
+        see `fea_aggregate`
+    :return: The updated aggregated DataFrame, sorted by company_name,
+        agg_freq, and date
+    """
+    agg_df = agg_df.drop(columns=_delta_columns(agg_df.columns))
+
+    # Only companies touched by the delta need to be looked at
+    changed_df = changed_keys[["company_name", "date"]].drop_duplicates()
+    company_df = master_df[master_df["company_name"].isin(changed_df["company_name"])]
+
+    stale_periods, agg_dfs = [], []
+    for freq in frequencies:
+        # Find the periods containing changed dates at this frequency
+        periods = changed_df.assign(
+            date=_period_end(pd.DatetimeIndex(changed_df["date"]), freq)
+        ).drop_duplicates()
+        stale_periods.append(periods.assign(agg_freq=freq))
+
+        # Re-aggregate all rows falling into those periods
+        company_periods = company_df.assign(
+            date=_period_end(pd.DatetimeIndex(company_df["date"]), freq)
+        )
+        period_df = company_df[
+            _isin_keys(company_periods, periods, ["company_name", "date"])
+        ]
+        if not period_df.empty:
+            agg_dfs.append(fea_aggregate(period_df, [freq], engine))
+
+    # Replace stale periods, which also drops periods left without any data
+    is_stale = _isin_keys(
+        agg_df, pd.concat(stale_periods), ["company_name", "agg_freq", "date"]
+    )
+    agg_df = pd.concat([agg_df[~is_stale]] + agg_dfs, ignore_index=True)
+    agg_df = agg_df.sort_values(["company_name", "agg_freq", "date"]).reset_index(
+        drop=True
+    )
+
+    return _add_period_deltas(agg_df, deltas) if deltas else agg_df
+
+
+def fea_update_rolling(
+    rolling_df: pd.DataFrame,
+    master_df: pd.DataFrame,
+    changed_keys: pd.DataFrame,
+    windows: List[int],
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Recompute rolling window features of companies touched by changes and
+        merge them into an existing rolling window features DataFrame.
+
+    Windows are computed per company, so recomputing a whole company gives
+    the same features as a full run.
+
+    :param rolling_df: The rolling window features DataFrame from a previous run
+    :param master_df: The updated master DataFrame
+    :param changed_keys: Keys touched by the delta, see `fea_update_master`
+    :param windows: Window lengths in observations, see `fea_rolling`
+    :param kwargs: Other parameters passed on to `fea_rolling`
+    :return: The updated rolling window features DataFrame, sorted by
+        company_name and date
+    """
+    companies = changed_keys["company_name"].unique()
+    company_df = master_df[master_df["company_name"].isin(companies)]
+
+    # Replace all rows of changed companies, including those left without data
+    rolling_df = pd.concat(
+        [
+            rolling_df[~rolling_df["company_name"].isin(companies)],
+            fea_rolling(company_df, windows, **kwargs),
+        ],
+        ignore_index=True,
+    )
+
+    return rolling_df.sort_values(["company_name", "date"]).reset_index(drop=True)
+
+
+def fea_update_corr_stats(
+    corr_df: pd.DataFrame, master_df: pd.DataFrame, changed_keys: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Recompute cumulative correlation statistics of changed companies from their
+        earliest changed date on, and merge them into existing statistics.
+
+    Statistics before that date are left as they are, and later days are
+    accumulated onto the statistics of the day before it, centered by the
+    same company means as before, see `fea_corr_stats`. New companies are
+    centered by their mean.
+
+    :param corr_df: The cumulative statistics from a previous run
+    :param master_df: The updated master DataFrame
+    :param changed_keys: Keys touched by the delta, see `fea_update_master`
+    :return: The updated cumulative statistics, sorted by company_name and date
+    """
+    metrics = master_df.select_dtypes(include=["number", "bool"]).columns.to_list()
+    stat_cols = [
+        f"{stat}__{x}__{y}"
+        for i, x in enumerate(metrics)
+        for y in metrics[i:]
+        for stat in ["n", "sx", "sy", "sxx", "syy", "sxy"]
+    ]
+    center_cols = [f"{metric}_center" for metric in metrics]
+    if corr_df.columns.to_list() != ["company_name", "date"] + stat_cols + center_cols:
+        return fea_corr_stats(master_df)
+
+    # Rows of changed companies from their earliest changed date on are stale
+    starts = changed_keys.groupby(
+        changed_keys["company_name"].astype(object), observed=True
+    )["date"].min()
+    is_stale = (
+        corr_df["date"] >= corr_df["company_name"].astype(object).map(starts)
+    ).to_numpy()
+    df = master_df[
+        (
+            master_df["date"] >= master_df["company_name"].astype(object).map(starts)
+        ).to_numpy()
+    ]
+    df = df.sort_values(["company_name", "date"], kind="stable")
+
+    # Center values of known companies as before, and of new ones by their mean
+    values = df[metrics].astype(float)
+    known_centers = corr_df.groupby(
+        corr_df["company_name"].astype(object), observed=True
+    )[center_cols].last()
+    known_centers.columns = metrics
+    centers = (
+        known_centers.reindex(df["company_name"].astype(object))
+        .set_axis(df.index)
+        .fillna(values.groupby(df["company_name"], observed=True).transform("mean"))
+    )
+
+    # Accumulate onto the statistics of the last day kept of each company
+    daily_df = _daily_corr_stats(df, values, centers)
+    cum_df = daily_df.groupby(level="company_name", observed=True).cumsum()
+    kept_df = corr_df[~is_stale]
+    offsets = (
+        kept_df.groupby(kept_df["company_name"].astype(object), observed=True)[
+            stat_cols
+        ]
+        .last()
+        .reindex(cum_df.index.get_level_values("company_name"), fill_value=0.0)
+    )
+    cum_df = _add_corr_centers((cum_df + offsets.to_numpy()).reset_index(), df, centers)
+
+    # Replace stale rows, which also drops rows of days left without data
+    corr_df = pd.concat([corr_df[~is_stale], cum_df], ignore_index=True)
+
+    return corr_df.sort_values(["company_name", "date"], kind="stable").reset_index(
         drop=True
     )
 
 
+def fea_update_company_pivot(
+    pivot_df: pd.DataFrame,
+    master_df: pd.DataFrame,
+    changed_keys: pd.DataFrame,
+    metrics: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Recompute the company pivot of changed companies from their earliest changed
+        date on, and merge it into an existing company pivot.
+
+    :param pivot_df: The company pivot from a previous run
+    :param master_df: The updated master DataFrame
+    :param changed_keys: Keys touched by the delta, see `fea_update_master`
+    :param metrics: Metrics to pivot, see `fea_company_pivot`
+    :return: The updated company pivot, sorted by metric and date
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    df = master_df[master_df["company_name"].notna()]
+    starts = changed_keys.groupby(
+        changed_keys["company_name"].astype(object), observed=True
+    )["date"].min()
+    first_start = starts.min()
+
+    # Pivot rows of changed companies from their earliest changed date on
+    company_starts = df["company_name"].astype(object).map(starts)
+    delta_df = fea_company_pivot(df[(df["date"] >= company_starts).to_numpy()], metrics)
+    delta_df = delta_df.set_index(["metric", "date"])
+
+    # Dates from the earliest change on are those left with data, and companies
+    # those left with data at all
+    companies = [
+        str(company) for company in pd.factorize(df["company_name"], sort=True)[1]
+    ]
+    dates = np.sort(df.loc[df["date"] >= first_start, "date"].unique())
+    pivot_df = pivot_df.set_index(["metric", "date"]).reindex(columns=companies)
+    is_kept = pivot_df.index.get_level_values("date") < first_start
+    recent_df = pivot_df.reindex(pd.MultiIndex.from_product([metrics, dates]))
+
+    # Replace cells of changed companies from their earliest changed date on
+    recent_dates = recent_df.index.get_level_values(1)
+    delta_dates = delta_df.reindex(recent_df.index)
+    for company, start in starts.items():
+        if str(company) not in recent_df:
+            continue
+        is_changed = recent_dates >= start
+        recent_df.loc[is_changed, str(company)] = (
+            delta_dates[str(company)].to_numpy()[is_changed]
+            if str(company) in delta_dates
+            else np.nan
+        )
+
+    pivot_df = pd.concat([pivot_df[is_kept], recent_df]).rename_axis(["metric", "date"])
+    pivot_df = pivot_df.reset_index()
+    order = np.lexsort(
+        [
+            pivot_df["date"],
+            pivot_df["metric"].map({m: i for i, m in enumerate(metrics)}),
+        ]
+    )
+
+    return pivot_df.take(order).reset_index(drop=True)
+
+
+def _isin_keys(df: pd.DataFrame, keys_df: pd.DataFrame, key_cols: List[str]):
+    """
+    Check which rows of a DataFrame match any combination of key values.
+
+    :param df: The DataFrame to check
+    :param keys_df: DataFrame holding the key combinations to look for
+    :param key_cols: Columns making up the key
+    :return: Boolean array, True where the row's key is in keys_df
+    """
+    return pd.MultiIndex.from_frame(df[key_cols]).isin(
+        pd.MultiIndex.from_frame(keys_df[key_cols])
+    )
+
+
+def _daily_corr_stats(
+    df: pd.DataFrame, values: pd.DataFrame, centers: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Sum the statistics of each pair of metrics within each company and day,
+        see `fea_corr_stats`.
+
+    :param df: Rows of the master DataFrame, sorted by company_name and date
+    :param values: Metric values of the rows, as floats
+    :param centers: Values each metric is centered by, aligned with the rows
+    :return: DataFrame of `<stat>__<x>__<y>` columns indexed by company_name
+        and date
+    """
+    metrics = values.columns.to_list()
+    centered = (values - centers).to_numpy()
+    notna = ~np.isnan(centered)
+
+    # Row-level statistics over pairwise complete observations, as in df.corr
+    stats = {}
+    for i, x in enumerate(metrics):
+        for j, y in enumerate(metrics[i:], start=i):
+            mask = notna[:, i] & notna[:, j]
+            x_values = np.where(mask, centered[:, i], 0.0)
+            y_values = np.where(mask, centered[:, j], 0.0)
+            stats[f"n__{x}__{y}"] = mask.astype(float)
+            stats[f"sx__{x}__{y}"] = x_values
+            stats[f"sy__{x}__{y}"] = y_values
+            stats[f"sxx__{x}__{y}"] = x_values * x_values
+            stats[f"syy__{x}__{y}"] = y_values * y_values
+            stats[f"sxy__{x}__{y}"] = x_values * y_values
+
+    return (
+        pd.DataFrame(stats, index=df.index)
+        .groupby([df["company_name"], df["date"]], observed=True)
+        .sum()
+    )
+
+
+def _add_corr_centers(
+    cum_df: pd.DataFrame, df: pd.DataFrame, centers: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Add the values each metric was centered by to cumulative statistics, one
+        `<metric>_center` column per metric, see `fea_corr_stats`.
+
+    :param cum_df: Cumulative statistics with company_name and date columns
+    :param df: Rows the statistics were computed from
+    :param centers: Values each metric was centered by, aligned with the rows,
+        constant within each company
+    :return: The statistics with additional center columns
+    """
+    company_centers = centers.groupby(df["company_name"], observed=True).first()
+    company_centers = company_centers.reindex(cum_df["company_name"])
+    company_centers.columns = [f"{metric}_center" for metric in centers.columns]
+
+    return pd.concat(
+        [cum_df, company_centers.reset_index(drop=True).set_axis(cum_df.index)],
+        axis=1,
+    )
+
+
+def _merge_sorted(
+    left_df: pd.DataFrame, right_dfs: List[pd.DataFrame], right_drop_cols: List[str]
+) -> Optional[pd.DataFrame]:
+    """
+    Inner join DataFrames on consumer_id and date in one ordered pass, given
+        that all of them are sorted by company_name, date, and consumer_id.
+
+    Keys are packed into integers that sort in the same order, so matches are
+    found with binary searches into the right DataFrames, and the left order
+    is kept as is. Joins that don't fit this scheme, e.g., with duplicated or
+    missing keys, are left to a hash merge.
+
+    :param left_df: The left DataFrame, whose row order is kept
+    :param right_dfs: DataFrames to join to the left one
+    :param right_drop_cols: Columns of the right DataFrames not to add, including
+        the join keys
+    :return: The joined DataFrame, or None if the inputs don't fit an ordered join
+    """
+    keys = _pack_sorted_keys([left_df] + right_dfs)
+    if keys is None:
+        return None
+
+    # Find the matching row of each right DataFrame, if any
+    left_keys, right_positions = keys[0], []
+    is_matched = np.ones(len(left_df), dtype=bool)
+    for right_keys in keys[1:]:
+        positions = np.minimum(
+            np.searchsorted(right_keys, left_keys), len(right_keys) - 1
+        )
+        is_matched &= right_keys[positions] == left_keys
+        right_positions.append(positions)
+    del keys, left_keys, right_keys
+
+    # Keep all left rows without copying them when they all match
+    if is_matched.all():
+        merged_df = left_df.copy(deep=False)
+        merged_df.index = pd.RangeIndex(len(merged_df))
+    else:
+        merged_df = left_df[is_matched].reset_index(drop=True)
+
+    for right_df, positions in zip(right_dfs, right_positions):
+        # Matched positions are strictly increasing, so matching all right rows
+        # means taking them in order, and their columns can be added as they are
+        positions = positions[is_matched]
+        for col in right_df.columns.drop(right_drop_cols, errors="ignore"):
+            # Clashing columns would need suffixes, as done by merge
+            if col in merged_df:
+                return None
+            if len(positions) == len(right_df):
+                merged_df[col] = right_df[col].values
+            else:
+                merged_df[col] = right_df[col].take(positions).values
+
+    return merged_df
+
+
+def _pack_sorted_keys(dfs: List[pd.DataFrame]) -> Optional[List[np.ndarray]]:
+    """
+    Pack company_name, date, and consumer_id of each DataFrame into int64 keys
+        that sort like the columns, as a company code, a day number, and a
+        consumer_id offset in consecutive bit ranges.
+
+    :param dfs: DataFrames sorted by company_name, date, and consumer_id
+    :return: Strictly increasing keys of each DataFrame, or None if the columns
+        can't be packed, e.g., with missing values, dates that aren't whole days,
+        or rows that aren't sorted or unique
+    """
+    day_ns = pd.Timedelta(days=1).value
+    if any(df.empty for df in dfs):
+        return None
+
+    # Companies are sorted, so their unique values start each run of rows, where
+    # categoricals are compared by their codes rather than by their strings
+    companies, starts = [], []
+    for df in dfs:
+        company = df["company_name"]
+        if isinstance(company.dtype, pd.CategoricalDtype):
+            codes = company.cat.codes.to_numpy()
+            if (codes < 0).any():
+                return None
+            start = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            categories = np.asarray(company.cat.categories, dtype=object)
+            companies.append(categories[codes[start]])
+        else:
+            values = company.to_numpy(dtype=object)
+            start = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+            companies.append(values[start])
+        starts.append(start)
+    if pd.isna(np.concatenate(companies)).any():
+        return None
+    company_names = np.array(sorted(set(np.concatenate(companies))), dtype=object)
+
+    # Missing dates and consumer_ids fail these checks too, as NaT and NaN,
+    # where integer consumer_ids are used as they are
+    dates = [df["date"].to_numpy(dtype="datetime64[ns]") for df in dfs]
+    consumer_ids = [
+        df["consumer_id"].to_numpy()
+        if pd.api.types.is_integer_dtype(df["consumer_id"])
+        else df["consumer_id"].to_numpy(dtype=float)
+        for df in dfs
+    ]
+    if any(np.isnat(date).any() for date in dates) or any(
+        consumer_id.dtype.kind == "f" and (consumer_id % 1 != 0).any()
+        for consumer_id in consumer_ids
+    ):
+        return None
+    days = [date.view(np.int64) for date in dates]
+    if any((day % day_ns != 0).any() for day in days):
+        return None
+
+    # Offsets from the minimum, and the number of bits needed to hold them
+    min_day = min(day.min() for day in days) // day_ns
+    min_id = min(int(consumer_id.min()) for consumer_id in consumer_ids)
+    day_bits = int(max(day.max() for day in days) // day_ns - min_day).bit_length()
+    id_bits = max(int(consumer_id.max()) for consumer_id in consumer_ids) - min_id
+    id_bits = id_bits.bit_length()
+    if len(company_names).bit_length() + day_bits + id_bits > 63:
+        return None
+
+    keys = []
+    for df, company, start, day, consumer_id in zip(
+        dfs, companies, starts, days, consumer_ids
+    ):
+        # Build keys in place, as ids may be downcast to small integer types
+        key = np.repeat(
+            np.searchsorted(company_names, company), np.diff(np.r_[start, len(df)])
+        ).astype(np.int64)
+        key <<= day_bits + id_bits
+        key |= (day // day_ns - min_day) << id_bits
+        key |= consumer_id.astype(np.int64, copy=False) - min_id
+        if not (key[1:] > key[:-1]).all():
+            return None
+        keys.append(key)
+
+    return keys
+
+
+def _shard_by_company(df: pd.DataFrame, n_shards: int) -> List[pd.DataFrame]:
+    """
+    Partition a DataFrame into shards of contiguous companies, in the order
+        companies sort in, e.g., by category for categoricals. Rows without
+        a company are dropped, as aggregations drop them anyway.
+
+    :param df: The input DataFrame with a company_name column
+    :param n_shards: Number of shards, at most one per company
+    :return: List of shards in company order, each keeping the input's row order
+    """
+    codes, companies = pd.factorize(df["company_name"], sort=True)
+    n_shards = min(n_shards, len(companies))
+    if n_shards <= 1:
+        return [df]
+
+    # Assign balanced ranges of company ranks to shards and split rows by shard
+    shards = np.where(codes >= 0, codes * n_shards // len(companies), n_shards)
+    positions = np.argsort(shards, kind="stable")
+    bounds = np.searchsorted(shards[positions], np.arange(n_shards + 1))
+
+    return [
+        df.take(positions[start:end]) for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _aggregate_shards(
+    shard_dfs: List[pd.DataFrame],
+    frequencies: List[str],
+    engine: str,
+    executor: str,
+    max_workers: Optional[int] = None,
+    deltas: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Aggregate company shards in parallel, see `fea_aggregate`.
+
+    :param shard_dfs: Shards of contiguous companies, in company order
+    :param frequencies: List of aggregation frequencies
+    :param engine: Aggregation engine passed on to `fea_aggregate`
+    :param executor: 'process' or 'thread'
+    :param max_workers: Maximum number of workers (default: CPU count)
+    :param deltas: Aggregation stats to add period-over-period deltas of
+    :return: The aggregated DataFrame, sorted by company_name, agg_freq, and date
+    """
+    executors = {"process": ProcessPoolExecutor, "thread": ThreadPoolExecutor}
+
+    # Shards cover disjoint, ordered ranges of companies, so concatenating their
+    # sorted outputs in shard order keeps the result sorted
+    with executors[executor](max_workers=max_workers) as pool:
+        agg_dfs = list(
+            pool.map(
+                fea_aggregate,
+                shard_dfs,
+                [frequencies] * len(shard_dfs),
+                [engine] * len(shard_dfs),
+                [None] * len(shard_dfs),
+                [None] * len(shard_dfs),
+                [None] * len(shard_dfs),
+                [deltas] * len(shard_dfs),
+            )
+        )
+
+    return pd.concat(agg_dfs, ignore_index=True)
+
+
+def _grouped_rolling(
+    df: pd.DataFrame, codes: np.ndarray, window: int, min_periods: int, stat: str
+) -> np.ndarray:
+    """
+    Compute a rolling statistic within groups of rows sorted by group.
+
+    Window bounds are computed once for all groups and columns, where
+    `DataFrame.groupby().rolling()` recomputes them for each group and column.
+
+    :param df: The input DataFrame, with rows sorted by group
+    :param codes: Group code of each row, ascending
+    :param window: Window length in rows
+    :param min_periods: Minimum number of non-missing rows of a window
+    :param stat: Name of the rolling statistic, e.g., 'mean' or 'std'
+    :return: 2D array of the statistic, aligned with the rows of the input
+    """
+    # Windows end at each row and start at most window rows back, within its group
+    positions = np.arange(len(codes), dtype=np.int64)
+    is_start = np.ones(len(codes), dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    group_starts = np.maximum.accumulate(np.where(is_start, positions, 0))
+    bounds = np.maximum(positions - window + 1, group_starts), positions + 1
+
+    rolling = df.rolling(_WindowBounds(bounds), min_periods=min_periods)
+    return getattr(rolling, stat)().to_numpy()
+
+
+class _WindowBounds(BaseIndexer):
+    """
+    Rolling window indexer with precomputed window bounds.
+    """
+
+    def __init__(self, bounds: Tuple[np.ndarray, np.ndarray]):
+        super().__init__()
+        self.bounds = bounds
+
+    def get_window_bounds(
+        self,
+        num_values: int = 0,
+        min_periods: Optional[int] = None,
+        center: Optional[bool] = None,
+        closed: Optional[str] = None,
+        step: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self.bounds
+
+
 def _aggregate_by_freq(df: pd.DataFrame, freq: str = "M") -> pd.DataFrame:
     """
     Aggregate a DataFrame based on a specified frequency.
@@ -79,7 +923,10 @@ def _aggregate_by_freq(df: pd.DataFrame, freq: str = "M") -> pd.DataFrame:
     """
     # Use grouper to aggregate on yearly, quaterly, monthly, weekly, or daily bases
     agg_df = (
-        df.groupby([pd.Grouper(key="date", freq=freq), "company_name", "symbol"])
+        df.groupby(
+            [pd.Grouper(key="date", freq=freq), "company_name", "symbol"],
+            observed=True,
+        )
         .agg(["mean", "sum", "min", "max"])
         .reset_index()
     )
@@ -96,6 +943,203 @@ def _aggregate_by_freq(df: pd.DataFrame, freq: str = "M") -> pd.DataFrame:
     return agg_df
 
 
+def _aggregate_by_rollup(
+    df: pd.DataFrame, frequencies: List[str]
+) -> List[pd.DataFrame]:
+    """
+    Aggregate a DataFrame at several frequencies with a single scan.
+
+    Daily partial aggregates (sum, min, max and count) are computed once,
+    then each frequency is rolled up from the daily partials. Sum, min and max
+    compose directly and mean is recovered as sum / count. With at most one row
+    per company and day, as produced by `fea_join_all`, rolling up straight from
+    the daily partials keeps the summation order of each group unchanged, so
+    the results match `_aggregate_by_freq` exactly.
+
+    :param df: The input DataFrame
+    :param frequencies: List of aggregation frequencies, e.g., ['Y', 'Q', 'M', 'W']
+    :return: List of aggregated DataFrames, one for each frequency
+    """
+    # Single scan over the input for daily partial aggregates
+    grouped = df.groupby(
+        [pd.Grouper(key="date", freq="D"), "company_name", "symbol"], observed=True
+    )
+    daily_df = pd.concat(
+        {
+            "sum": grouped.sum(),
+            "min": grouped.min(),
+            "max": grouped.max(),
+            "count": grouped.count(),
+        },
+        axis=1,
+    )
+    metric_cols = daily_df["sum"].columns
+
+    agg_dfs = []
+    for freq in frequencies:
+        if freq == "D":
+            partial_df = daily_df
+        else:
+            # Roll daily partials up into the period each day belongs to
+            index = daily_df.index
+            grouped = daily_df.groupby(
+                [
+                    _period_end(index.get_level_values("date"), freq),
+                    index.get_level_values("company_name"),
+                    index.get_level_values("symbol"),
+                ],
+                observed=True,
+            )
+            partial_df = pd.concat(
+                [
+                    grouped[[(stat, col) for col in metric_cols]].agg(func)
+                    for stat, func in [
+                        ("sum", "sum"),
+                        ("min", "min"),
+                        ("max", "max"),
+                        ("count", "sum"),
+                    ]
+                ],
+                axis=1,
+            )
+
+        # Assemble stats in the same layout as `_aggregate_by_freq`
+        agg_df = pd.DataFrame(index=partial_df.index)
+        for col in metric_cols:
+            agg_df[f"{col}_mean"] = (
+                partial_df[("sum", col)] / partial_df[("count", col)]
+            )
+            agg_df[f"{col}_sum"] = partial_df[("sum", col)]
+            agg_df[f"{col}_min"] = partial_df[("min", col)]
+            agg_df[f"{col}_max"] = partial_df[("max", col)]
+        agg_df = agg_df.reset_index()
+
+        # Indicate frequency for filtering
+        agg_df["agg_freq"] = freq
+        agg_dfs.append(agg_df)
+
+    return agg_dfs
+
+
+def _period_end(dates: pd.DatetimeIndex, freq: str) -> pd.DatetimeIndex:
+    """
+    Map each date to the label of the period it falls into, matching the
+        labels `pd.Grouper` assigns (e.g., month end for 'M', Sunday for 'W').
+
+    :param dates: Dates to map
+    :param freq: The aggregation frequency, e.g., 'Y', 'Q', 'M', 'W' or 'D'
+    :return: Period end dates aligned with the input dates
+    """
+    # Only convert unique dates and broadcast back via codes
+    codes, unique_dates = pd.factorize(dates)
+    period_ends = pd.DatetimeIndex(unique_dates).to_period(freq).end_time.normalize()
+
+    return pd.DatetimeIndex(period_ends.take(codes), name="date")
+
+
+def _add_period_deltas(agg_df: pd.DataFrame, stats: List[str]) -> pd.DataFrame:
+    """
+    Add period-over-period deltas of aggregated metrics, in one vectorized pass
+        over all companies and frequencies.
+
+    For each metric column with one of the given stats, e.g., 'price_mean',
+    three baselines are added: `<col>_prev`, the previous period with data,
+    `<col>_yoy`, the latest period ending on or before the same date a year
+    earlier, and `<col>_ytd`, the latest period of the previous year. Each
+    comes with `<col>_<baseline>_diff`, the difference from the baseline, and
+    `<col>_<baseline>_pct`, the difference in percent of the baseline.
+    Baselines are missing where the company has no such period.
+
+    :param agg_df: Aggregated DataFrame sorted by company_name, agg_freq, and date
+    :param stats: Aggregation stats to add deltas of, e.g., ['mean', 'sum']
+    :return: The DataFrame with additional delta columns
+    """
+    metric_cols = [
+        col
+        for col in agg_df.columns
+        if col.rsplit("_", 1)[-1] in stats and col not in _delta_columns([col])
+    ]
+    if not metric_cols:
+        return agg_df
+
+    # Number groups of company and frequency in row order, so that group and
+    # date form ascending integer keys to look periods up by binary search
+    n_rows = len(agg_df)
+    is_start = np.zeros(n_rows, dtype=bool)
+    is_start[:1] = True
+    for col in ["company_name", "agg_freq"]:
+        codes = pd.factorize(agg_df[col])[0]
+        is_start[1:] |= codes[1:] != codes[:-1]
+    groups = np.cumsum(is_start) - 1
+    group_starts = np.flatnonzero(is_start)[groups]
+
+    dates = pd.DatetimeIndex(agg_df["date"])
+    keys = _period_keys(groups, dates)
+
+    # Same period a year earlier, labelled by its period end at each frequency
+    year_ago = (dates - pd.DateOffset(years=1)).to_numpy()
+    freq_codes, freqs = pd.factorize(agg_df["agg_freq"])
+    for i, freq in enumerate(freqs):
+        mask = freq_codes == i
+        year_ago[mask] = _period_end(pd.DatetimeIndex(year_ago[mask]), freq)
+
+    # Previous period is a grouped shift, other baselines an as-of lookup of the
+    # latest period ending on or before their date within the group
+    positions = np.arange(n_rows)
+    year_ago = _period_keys(groups, pd.DatetimeIndex(year_ago))
+    year_end = _period_keys(groups, _period_end(dates, "Y") - pd.DateOffset(years=1))
+    baselines = {
+        "prev": np.where(is_start, -1, positions - 1),
+        "yoy": np.searchsorted(keys, year_ago, side="right") - 1,
+        "ytd": np.searchsorted(keys, year_end, side="right") - 1,
+    }
+
+    deltas = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for baseline, baseline_positions in baselines.items():
+            found = baseline_positions >= group_starts
+            for col in metric_cols:
+                values = agg_df[col].to_numpy(dtype=float)
+                baseline_values = np.where(found, values[baseline_positions], np.nan)
+                diff = values - baseline_values
+                deltas[f"{col}_{baseline}"] = baseline_values
+                deltas[f"{col}_{baseline}_diff"] = diff
+                deltas[f"{col}_{baseline}_pct"] = np.where(
+                    baseline_values != 0, diff / baseline_values * 100, np.nan
+                )
+
+    return pd.concat([agg_df, pd.DataFrame(deltas, index=agg_df.index)], axis=1)
+
+
+def _period_keys(groups: np.ndarray, dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Pack group numbers and dates into integer keys sorting by group, then date.
+
+    :param groups: Group number of each row
+    :param dates: Date of each row
+    :return: Array of int64 keys
+    """
+    days = dates.values.astype("datetime64[D]").astype(np.int64)
+
+    return groups.astype(np.int64) * 2**32 + days + 2**31
+
+
+def _delta_columns(columns: List[str]) -> List[str]:
+    """
+    Find the period-over-period delta columns added by `_add_period_deltas`.
+
+    :param columns: Column names
+    :return: Names of delta columns
+    """
+    suffixes = tuple(
+        f"_{baseline}{suffix}"
+        for baseline in ["prev", "yoy", "ytd"]
+        for suffix in ["", "_diff", "_pct"]
+    )
+
+    return [col for col in columns if col.endswith(suffixes)]
+
+
 def _add_datetime_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add datetime indicators to the input DataFrame.
@@ -116,18 +1160,50 @@ def _add_datetime_indicators(df: pd.DataFrame) -> pd.DataFrame:
     df["week"] = df["date"].dt.strftime("%U")
 
     # Create Labeling for readability
+    df["dt_label"] = _build_dt_labels(df)
+
+    return df
+
+
+def _build_dt_labels(df: pd.DataFrame) -> pd.Series:
+    """
+    Build readable period labels (e.g., '2021 Q1') block by block for each
+        aggregation frequency, instead of formatting row by row.
+
+    Labels are only formatted once per unique date within each frequency
+    block and then broadcast back to the rows via the factorized codes.
+
+    :param df: DataFrame with date, agg_freq, year, quarter, month and week columns
+    :return: Series of labels aligned with the input DataFrame
+    """
+    # Period fields appended to the year for each frequency, days fall back to date
     label_format_map = {
-        "Y": lambda row: f"{row['year']}",
-        "Q": lambda row: f"{row['year']} Q{row['quarter']}",
-        "M": lambda row: f"{row['year']} M{row['month']}",
-        "W": lambda row: f"{row['year']} W{row['week']}",
+        "Y": None,
+        "Q": (" Q", "quarter"),
+        "M": (" M", "month"),
+        "W": (" W", "week"),
     }
 
-    df["dt_label"] = df.apply(
-        lambda row: label_format_map.get(row["agg_freq"])(row)
-        if row["agg_freq"] in label_format_map
-        else row["date"].strftime("%m/%d/%Y"),
-        axis=1,
-    )
+    labels = np.empty(len(df), dtype=object)
+    freq_codes, freqs = pd.factorize(df["agg_freq"])
 
-    return df
+    for i, freq in enumerate(freqs):
+        mask = freq_codes == i
+        block = df.loc[mask]
+
+        # Build lookup table of unique dates and their labels within the block
+        date_codes, _ = pd.factorize(block["date"], use_na_sentinel=False)
+        _, first_positions = np.unique(date_codes, return_index=True)
+        first_rows = block.iloc[first_positions]
+
+        if freq in label_format_map:
+            unique_labels = first_rows["year"].astype(str)
+            if label_format_map[freq] is not None:
+                prefix, col = label_format_map[freq]
+                unique_labels = unique_labels + prefix + first_rows[col].astype(str)
+        else:
+            unique_labels = first_rows["date"].dt.strftime("%m/%d/%Y")
+
+        labels[mask] = unique_labels.to_numpy(dtype=object)[date_codes]
+
+    return pd.Series(labels, index=df.index)
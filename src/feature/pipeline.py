@@ -1,25 +1,247 @@
+import json
 from pathlib import Path
+from typing import Any, Callable, Dict, List
 
-from src.io import run_node
+import numpy as np
+import pandas as pd
 
-from .nodes import fea_aggregate, fea_join_all
+from src.io import (
+    clear_changes,
+    read_changes,
+    read_feather,
+    read_feather_metadata,
+    read_feather_rows,
+    run_node,
+    write_dataset,
+    write_feather,
+)
+from src.metrics import new_run_id, run_instrumented
+
+from .nodes import (
+    fea_aggregate,
+    fea_company_pivot,
+    fea_corr_stats,
+    fea_export,
+    fea_join_all,
+    fea_rolling,
+    fea_update_aggregate,
+    fea_update_company_pivot,
+    fea_update_corr_stats,
+    fea_update_master,
+    fea_update_rolling,
+)
 
 
 def run_feature_pipeline() -> None:
-    # TODO: with a proper config parser, the filepaths
-    # and parameters below should be controlled via
-    # conf/catalog.yml and conf/parameters.yml
+    """
+    Run all feature layer steps from scratch.
+    """
+    # Create feature directory if it doesn't exist
+    Path("data/04_feature").mkdir(parents=True, exist_ok=True)
+
+    # Instead of parallel runs, this time it's sequential due to
+    # node dependencies, see `src.scheduler.run_dag` for dependency-aware runs
+    run_id = new_run_id()
+    for step in get_feature_steps():
+        run_instrumented(get_feature_runner(step), step, run_id=run_id)
+
+
+def get_feature_runner(step: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    """
+    Get the function running a feature layer step, see `get_feature_steps`.
+
+    :param step: Step dictionary
+    :return: `run_master_node` for the step joining the master DataFrame,
+        `src.io.run_node` otherwise
+    """
+    return run_master_node if step["function"] is fea_join_all else run_node
+
+
+def run_master_node(args: Dict[str, Any]) -> None:
+    """
+    Run the step joining primary layer outputs into the master DataFrame,
+    recording the versions of the outputs it reads in its metadata, so that
+    the next incremental run reads only the changes since then, see
+    `run_incremental_feature_pipeline`.
+
+    :param args: Step dictionary, see `get_feature_steps`
+    """
+    versions = {
+        Path(path).stem: read_feather_metadata(path).get("version")
+        for path in args["inputs"]
+    }
+    metadata = dict(primary_versions=json.dumps(versions))
+    write_kwargs = dict(args.get("write_kwargs", {}), metadata=metadata)
+    run_node(dict(args, write_kwargs=write_kwargs))
+
+
+def run_incremental_feature_pipeline() -> None:
+    """
+    Update feature layer outputs in place, recomputing only the master
+    rows, aggregation periods, rolling windows, cumulative statistics, and
+    company pivot cells of companies touched by changes in the primary layer,
+    and rewriting only the partitions of their exports.
+
+    Changes are read from the change logs of the primary layer outputs, see
+    `src.io.read_changes`, since the versions recorded in the master DataFrame's
+    metadata by the previous run. Falls back to a full run when there is no
+    previous run to update, or when the changes since then aren't known, e.g.,
+    because the primary layer was rebuilt.
+
+    Rows are only rejoined for the companies and dates of changed keys, but
+    each Feather output is still read, merged with the recomputed rows, and
+    written as a whole, as the format can't be updated in place; only export
+    partitions of unchanged companies are left untouched.
+    """
     pri_dir = Path("data/03_primary")
     fea_dir = Path("data/04_feature")
+    master_path = fea_dir / "master_df.feather"
+    agg_path = fea_dir / "agg_by_freq.feather"
+    corr_path = fea_dir / "corr_stats.feather"
+    rolling_path = fea_dir / "rolling.feather"
+    pivot_path = fea_dir / "company_pivot.feather"
 
-    # Create intermediate directory if it doesn't exist
     fea_dir.mkdir(parents=True, exist_ok=True)
 
-    # TODO: with better pipeline design (extra classes and helper functions)
-    # this can be mitigated by checking inter-node dependencies
+    # Read only the primary rows changed since the versions of the previous run
+    sources = ["consumer", "prices", "web"]
+    pri_paths = [pri_dir / f"{source}.feather" for source in sources]
+    versions = {
+        source: read_feather_metadata(path).get("version")
+        for source, path in zip(sources, pri_paths)
+    }
+    previous_versions = json.loads(
+        read_feather_metadata(master_path).get("primary_versions", "{}")
+    )
+    change_dfs = [
+        read_changes(path, previous_versions.get(source))
+        for source, path in zip(sources, pri_paths)
+    ]
+
+    previous_outputs = [master_path, agg_path, corr_path, rolling_path, pivot_path]
+    if not all(path.exists() for path in previous_outputs) or any(
+        change_df is None for change_df in change_dfs
+    ):
+        run_feature_pipeline()
+    else:
+        # Nothing to do if primary data didn't change since last run
+        key_cols = ["consumer_id", "date", "company_name"]
+        if all(change_df.empty for change_df in change_dfs):
+            return
+        changed_keys = pd.concat(
+            [
+                change_df[key_cols].astype({"company_name": object})
+                for change_df in change_dfs
+                if not change_df.empty
+            ],
+            ignore_index=True,
+        ).drop_duplicates()
+
+        # Rejoin companies and dates of changed keys, looking up rows of sources
+        # and consumer ids that didn't change
+        delta_dfs = [
+            _read_key_rows(path, changed_keys, change_df)
+            for path, change_df in zip(pri_paths, change_dfs)
+        ]
+
+        steps = {step["function"]: step for step in get_feature_steps()}
+        agg_step, corr_step = steps[fea_aggregate], steps[fea_corr_stats]
+        rolling_step, pivot_step = steps[fea_rolling], steps[fea_company_pivot]
+        master_df = fea_update_master(
+            pd.read_feather(master_path), *delta_dfs, changed_keys
+        )
+        agg_df = fea_update_aggregate(
+            pd.read_feather(agg_path),
+            master_df,
+            changed_keys,
+            agg_step["frequencies"],
+            agg_step["engine"],
+            agg_step["deltas"],
+        )
+        rolling_df = fea_update_rolling(
+            pd.read_feather(rolling_path),
+            master_df,
+            changed_keys,
+            rolling_step["windows"],
+        )
+        corr_df = fea_update_corr_stats(
+            pd.read_feather(corr_path), master_df, changed_keys
+        )
+        pivot_df = fea_update_company_pivot(
+            pd.read_feather(pivot_path), master_df, changed_keys
+        )
+        write_feather(agg_df, agg_path, **agg_step["write_kwargs"])
+        write_feather(rolling_df, rolling_path, **rolling_step["write_kwargs"])
+        write_feather(corr_df, corr_path, **corr_step["write_kwargs"])
+        write_feather(pivot_df, pivot_path, **pivot_step["write_kwargs"])
+
+        # Rewrite only the partitions of changed companies
+        companies = changed_keys["company_name"].unique().tolist()
+        for step in get_feature_steps():
+            if step["function"] is fea_export:
+                df = master_df if Path(step["inputs"][0]) == master_path else agg_df
+                write_dataset(
+                    df, step["output"], **step["write_kwargs"], companies=companies
+                )
+
+        # The master DataFrame goes last, as its versions mark the changes done
+        write_feather(
+            master_df, master_path, metadata=dict(primary_versions=json.dumps(versions))
+        )
+
+    # Changes are read, start new change logs from these versions
+    for path in pri_paths:
+        clear_changes(path)
+
+
+def _read_key_rows(
+    path: Path, keys: pd.DataFrame, change_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Read the rows of a primary layer output of the companies and dates of given
+        keys, taking changed rows from its change log and looking up the other
+        ones in the output, where only its key columns and the record batches
+        holding them are read.
+
+    :param path: Path to the primary layer output
+    :param keys: Keys to read, with company_name and date columns
+    :param change_df: Rows changed since the previous run, see `src.io.read_changes`
+    :return: Rows of the given companies and dates, of every consumer id
+    """
+    key_cols = ["consumer_id", "date"]
+    affected_cols = ["company_name", "date"]
+    affected_index = pd.MultiIndex.from_frame(keys[affected_cols])
+    file_keys = read_feather(path, columns=affected_cols + ["consumer_id"])
+    is_read = pd.MultiIndex.from_frame(file_keys[affected_cols]).isin(affected_index)
+
+    row_dfs = []
+    if not change_df.empty:
+        # Later changes of the same key supersede earlier ones and the output
+        change_df = change_df.drop_duplicates(key_cols, keep="last")
+        change_df = change_df[
+            pd.MultiIndex.from_frame(change_df[affected_cols]).isin(affected_index)
+        ]
+        is_read &= ~pd.MultiIndex.from_frame(file_keys[key_cols]).isin(
+            pd.MultiIndex.from_frame(change_df[key_cols])
+        )
+        row_dfs.append(change_df)
+
+    # Without any row left, the lookup still yields the columns of the output
+    if is_read.any() or not row_dfs:
+        row_dfs.append(read_feather_rows(path, np.flatnonzero(is_read)))
+
+    return pd.concat(row_dfs, ignore_index=True)
+
+
+def get_feature_steps() -> List[Dict[str, Any]]:
+    # TODO: with a proper config parser, the filepaths
+    # and parameters below should be controlled via
+    # conf/catalog.yml and conf/parameters.yml
+    pri_dir = Path("data/03_primary")
+    fea_dir = Path("data/04_feature")
 
     # Declare each step to create additional feature layer datasets
-    steps = [
+    return [
         dict(
             function=fea_join_all,
             inputs=[
@@ -28,20 +250,76 @@ def run_feature_pipeline() -> None:
                 pri_dir / "web.feather",
             ],
             output=fea_dir / "master_df.feather",
+            # Company info and ids are taken from consumer data, see `fea_join_all`
+            input_columns={
+                pri_dir
+                / "prices.feather": [
+                    "company_name",
+                    "date",
+                    "consumer_id",
+                    "price",
+                ],
+                pri_dir
+                / "web.feather": [
+                    "company_name",
+                    "date",
+                    "consumer_id",
+                    "website_visits",
+                ],
+            },
         ),
         dict(
             function=fea_aggregate,
             inputs=[fea_dir / "master_df.feather"],
             output=fea_dir / "agg_by_freq.feather",
             frequencies=["Y", "Q", "M", "W", "D"],
+            engine="rollup",
+            # Aggregate company shards across a process pool, one per CPU left
+            # free by other nodes, see `src.scheduler.run_dag`
+            executor="process",
+            # Previous period, year-over-year, and year-to-date deltas of means
+            deltas=["mean"],
+            # Uncompressed so that the dashboard can memory-map it zero-copy
+            write_kwargs=dict(compression="uncompressed"),
+        ),
+        dict(
+            function=fea_rolling,
+            inputs=[fea_dir / "master_df.feather"],
+            output=fea_dir / "rolling.feather",
+            # A month, a quarter, and a year of trading days
+            windows=[21, 63, 252],
+            sort_cols=["company_name", "date"],
+            write_kwargs=dict(compression="uncompressed"),
+        ),
+        dict(
+            function=fea_corr_stats,
+            inputs=[fea_dir / "master_df.feather"],
+            output=fea_dir / "corr_stats.feather",
+            write_kwargs=dict(compression="uncompressed"),
+        ),
+        dict(
+            function=fea_company_pivot,
+            inputs=[fea_dir / "master_df.feather"],
+            output=fea_dir / "company_pivot.feather",
+            write_kwargs=dict(compression="uncompressed"),
+        ),
+        # Partitioned copies for consumers reading a subset, see `src.io.read_dataset`
+        dict(
+            function=fea_export,
+            inputs=[fea_dir / "master_df.feather"],
+            output=fea_dir / "master_df.parquet",
+            write_kwargs=dict(partition_cols=["company_bucket"], n_buckets=16),
+        ),
+        dict(
+            function=fea_export,
+            inputs=[fea_dir / "agg_by_freq.feather"],
+            output=fea_dir / "agg_by_freq.parquet",
+            write_kwargs=dict(
+                partition_cols=["agg_freq", "company_bucket"], n_buckets=16
+            ),
         ),
     ]
 
-    # Instead of parallel runs, this time it's sequential due to
-    # node dependencies
-    for step in steps:
-        run_node(step)
-
 
 if __name__ == "__main__":
     run_feature_pipeline()
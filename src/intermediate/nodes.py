@@ -7,9 +7,19 @@ data types to the correct data types (e.g., string to datetime).
 
 More complicated cleanup should be left to primary layer.
 """
-from typing import Any, Dict, List, Optional
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+
+from src.io import atomic_path, compact_dtypes, read_feather_mmap
+from src.metrics import count_rows, phase
 
 
 def clean_column_names(df: pd.DataFrame) -> pd.DataFrame:
@@ -57,9 +67,11 @@ def preprocess(
     :param datetime_cols: Optional list of column names to be converted to datetime.
     :return: Intermediate level DataFrame.
     """
-    # Drop duplicated columns and rows if any
-    df = df.loc[:, ~df.columns.duplicated()]
-    df.drop_duplicates(inplace=True)
+    # Drop duplicated columns and rows if any, copying the data only once
+    is_unique_col = ~df.columns.duplicated()
+    if not is_unique_col.all():
+        df = df.loc[:, is_unique_col]
+    df = df.take(np.flatnonzero(~df.duplicated().to_numpy()))
 
     # Rename columns if any specified
     if rename:
@@ -80,14 +92,479 @@ def preprocess_raw_data(args: Dict[str, Any]) -> None:
     Reads in raw data from a CSV file, preprocesses it,
     and saves the preprocessed data as a Feather file.
 
+    Columns are converted to compact dtypes, see `src.io.compact_dtypes`,
+    where streamed chunks share the categories and integer types holding
+    the values of every chunk.
+
     :param args: Dictionary containing input and output
-    file paths, and optional rename and datetime_cols arguments.
+    file paths, optional chunksize to stream the CSV in bounded chunks,
+    optional schema and timestamp_formats to read the CSV with pyarrow,
+    optional write_kwargs passed on to the Feather writer when not streaming,
+    e.g., to write it uncompressed for memory-mapping,
+    and optional rename and datetime_cols arguments.
     """
     # Unpack input and output paths
     input, output = args.pop("input"), args.pop("output")
+    chunksize = args.pop("chunksize", None)
+    schema = args.pop("schema", None)
+    timestamp_formats = args.pop("timestamp_formats", None)
+    write_kwargs = args.pop("write_kwargs", {})
 
     # TODO: with logging configured, should pair with `try` block
     # to catch situations where file doesn't exist (FileNotFoundError)
-    raw_df = pd.read_csv(input)
-    int_df = preprocess(raw_df, **args)
-    int_df.to_feather(output)
+    if chunksize:
+        stream_preprocess_raw_data(
+            input,
+            output,
+            chunksize,
+            schema=schema,
+            timestamp_formats=timestamp_formats,
+            **args,
+        )
+    else:
+        with phase("read"):
+            raw_df = read_csv(input, schema, timestamp_formats)
+        n_raw_rows = len(raw_df)
+        with phase("compute"):
+            int_df = compact_dtypes(preprocess(raw_df, **args))
+        count_rows(inputs=n_raw_rows, outputs=len(int_df))
+        with phase("write"), atomic_path(output) as tmp_path:
+            int_df.to_feather(tmp_path, **write_kwargs)
+
+
+def read_csv(
+    input: str,
+    schema: Optional[Dict[str, str]] = None,
+    timestamp_formats: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Reads in a raw CSV file, with pyarrow if a schema is declared
+    and with pandas otherwise or if the file doesn't match the schema.
+
+    :param input: Path to the raw CSV file.
+    :param schema: Optional dictionary mapping raw column names to
+        pyarrow type aliases, e.g., {'Date': 'timestamp[ns]', 'Price': 'double'}.
+    :param timestamp_formats: Optional list of strptime formats for timestamp
+        columns, pyarrow's ISO-8601 parser is used if not specified.
+    :return: Raw DataFrame.
+    """
+    if schema:
+        try:
+            return next(_iter_arrow_csv(input, schema, timestamp_formats))
+        except (KeyError, pa.ArrowInvalid) as error:
+            warnings.warn(f"Reading {input} with pandas instead of pyarrow: {error}")
+
+    return pd.read_csv(input)
+
+
+def stream_preprocess_raw_data(
+    input: str,
+    output: str,
+    chunksize: int,
+    rename: Optional[Dict[str, str]] = None,
+    datetime_cols: Optional[List[str]] = [],
+    schema: Optional[Dict[str, str]] = None,
+    timestamp_formats: Optional[List[str]] = None,
+) -> None:
+    """
+    Reads in raw data from a CSV file in bounded chunks, preprocesses
+    each chunk, and appends it to a Feather file, so that memory usage
+    is bounded by the chunk size rather than the file size.
+
+    Duplicated rows are dropped across chunks by keeping track of the
+    hashes of rows already written, where rows with a known hash are compared
+    by value with the earlier rows written, so that distinct rows whose hashes
+    collide are kept.
+
+    :param input: Path to the raw CSV file.
+    :param output: Path to the output Feather file.
+    :param chunksize: Number of CSV rows to read per chunk.
+    :param rename: Optional dictionary mapping original column names to new names.
+    :param datetime_cols: Optional list of column names to be converted to datetime.
+    :param schema: Optional dictionary mapping raw column names to pyarrow
+        type aliases, to read chunks with pyarrow instead of pandas.
+    :param timestamp_formats: Optional list of strptime formats for timestamp columns.
+    """
+    # Stream into a temporary file that replaces the output once complete, so
+    # that readers memory-mapping the previous output aren't cut off
+    with atomic_path(output) as tmp_path:
+        written = None
+        if schema:
+            try:
+                chunks = _iter_arrow_csv(input, schema, timestamp_formats, chunksize)
+                written = _write_chunks(chunks, tmp_path, rename, datetime_cols)
+            except (KeyError, pa.ArrowInvalid) as error:
+                warnings.warn(
+                    f"Reading {input} with pandas instead of pyarrow: {error}"
+                )
+
+        if written is None:
+            with pd.read_csv(input, chunksize=chunksize) as chunks:
+                written = _write_chunks(chunks, tmp_path, rename, datetime_cols)
+
+        # Header-only file, nothing was streamed
+        if not written:
+            raw_df = read_csv(input, schema, timestamp_formats)
+            int_df = compact_dtypes(preprocess(raw_df, rename, datetime_cols))
+            int_df.to_feather(tmp_path)
+
+
+def _write_chunks(
+    chunks: Iterator[pd.DataFrame],
+    output: str,
+    rename: Optional[Dict[str, str]],
+    datetime_cols: Optional[List[str]],
+) -> bool:
+    """
+    Preprocesses raw DataFrame chunks and writes them to a Feather file,
+    dropping rows already seen in previous chunks.
+
+    Each chunk is written to a part next to the output, and the parts are
+    concatenated into the output once all chunks are read, where the types
+    of each column are promoted to hold the values of every chunk, e.g., an
+    integer column with missing values in a later chunk becomes a float one.
+    Each part is removed once concatenated, so the data is only on disk once.
+
+    Chunks are converted to compact dtypes, see `src.io.compact_dtypes`, and
+    categorical columns are written with the sorted categories of all chunks,
+    so that the output has the dtypes of the whole file compacted at once.
+
+    :param chunks: Iterator of raw DataFrame chunks.
+    :param output: Path to the output Feather file.
+    :param rename: Optional dictionary mapping original column names to new names.
+    :param datetime_cols: Optional list of column names to be converted to datetime.
+    :return: Whether any chunk was written.
+    """
+    chunks = iter(chunks)
+    seen_hashes = np.empty(0, dtype="uint64")
+    seen_refs = np.empty(0, dtype="int64")
+    schema, parts, categories = None, [], {}
+
+    # Parts are written uncompressed, so that rows of a known hash are read back
+    # zero-copy to compare them with later rows, see `_find_unseen_rows`
+    parts_dir = tempfile.TemporaryDirectory(dir=Path(output).parent, prefix=".parts-")
+    try:
+        while True:
+            with phase("read"):
+                raw_df = next(chunks, None)
+            if raw_df is None:
+                break
+
+            # Drop rows already seen in this or previous chunks
+            with phase("compute"):
+                raw_df = raw_df.loc[:, ~raw_df.columns.duplicated()]
+                int_df = preprocess(raw_df, rename, datetime_cols)
+                is_unseen, seen_hashes, seen_refs = _find_unseen_rows(
+                    int_df,
+                    _hash_rows(raw_df.loc[int_df.index]),
+                    seen_hashes,
+                    seen_refs,
+                    parts,
+                )
+                int_df = compact_dtypes(int_df.take(np.flatnonzero(is_unseen)))
+                _merge_categories(categories, int_df)
+            count_rows(inputs=len(raw_df), outputs=len(int_df))
+
+            with phase("write"):
+                table = pa.Table.from_pandas(
+                    int_df, preserve_index=False
+                ).replace_schema_metadata()
+                schema = table.schema if schema is None else schema
+                schema = _promote_schema(schema, table.schema)
+                part = Path(parts_dir.name) / f"{len(parts)}.feather"
+                feather.write_feather(table, part, compression="uncompressed")
+                parts.append(part)
+
+        if parts:
+            with phase("write"):
+                _concat_parts(parts, output, schema, categories)
+    finally:
+        parts_dir.cleanup()
+
+    return bool(parts)
+
+
+def _concat_parts(
+    parts: List[Path],
+    output: str,
+    schema: pa.Schema,
+    categories: Dict[str, Optional[pd.Index]],
+) -> None:
+    """
+    Concatenates Feather parts into a single Feather file, removing each
+    part once it's written.
+
+    :param parts: Paths of the parts, in order.
+    :param output: Path to the output Feather file.
+    :param schema: Promoted schema of the parts, see `_promote_schema`.
+    :param categories: Categories of categorical columns, see `_merge_categories`.
+    """
+    # Dictionaries of categorical columns are the same in every part, as a
+    # Feather file can't replace them between record batches
+    dtypes = {
+        col: pd.CategoricalDtype(values)
+        for col, values in categories.items()
+        if values is not None
+    }
+    schema = pa.schema(
+        pa.field(
+            field.name,
+            pa.array(pd.Categorical([], dtype=dtypes[field.name])).type
+            if field.name in dtypes
+            else field.type,
+        )
+        for field in schema
+    )
+
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    with pa.ipc.new_file(output, schema, options=options) as writer:
+        for part in parts:
+            table = read_feather_mmap(part)
+            columns = []
+            for field in schema:
+                column = table[field.name]
+                if field.name in dtypes:
+                    values = column.to_pandas().astype(dtypes[field.name])
+                    column = pa.array(values, type=field.type)
+                elif not column.type.equals(field.type):
+                    column = column.cast(field.type)
+                columns.append(column)
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            del table, columns
+            part.unlink()
+
+
+def _merge_categories(
+    categories: Dict[str, Optional[pd.Index]], df: pd.DataFrame
+) -> None:
+    """
+    Merges the categories of categorical columns of a chunk into the sorted
+    categories of previous chunks, in place, where columns that aren't
+    categorical in every chunk with values are mapped to None.
+
+    :param categories: Dictionary of column name to categories, or None.
+    :param df: Compacted DataFrame chunk.
+    """
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if col not in categories:
+                categories[col] = series.cat.categories
+            elif categories[col] is not None:
+                merged = categories[col].union(series.cat.categories)
+                categories[col] = merged.sort_values()
+        elif series.notna().any():
+            categories[col] = None
+
+
+def _promote_schema(schema: pa.Schema, other: pa.Schema) -> pa.Schema:
+    """
+    Promotes the types of two schemas of the same columns to types holding
+    the values of both, where numbers become floats if not all integers and
+    anything else becomes strings, as pandas reads mixed columns.
+
+    :param schema: First schema.
+    :param other: Second schema, with the same column names.
+    :return: Schema with promoted types.
+    """
+    fields = []
+    for field, other_field in zip(schema, other):
+        types = (field.type, other_field.type)
+        if field.type.equals(other_field.type) or pa.types.is_null(other_field.type):
+            type = field.type
+        elif pa.types.is_null(field.type):
+            type = other_field.type
+        elif all(pa.types.is_dictionary(t) for t in types):
+            # Dictionaries are replaced by the merged categories, see `_concat_parts`
+            type = field.type
+        elif all(pa.types.is_signed_integer(t) for t in types):
+            type = max(types, key=lambda t: t.bit_width)
+        elif all(pa.types.is_integer(t) for t in types):
+            type = pa.int64()
+        elif all(
+            pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t)
+            for t in types
+        ):
+            type = pa.float64()
+        else:
+            type = pa.string()
+        fields.append(pa.field(field.name, type))
+
+    return pa.schema(fields)
+
+
+def _iter_arrow_csv(
+    input: str,
+    schema: Dict[str, str],
+    timestamp_formats: Optional[List[str]] = None,
+    chunksize: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV file with pyarrow's multi-threaded reader using declared
+    column types, so that no type inference or datetime guessing is needed.
+
+    :param input: Path to the raw CSV file.
+    :param schema: Dictionary mapping raw column names to pyarrow type aliases.
+    :param timestamp_formats: Optional list of strptime formats for timestamp columns.
+    :param chunksize: Optional number of rows per chunk, read whole if not specified.
+    :return: Iterator of raw DataFrames, named the same way pandas names columns.
+    :raises KeyError: If any column declared in the schema is not in the file
+    :raises pa.ArrowInvalid: If values can't be parsed as the declared types
+    """
+    convert_options = pa_csv.ConvertOptions(
+        column_types={col: pa.type_for_alias(t) for col, t in schema.items()},
+        timestamp_parsers=timestamp_formats,
+        strings_can_be_null=True,
+    )
+
+    if chunksize is None:
+        batches = [pa_csv.read_csv(input, convert_options=convert_options)]
+    else:
+        batches = pa_csv.open_csv(input, convert_options=convert_options)
+
+    # Accumulate record batches into chunks of up to chunksize rows
+    pending, n_pending = [], 0
+    for batch in batches:
+        if not pending:
+            column_names = _mangle_column_names(batch.schema.names)
+            missing_columns = set(schema) - set(column_names)
+            if missing_columns:
+                raise KeyError(
+                    f"CSV is missing the following columns: {missing_columns}"
+                )
+
+        pending.append(batch)
+        n_pending += batch.num_rows
+        if chunksize is None or n_pending >= chunksize:
+            yield _batches_to_pandas(pending, column_names)
+            pending, n_pending = [], 0
+
+    if pending:
+        yield _batches_to_pandas(pending, column_names)
+
+
+def _batches_to_pandas(batches: list, column_names: List[str]) -> pd.DataFrame:
+    """
+    Converts pyarrow tables or record batches into a single DataFrame.
+
+    :param batches: List of pyarrow tables or record batches.
+    :param column_names: Column names to use for the DataFrame.
+    :return: DataFrame with the concatenated data.
+    """
+    table = pa.concat_tables(
+        [
+            pa.Table.from_batches([batch])
+            if isinstance(batch, pa.RecordBatch)
+            else batch
+            for batch in batches
+        ]
+    )
+    return table.rename_columns(column_names).to_pandas()
+
+
+def _mangle_column_names(column_names: List[str]) -> List[str]:
+    """
+    Names blank and duplicated columns the way `pd.read_csv` does,
+    e.g., 'Unnamed: 0' for a blank index column and 'a.1' for a second 'a'.
+
+    :param column_names: Column names as found in the CSV header.
+    :return: Unique column names.
+    """
+    mangled_names, counts = [], {}
+    for i, name in enumerate(column_names):
+        name = name or f"Unnamed: {i}"
+        if name in counts:
+            counts[name] += 1
+            name = f"{name}.{counts[name]}"
+        else:
+            counts[name] = 0
+        mangled_names.append(name)
+
+    return mangled_names
+
+
+def _hash_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hashes the rows of a raw DataFrame chunk.
+
+    :param df: DataFrame chunk to hash.
+    :return: Array of row hashes.
+    """
+    # Hash integers as floats, since chunks with missing values read them as floats
+    df = df.astype({col: "float64" for col in df.select_dtypes("integer").columns})
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _find_unseen_rows(
+    df: pd.DataFrame,
+    hashes: np.ndarray,
+    seen_hashes: np.ndarray,
+    seen_refs: np.ndarray,
+    parts: List[Path],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flags rows that haven't been seen in previous chunks.
+
+    Rows are looked up by hash, where rows whose hash was seen before are
+    compared by value with the earlier rows of the same hash, read back from
+    the parts already written, so that a hash collision never drops a
+    distinct row. Only hashes and references are kept, memory is bounded
+    by 16 bytes per unique row.
+
+    :param df: Preprocessed DataFrame chunk to check, without duplicated rows.
+    :param hashes: Hashes of the raw rows of the chunk, see `_hash_rows`.
+    :param seen_hashes: Sorted array of hashes of rows seen so far.
+    :param seen_refs: References of the rows seen so far, in the order of their
+        hashes, as the part number times 2**32 plus the row position.
+    :param parts: Paths of the parts written so far, where the unseen rows
+        are expected to be written to the next one.
+    :return: Boolean array flagging unseen rows, and the updated sorted hashes
+        and references.
+    """
+    # Pair rows with the earlier rows of the same hash, usually one at most
+    starts = np.searchsorted(seen_hashes, hashes, side="left")
+    counts = np.searchsorted(seen_hashes, hashes, side="right") - starts
+    rows = np.repeat(np.arange(len(df)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(counts.cumsum() - counts, counts)
+    refs = seen_refs[np.repeat(starts, counts) + offsets]
+
+    # Compare paired rows by value, reading earlier rows by part
+    is_seen = np.zeros(len(df), dtype=bool)
+    for part in np.unique(refs >> 32):
+        in_part = (refs >> 32) == part
+        seen_df = (
+            read_feather_mmap(parts[part]).take(refs[in_part] & 0xFFFFFFFF).to_pandas()
+        )
+        is_equal = _rows_equal(df.iloc[rows[in_part]], seen_df)
+        is_seen[rows[in_part][is_equal]] = True
+
+    # Merge hashes of unseen rows into the sorted seen hashes, where a stable
+    # sort of two sorted runs is linear
+    unseen = np.flatnonzero(~is_seen)
+    order = np.argsort(hashes[unseen], kind="stable")
+    hashes = np.concatenate([seen_hashes, hashes[unseen][order]])
+    refs = np.concatenate(
+        [seen_refs, (len(parts) << 32) + np.arange(len(unseen))[order]]
+    )
+    order = np.argsort(hashes, kind="stable")
+
+    return ~is_seen, hashes[order], refs[order]
+
+
+def _rows_equal(left: pd.DataFrame, right: pd.DataFrame) -> np.ndarray:
+    """
+    Compares two DataFrames with the same columns row by row, where missing
+        values equal each other like in `pd.DataFrame.duplicated`.
+
+    :param left: First DataFrame.
+    :param right: Second DataFrame, of the same length.
+    :return: Boolean array flagging equal rows.
+    """
+    is_equal = np.ones(len(left), dtype=bool)
+    for col in left.columns:
+        left_values, right_values = left[col].to_numpy(), right[col].to_numpy()
+        is_equal &= (left_values == right_values) | (
+            pd.isna(left_values) & pd.isna(right_values)
+        )
+
+    return is_equal
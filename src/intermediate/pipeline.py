@@ -1,21 +1,36 @@
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
+from typing import Any, Dict, List
+
+from src.metrics import new_run_id, run_instrumented
 
 from .nodes import preprocess_raw_data
 
 
 def run_intermediate_pipeline() -> None:
+    # Create intermediate directory if it doesn't exist
+    Path("data/02_intermediate").mkdir(parents=True, exist_ok=True)
+
+    # Leverage parallel processing, recording metrics of each node in its worker
+    with Pool() as pool:
+        pool.map(
+            partial(run_instrumented, preprocess_raw_data, run_id=new_run_id()),
+            get_intermediate_steps(),
+        )
+
+
+def get_intermediate_steps() -> List[Dict[str, Any]]:
     # TODO: with a proper config parser, the filepaths
     # and parameters below should be controlled via
     # conf/catalog.yml and conf/parameters.yml
     raw_dir = Path("data/01_raw")
     int_dir = Path("data/02_intermediate")
-
-    # Create intermediate directory if it doesn't exist
-    int_dir.mkdir(parents=True, exist_ok=True)
+    # Raw dates and timestamps, parsed with these formats instead of inferred
+    timestamp_formats = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]
 
     # Declare each step to preprocess raw data into intermediate data
-    steps = [
+    return [
         dict(
             input=raw_dir / "consumer.csv",
             output=int_dir / "consumer.feather",
@@ -24,11 +39,21 @@ def run_intermediate_pipeline() -> None:
                 "TransactionCount": "Transaction Count",
             },
             datetime_cols=["Date", "Timestamp"],
+            chunksize=500_000,
+            schema={
+                "Date": "timestamp[ns]",
+                "Timestamp": "timestamp[ns]",
+                "CreditCardSpend": "double",
+                "TransactionCount": "int64",
+            },
+            timestamp_formats=timestamp_formats,
         ),
         dict(
             input=raw_dir / "prices.csv",
             output=int_dir / "prices.feather",
             datetime_cols=["Date", "Timestamp"],
+            schema={"Date": "timestamp[ns]", "Timestamp": "timestamp[ns]"},
+            timestamp_formats=timestamp_formats,
         ),
         dict(
             input=raw_dir / "web.csv",
@@ -37,6 +62,13 @@ def run_intermediate_pipeline() -> None:
                 "WebsiteVisits": "Website Visits",
             },
             datetime_cols=["Date", "Timestamp"],
+            chunksize=500_000,
+            schema={
+                "Date": "timestamp[ns]",
+                "Timestamp": "timestamp[ns]",
+                "WebsiteVisits": "int64",
+            },
+            timestamp_formats=timestamp_formats,
         ),
         dict(
             input=raw_dir / "sec_master.csv",
@@ -44,13 +76,12 @@ def run_intermediate_pipeline() -> None:
             rename={
                 "CompanyName": "Company Name",
             },
+            schema={"CompanyName": "string"},
+            # Uncompressed, so that primary workers share its memory-mapped pages
+            write_kwargs=dict(compression="uncompressed"),
         ),
     ]
 
-    # Leverage parallel processing
-    with Pool() as pool:
-        pool.map(preprocess_raw_data, steps)
-
 
 if __name__ == "__main__":
     run_intermediate_pipeline()
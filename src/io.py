@@ -2,9 +2,37 @@
 Helper functions to facilitate pipeline building
 """
 
-from typing import Any, Dict
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+
+from src.metrics import count_rows, phase
+
+# Compact dtypes of known columns by name pattern, see `compact_dtypes`
+COMPACT_DTYPES = {
+    "company_name": "category",
+    "symbol": "category",
+    "agg_freq": "category",
+    "dt_label": "category",
+    "week": "category",
+    "*_id": "integer",
+    "year": "integer",
+    "quarter": "integer",
+    "month": "integer",
+    "transaction_count*": "integer",
+    "website_visits*": "integer",
+}
 
 
 def run_node(args: Dict[str, Any]) -> None:
@@ -14,13 +42,664 @@ def run_node(args: Dict[str, Any]) -> None:
         args.pop("inputs"),
         args.pop("output"),
     )
+    write_kwargs = args.pop("write_kwargs", {})
+    sort_cols = args.pop("sort_cols", None)
+    mmap_inputs = {Path(path) for path in args.pop("mmap_inputs", [])}
+    input_columns = {
+        Path(path): columns for path, columns in args.pop("input_columns", {}).items()
+    }
+    copy_free = args.pop("copy_free", True)
     kwargs = args
 
-    # Collect all input dataframes
-    dfs = [pd.read_feather(input_path) for input_path in inputs]
+    # Collect all input dataframes, where parquet paths are partitioned datasets
+    # and dimension tables shared across workers are memory-mapped. In copy-free
+    # mode, only the declared columns are read, see `read_feather`
+    with phase("read"):
+        dfs = _read_inputs(inputs, mmap_inputs, input_columns, copy_free)
+    n_input_rows = sum(len(df) for df in dfs)
 
     # Call function to process data
-    processed_df = function(*dfs, **kwargs)
+    with phase("compute"):
+        processed_df = function(*dfs, **kwargs)
+    count_rows(inputs=n_input_rows, outputs=len(processed_df))
 
     # Save data to local
-    processed_df.to_feather(output)
+    with phase("write"):
+        if Path(output).suffix == ".parquet":
+            write_dataset(processed_df, output, **write_kwargs)
+        else:
+            write_feather(processed_df, output, sort_cols, **write_kwargs)
+
+
+def read_feather(
+    path: Union[str, Path], columns: Optional[List[str]] = None, copy_free: bool = True
+) -> pd.DataFrame:
+    """
+    Read a feather file, restoring the sort order recorded by `write_feather`
+        in `df.attrs['sorted_by']`.
+
+    :param path: Path to the feather file
+    :param columns: Columns to read (default: all), where columns of compressed
+        files that aren't read aren't decompressed either
+    :param copy_free: Whether to keep each column in its own pandas block instead
+        of consolidating columns of the same dtype into 2D blocks, and to
+        release Arrow buffers as soon as their column is converted, which
+        avoids holding both copies and makes dropping columns copy-free
+    :return: DataFrame with the file's data
+    """
+    table = feather.read_table(path, columns=columns)
+    metadata = table.schema.metadata or {}
+    if copy_free:
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+    else:
+        df = table.to_pandas()
+
+    sorted_by = metadata.get(b"sorted_by")
+    if sorted_by is not None:
+        df.attrs["sorted_by"] = json.loads(sorted_by)
+
+    return df
+
+
+def write_feather(
+    df: pd.DataFrame,
+    path: Union[str, Path],
+    sort_cols: Optional[List[str]] = None,
+    metadata: Optional[Dict[str, str]] = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Write a DataFrame to a feather file with compact dtypes, see `compact_dtypes`,
+        optionally sorted, in which case the sort order is recorded in the file
+        metadata so that readers can rely on it, see `read_feather`.
+
+    :param df: The DataFrame to write
+    :param path: Path to the feather file
+    :param sort_cols: Columns to sort rows by (default: keep the order as is)
+    :param metadata: Key-value pairs to record in the file metadata, e.g., a
+        version of the data, see `read_feather_metadata`
+    :param kwargs: Options passed on to `pyarrow.feather.write_feather`,
+        e.g., compression
+    """
+    df = compact_dtypes(df)
+    if sort_cols is None and metadata is None:
+        with atomic_path(path) as tmp_path:
+            df.to_feather(tmp_path, **kwargs)
+        return
+
+    if sort_cols is not None:
+        df = df.sort_values(sort_cols, kind="stable")
+        metadata = {**(metadata or {}), "sorted_by": json.dumps(sort_cols)}
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, **metadata})
+    with atomic_path(path) as tmp_path:
+        feather.write_feather(table, tmp_path, **kwargs)
+
+
+def read_feather_metadata(path: Union[str, Path]) -> Dict[str, str]:
+    """
+    Read the metadata of a feather file, e.g., recorded by `write_feather`,
+        from its footer without reading any data.
+
+    :param path: Path to the feather file
+    :return: Key-value pairs of the file metadata, empty if there's no file
+    """
+    if not Path(path).exists():
+        return {}
+
+    with pa.memory_map(str(path), "r") as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+
+    return {key.decode(): value.decode() for key, value in metadata.items()}
+
+
+@contextmanager
+def atomic_path(path: Union[str, Path]) -> Iterator[Path]:
+    """
+    Provide a temporary path to write a file to, which then replaces the file
+        at the given path in a single rename. Readers never see a partially
+        written file, and processes memory-mapping the previous file, e.g.,
+        dashboard workers, keep reading it, whereas rewriting it in place
+        would truncate the pages they map and crash them with SIGBUS.
+
+    :param path: Path of the file to write
+    :return: Temporary path in the same directory, removed if writing fails
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def compact_dtypes(
+    df: pd.DataFrame, dtypes: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Convert columns to compact dtypes declared by name pattern. Strings become
+        categoricals with sorted categories, so that they sort like strings and
+        are stored as dictionaries in feather and parquet files, and integers
+        are downcast to the smallest type holding their values. Floats are kept
+        as is, as float32 can't hold most values exactly.
+
+    :param df: The DataFrame to convert, which is left unchanged
+    :param dtypes: Dictionary of column name pattern, see `fnmatch`, to 'category'
+        or 'integer', where the first matching pattern applies
+        (default: COMPACT_DTYPES)
+    :return: DataFrame with converted columns, or the input if none changed
+    """
+    dtypes = COMPACT_DTYPES if dtypes is None else dtypes
+
+    converted = {}
+    for col in df.columns:
+        kind = next(
+            (
+                kind
+                for pattern, kind in dtypes.items()
+                if fnmatchcase(str(col), pattern)
+            ),
+            None,
+        )
+        series = df[col]
+        if kind == "category" and isinstance(series.dtype, pd.CategoricalDtype):
+            # Categories may be unused or unsorted after filters and concats
+            compacted = series.cat.remove_unused_categories()
+            categories = compacted.cat.categories
+            if not categories.is_monotonic_increasing:
+                compacted = compacted.cat.reorder_categories(categories.sort_values())
+            if not compacted.cat.categories.equals(series.cat.categories):
+                converted[col] = compacted
+        elif kind == "category" and pd.api.types.is_string_dtype(series):
+            converted[col] = series.astype("category")
+        elif kind == "integer" and pd.api.types.is_integer_dtype(series):
+            downcast = pd.to_numeric(series, downcast="integer")
+            if downcast.dtype != series.dtype:
+                converted[col] = downcast
+
+    if not converted:
+        return df
+
+    # Replace columns of a shallow copy, without copying the other ones
+    df = df.copy(deep=False)
+    for col, series in converted.items():
+        df[col] = series
+
+    return df
+
+
+def read_feather_mmap(
+    path: Union[str, Path], columns: Optional[List[str]] = None
+) -> pa.Table:
+    """
+    Memory-map a feather file as a pyarrow Table.
+
+    Pages of the file are loaded on access and shared between processes
+    mapping the same file. Uncompressed files are read zero-copy, so a
+    column only takes up memory once its data is accessed; compressed
+    files are decompressed into memory as usual.
+
+    :param path: Path to the feather file
+    :param columns: Columns to select (default: all)
+    :return: Table backed by the memory-mapped file
+    """
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    return table if columns is None else table.select(columns)
+
+
+def feather_batch_offsets(path: Union[str, Path]) -> np.ndarray:
+    """
+    Find the row offsets of the record batches of a feather file, only reading
+        the first column of each batch to count its rows.
+
+    :param path: Path to the feather file
+    :return: Array with the first row of each batch, followed by the number of rows
+    """
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(
+            source, options=pa.ipc.IpcReadOptions(included_fields=[0])
+        )
+        n_rows = [
+            reader.get_batch(i).num_rows for i in range(reader.num_record_batches)
+        ]
+
+    return np.cumsum([0] + n_rows, dtype=np.int64)
+
+
+def read_feather_rows(
+    path: Union[str, Path],
+    positions: np.ndarray,
+    offsets: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    Read rows of a feather file by position, only reading and decompressing
+        the record batches that hold them, e.g., rows appended since a previous
+        read of the file.
+
+    :param path: Path to the feather file
+    :param positions: Sorted positions of the rows to read
+    :param offsets: Row offsets of the record batches (default: looked up, see
+        `feather_batch_offsets`)
+    :return: DataFrame with the rows, in the order of their positions
+    """
+    if offsets is None:
+        offsets = feather_batch_offsets(path)
+    positions = np.asarray(positions, dtype=np.int64)
+    batches = np.searchsorted(offsets, positions, side="right") - 1
+    read_batches, codes = np.unique(batches, return_inverse=True)
+
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        table = pa.Table.from_batches(
+            [reader.get_batch(i) for i in read_batches], schema=reader.schema
+        )
+
+    # Positions within the batches read, where a run of rows is a zero-copy slice
+    lengths = np.diff(offsets)[read_batches]
+    starts = np.cumsum(lengths) - lengths
+    positions = positions - offsets[batches] + starts[codes]
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        table = table.slice(positions[0], len(positions))
+    else:
+        table = table.take(positions)
+
+    # Rows are taken in file order, so they keep its sort order
+    df = table.to_pandas()
+    sorted_by = (table.schema.metadata or {}).get(b"sorted_by")
+    if sorted_by is not None:
+        df.attrs["sorted_by"] = json.loads(sorted_by)
+
+    return df
+
+
+def hash_feather_rows(
+    path: Union[str, Path],
+    row_counts: List[int],
+    offsets: Optional[np.ndarray] = None,
+) -> List[Optional[str]]:
+    """
+    Hash the first rows of a feather file, for several numbers of rows at once,
+        e.g., to check that rows seen by a previous read weren't rewritten. The
+        record batches holding them are streamed one at a time in a single pass,
+        and hashes only depend on the rows, not on how they're split into batches.
+
+    :param path: Path to the feather file
+    :param row_counts: Numbers of first rows to hash
+    :param offsets: Row offsets of the record batches (default: looked up, see
+        `feather_batch_offsets`)
+    :return: Hex digest of the first rows for each number of rows, or None if
+        it's not positive or the file has fewer rows
+    """
+    if offsets is None:
+        offsets = feather_batch_offsets(path)
+    n_rows = max([n for n in row_counts if 0 < n <= offsets[-1]], default=0)
+    digest = hashlib.sha256()
+    digests: Dict[int, str] = {}
+
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in np.flatnonzero(offsets[:-1] < n_rows):
+            row_hashes = pd.util.hash_pandas_object(
+                reader.get_batch(int(i)).to_pandas(), index=False
+            ).to_numpy()
+
+            # Hash the part of the batch before counts ending within it
+            start, end = offsets[i], offsets[i + 1]
+            for n in row_counts:
+                if start < n < end:
+                    partial = digest.copy()
+                    partial.update(row_hashes[: n - start].tobytes())
+                    digests[n] = partial.hexdigest()
+            digest.update(row_hashes.tobytes())
+            digests[int(end)] = digest.hexdigest()
+
+    return [digests.get(n) if 0 < n <= n_rows else None for n in row_counts]
+
+
+def append_changes(
+    path: Union[str, Path], changes_df: pd.DataFrame, base_version: str, version: str
+) -> None:
+    """
+    Record the rows of a versioned file that changed from one version to the
+        next in a change log next to it, '<stem>_changes.feather', so that
+        downstream nodes can update their outputs from the changed rows only,
+        see `read_changes`. Changes of consecutive versions accumulate until the
+        log is cleared.
+
+    :param path: Path to the file, whose version is recorded in its metadata,
+        see `write_feather`
+    :param changes_df: Rows that changed, as in the new version of the file
+    :param base_version: Version of the file the changes apply to
+    :param version: Version of the file including the changes
+    """
+    log_path = _change_log_path(path)
+    log_metadata = read_feather_metadata(log_path)
+    if log_metadata.get("version") == base_version:
+        changes_df = pd.concat([read_feather(log_path), changes_df], ignore_index=True)
+        base_version = log_metadata["base_version"]
+
+    write_feather(
+        changes_df, log_path, metadata=dict(base_version=base_version, version=version)
+    )
+
+
+def read_changes(
+    path: Union[str, Path], since_version: Optional[str]
+) -> Optional[pd.DataFrame]:
+    """
+    Read the rows of a versioned file that changed since a given version,
+        see `append_changes`.
+
+    :param path: Path to the file
+    :param since_version: Version of the file read previously
+    :return: Changed rows in the order they were recorded, where later rows
+        supersede earlier rows of the same key, an empty DataFrame if the file
+        is unchanged, or None if its changes since that version aren't known
+    """
+    version = read_feather_metadata(path).get("version")
+    if version is None or since_version is None:
+        return None
+    if version == since_version:
+        return pd.DataFrame()
+
+    log_path = _change_log_path(path)
+    log_metadata = read_feather_metadata(log_path)
+    if [log_metadata.get("base_version"), log_metadata.get("version")] != [
+        since_version,
+        version,
+    ]:
+        return None
+
+    return read_feather(log_path)
+
+
+def clear_changes(path: Union[str, Path]) -> None:
+    """
+    Remove the change log of a file, e.g., once its changes were read or when
+        the file was rebuilt from scratch, see `append_changes`.
+
+    :param path: Path to the file
+    """
+    _change_log_path(path).unlink(missing_ok=True)
+
+
+def write_dataset(
+    df: pd.DataFrame,
+    path: Union[str, Path],
+    partition_cols: List[str],
+    n_buckets: Optional[int] = None,
+    sort_cols: Optional[List[str]] = None,
+    rows_per_group: int = 16 * 1024,
+    companies: Optional[List[str]] = None,
+) -> None:
+    """
+    Write a DataFrame as a hive-partitioned parquet dataset with compact dtypes,
+        see `compact_dtypes`, replacing any previous dataset at the path.
+
+    Rows are sorted within each partition so that row groups cover narrow
+    ranges of the sort columns, letting `read_dataset` skip row groups by
+    their min/max statistics.
+
+    :param df: The DataFrame to write
+    :param path: Directory of the dataset
+    :param partition_cols: Columns to partition on, where 'company_bucket' is
+        derived from company_name, see n_buckets
+    :param n_buckets: Number of company hash buckets, required when
+        partitioning on 'company_bucket'
+    :param sort_cols: Columns to sort rows by (default: company_name and date)
+    :param rows_per_group: Number of rows per row group, where smaller groups
+        can be skipped more selectively but add metadata overhead
+    :param companies: Companies whose rows changed since the previous dataset
+        was written, so that only the company buckets holding them are
+        rewritten, when partitioning on 'company_bucket' and the schema of the
+        previous dataset holds the data (default: rewrite the whole dataset)
+    :raises ValueError: If partitioning on 'company_bucket' without n_buckets
+    """
+    sort_cols = ["company_name", "date"] if sort_cols is None else sort_cols
+    df = compact_dtypes(df)
+    metadata = {"columns": json.dumps(df.columns.to_list())}
+    if "company_bucket" in partition_cols:
+        if n_buckets is None:
+            raise ValueError("n_buckets is required to partition on company_bucket")
+        df = df.assign(company_bucket=_company_buckets(df["company_name"], n_buckets))
+        metadata["n_buckets"] = str(n_buckets)
+
+    # Only rewrite the buckets of changed companies, see `_write_partitions`
+    path = Path(path)
+    if companies is not None and "company_bucket" in partition_cols and path.exists():
+        buckets = np.unique(_company_buckets(list(companies), n_buckets))
+        bucket_df = df[df["company_bucket"].isin(buckets)]
+        table = pa.Table.from_pandas(
+            bucket_df.sort_values(sort_cols, kind="stable"), preserve_index=False
+        )
+        table = table.replace_schema_metadata({**table.schema.metadata, **metadata})
+        if _write_partitions(
+            table, path, partition_cols, buckets.tolist(), rows_per_group
+        ):
+            return
+
+    table = pa.Table.from_pandas(
+        df.sort_values(sort_cols, kind="stable"), preserve_index=False
+    )
+    table = table.replace_schema_metadata({**table.schema.metadata, **metadata})
+
+    # Start from scratch so that partitions of removed rows don't linger
+    shutil.rmtree(path, ignore_errors=True)
+    _write_parquet_dataset(table, path, partition_cols, rows_per_group)
+
+
+def read_dataset(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    company_name: Optional[Union[str, List[str]]] = None,
+    agg_freq: Optional[Union[str, List[str]]] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Read a dataset written by `write_dataset`, pushing predicates down so that
+        only matching partitions and row groups are decoded.
+
+    :param path: Directory of the dataset
+    :param columns: Columns to read (default: all)
+    :param company_name: Company or companies to read (default: all)
+    :param agg_freq: Aggregation frequency or frequencies to read (default: all)
+    :param start_date: Start of the date window, inclusive (default: no bound)
+    :param end_date: End of the date window, inclusive (default: no bound)
+    :return: DataFrame with the matching rows, in the column order written
+    """
+    # Partition values are read as dictionaries, like other categorical columns
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+    )
+    metadata = dataset.schema.metadata or {}
+
+    # Partition columns prune files, other columns prune row groups by statistics
+    predicates = []
+    if company_name is not None:
+        company_names = (
+            [company_name] if isinstance(company_name, str) else company_name
+        )
+        predicates.append(ds.field("company_name").isin(company_names))
+        if b"n_buckets" in metadata:
+            buckets = _company_buckets(company_names, int(metadata[b"n_buckets"]))
+            predicates.append(ds.field("company_bucket").isin(buckets))
+    if agg_freq is not None:
+        agg_freqs = [agg_freq] if isinstance(agg_freq, str) else agg_freq
+        predicates.append(ds.field("agg_freq").isin(agg_freqs))
+    if start_date is not None:
+        predicates.append(ds.field("date") >= pd.Timestamp(start_date))
+    if end_date is not None:
+        predicates.append(ds.field("date") <= pd.Timestamp(end_date))
+
+    expression = None
+    for predicate in predicates:
+        expression = predicate if expression is None else expression & predicate
+
+    # Restore the written column order, as partition columns come last
+    if columns is None:
+        columns = json.loads(metadata[b"columns"])
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def _company_buckets(
+    company_names: Union[pd.Series, List[str]], n_buckets: int
+) -> np.ndarray:
+    """
+    Assign companies to hash buckets, stable across processes and runs.
+
+    :param company_names: Company names to assign
+    :param n_buckets: Number of buckets
+    :return: Bucket of each company
+    """
+    # Only hash the categories of categoricals and broadcast them via codes
+    if (
+        isinstance(getattr(company_names, "dtype", None), pd.CategoricalDtype)
+        and not company_names.isna().any()
+    ):
+        buckets = _company_buckets(company_names.cat.categories, n_buckets)
+        return buckets.take(company_names.cat.codes.to_numpy())
+
+    hashes = pd.util.hash_array(np.asarray(company_names, dtype=object))
+
+    return (hashes % n_buckets).astype(np.int32)
+
+
+def _write_partitions(
+    table: pa.Table,
+    path: Path,
+    partition_cols: List[str],
+    buckets: List[int],
+    rows_per_group: int,
+) -> bool:
+    """
+    Replace the company buckets of a dataset written by `write_dataset` with
+        the rows of a table, leaving other partitions as they are.
+
+    Rows are cast to the schema of the previous dataset, e.g., to the integer
+    types its values were downcast to, so that all files of the dataset keep
+    sharing one schema. New partitions are written next to the dataset first
+    and then moved in place of the old ones, directory by directory.
+
+    :param table: Rows of the buckets to replace
+    :param path: Directory of the dataset
+    :param partition_cols: Columns the dataset is partitioned on
+    :param buckets: Company buckets to replace, including buckets left empty
+    :param rows_per_group: Number of rows per row group
+    :return: Whether the buckets were replaced, False if the rows don't fit
+        the schema of the previous dataset
+    """
+    # Partition columns aren't stored in the files, only in directory names
+    schema = ds.dataset(path, format="parquet").schema
+    data_cols = [col for col in table.column_names if col not in partition_cols]
+    if set(data_cols) != set(schema.names):
+        return False
+    try:
+        table = table.cast(
+            pa.schema(
+                [
+                    schema.field(field.name) if field.name in data_cols else field
+                    for field in table.schema
+                ],
+                metadata=table.schema.metadata,
+            )
+        )
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return False
+
+    # Write the new partitions aside, then move them in place of the old ones
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    try:
+        _write_parquet_dataset(table, tmp_path, partition_cols, rows_per_group)
+        for bucket in buckets:
+            for old_dir in path.glob(f"**/company_bucket={bucket}"):
+                shutil.rmtree(old_dir)
+            for new_dir in tmp_path.glob(f"**/company_bucket={bucket}"):
+                old_dir = path / new_dir.relative_to(tmp_path)
+                old_dir.parent.mkdir(parents=True, exist_ok=True)
+                new_dir.rename(old_dir)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    return True
+
+
+def _write_parquet_dataset(
+    table: pa.Table, path: Path, partition_cols: List[str], rows_per_group: int
+) -> None:
+    """
+    Write a table as a hive-partitioned parquet dataset, see `write_dataset`.
+
+    :param table: Rows to write, sorted within partitions
+    :param path: Directory of the dataset, which must not hold any files yet
+    :param partition_cols: Columns to partition on
+    :param rows_per_group: Number of rows per row group
+    """
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive",
+        basename_template="part-{i}.parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(version="2.6"),
+        # Buffer rows, which arrive in slices of the input batches per partition
+        min_rows_per_group=rows_per_group,
+        max_rows_per_group=rows_per_group,
+        # Keep the sort order within partitions
+        use_threads=False,
+    )
+
+
+def _change_log_path(path: Union[str, Path]) -> Path:
+    """
+    Get the path of the change log of a file, see `append_changes`.
+
+    :param path: Path to the file
+    :return: Path of its change log
+    """
+    path = Path(path)
+
+    return path.with_name(f"{path.stem}_changes.feather")
+
+
+def _read_inputs(
+    inputs: List[Union[str, Path]],
+    mmap_inputs: Set[Path],
+    input_columns: Dict[Path, List[str]],
+    copy_free: bool,
+) -> List[pd.DataFrame]:
+    """
+    Read the inputs of a node, see `run_node`.
+
+    :param inputs: Paths to the input files or partitioned datasets
+    :param mmap_inputs: Paths of inputs to memory-map
+    :param input_columns: Columns to read by input path (default: all)
+    :param copy_free: Whether to only read declared columns into per-column blocks
+    :return: Input DataFrames
+    """
+    if copy_free:
+        return [
+            read_dataset(input_path, columns=input_columns.get(Path(input_path)))
+            if Path(input_path).suffix == ".parquet"
+            else read_feather_mmap(input_path, input_columns.get(Path(input_path)))
+            if Path(input_path) in mmap_inputs
+            else read_feather(input_path, input_columns.get(Path(input_path)))
+            for input_path in inputs
+        ]
+
+    return [
+        read_dataset(input_path)
+        if Path(input_path).suffix == ".parquet"
+        else read_feather(input_path, copy_free=False)
+        for input_path in inputs
+    ]
@@ -0,0 +1,303 @@
+"""
+Per-node metrics of pipeline runs.
+
+Each instrumented node records its wall time, CPU time, peak resident
+memory, row and byte counts of its inputs and outputs, and a breakdown of
+its read, compute, and write phases, appended as a JSON line to a run log
+shared by all worker processes. Runners mark their phases with `phase` and
+report row counts with `count_rows`, both of which do nothing outside of an
+instrumented node, so runners can still be called on their own.
+"""
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from src.cache import path_size, run_cached
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_RUN_LOG = Path("data/logs/run_log.jsonl")
+DEFAULT_PROFILE_DIR = Path("data/logs/profiles")
+
+logger = logging.getLogger(__name__)
+
+# Record of the node running in this process, see `instrument`
+_record: Optional[Dict[str, Any]] = None
+
+
+def run_instrumented(
+    runner: Callable[[Dict[str, Any]], None],
+    args: Dict[str, Any],
+    run_log: Union[str, Path] = DEFAULT_RUN_LOG,
+    run_id: Optional[str] = None,
+    profile_dir: Optional[Union[str, Path]] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> Dict[str, Any]:
+    """
+    Run a pipeline node and append its metrics to the run log.
+
+    :param runner: Function running the node, e.g., run_node or preprocess_raw_data
+    :param args: Step dictionary passed on to the runner
+    :param run_log: Path to the JSON lines run log
+    :param run_id: Identifier shared by the nodes of a run, see `new_run_id`
+    :param profile_dir: Optional directory to write a cProfile capture of the
+        node to, as '<run_id>/<node>.prof'
+    :param cache_dir: Optional directory of the node cache, see
+        `src.cache.run_cached`, cache hits are recorded as such
+    :return: Metrics of the node
+    """
+    function = args.get("function", runner)
+    inputs = args["inputs"] if "inputs" in args else [args["input"]]
+
+    with instrument(
+        f"{function.__name__}[{Path(args['output']).stem}]",
+        inputs,
+        [args["output"]],
+        run_log,
+        run_id,
+        profile_dir,
+    ) as record:
+        if cache_dir is None:
+            runner(dict(args))
+        else:
+            record["cached"] = run_cached(runner, args, cache_dir)
+
+    return record
+
+
+@contextmanager
+def instrument(
+    node: str,
+    inputs: List[Union[str, Path]],
+    outputs: List[Union[str, Path]],
+    run_log: Union[str, Path] = DEFAULT_RUN_LOG,
+    run_id: Optional[str] = None,
+    profile_dir: Optional[Union[str, Path]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Record metrics of the code run in the context as a pipeline node, and
+    append them to the run log on exit, also when it fails.
+
+    CPU time includes child processes waited for in the context, e.g., pool
+    workers of the node, whose phases aren't broken down.
+
+    :param node: Name of the node
+    :param inputs: Paths of the files or directories the node reads
+    :param outputs: Paths of the files or directories the node writes
+    :param run_log: Path to the JSON lines run log
+    :param run_id: Identifier shared by the nodes of a run, see `new_run_id`
+    :param profile_dir: Optional directory to write a cProfile capture of the
+        node to, as '<run_id>/<node>.prof'
+    :return: Record of the node, filled in on exit
+    """
+    global _record
+    parent_record = _record
+    record = _record = dict(
+        run_id=run_id,
+        node=node,
+        pid=os.getpid(),
+        started=datetime.now().isoformat(timespec="milliseconds"),
+        status="ok",
+        cached=False,
+        input_rows=None,
+        output_rows=None,
+        phases={},
+    )
+
+    # Nested nodes are covered by the peak and profile of their enclosing node
+    profiler = (
+        cProfile.Profile()
+        if profile_dir is not None and parent_record is None
+        else None
+    )
+    if parent_record is None:
+        reset_peak_memory()
+    start_memory = peak_memory()
+    start_wall, start_cpu = time.perf_counter(), _cpu_time()
+
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield record
+    except BaseException as error:
+        record.update(status="error", error=repr(error))
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _record = parent_record
+
+        peak = peak_memory()
+        record.update(
+            wall_seconds=time.perf_counter() - start_wall,
+            cpu_seconds=_cpu_time() - start_cpu,
+            peak_rss_bytes=peak,
+            peak_rss_above_start_bytes=(
+                peak - start_memory if peak is not None else None
+            ),
+            input_bytes=sum(path_size(Path(path), missing_ok=True) for path in inputs),
+            output_bytes=sum(
+                path_size(Path(path), missing_ok=True) for path in outputs
+            ),
+        )
+
+        if profiler is not None:
+            profile_path = Path(profile_dir) / str(run_id) / f"{node}.prof"
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            record["profile"] = str(profile_path)
+
+        _append(Path(run_log), record)
+        logger.info(
+            "%s: %.2fs wall, %.2fs CPU, peak memory %s, %s rows in, %s rows out%s",
+            node,
+            record["wall_seconds"],
+            record["cpu_seconds"],
+            f"{peak / 1024**2:.1f} MiB" if peak is not None else "n/a",
+            record["input_rows"],
+            record["output_rows"],
+            " (cached)" if record["cached"] else "",
+        )
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Add the wall and CPU time spent in the context to a phase of the running
+    node, e.g., 'read', 'compute', or 'write'. Times of repeated phases, e.g.,
+    of streamed chunks, add up.
+
+    :param name: Name of the phase
+    """
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        if _record is not None:
+            phases = _record["phases"].setdefault(
+                name, dict(wall_seconds=0.0, cpu_seconds=0.0)
+            )
+            phases["wall_seconds"] += time.perf_counter() - start_wall
+            phases["cpu_seconds"] += time.process_time() - start_cpu
+
+
+def count_rows(inputs: int = 0, outputs: int = 0) -> None:
+    """
+    Add to the input and output row counts of the running node.
+
+    :param inputs: Number of rows read
+    :param outputs: Number of rows written
+    """
+    if _record is None:
+        return
+
+    for key, n_rows in [("input_rows", inputs), ("output_rows", outputs)]:
+        _record[key] = (_record[key] or 0) + n_rows
+
+
+def new_run_id() -> str:
+    """
+    Create an identifier for a pipeline run.
+
+    :return: Start time of the run and the id of the process starting it
+    """
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+
+
+def read_run_log(
+    run_log: Union[str, Path] = DEFAULT_RUN_LOG, run_id: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Read node metrics from the run log, with phases flattened into columns,
+    e.g., 'phases.read.wall_seconds'.
+
+    :param run_log: Path to the JSON lines run log
+    :param run_id: Run to read (default: all runs), 'latest' for the last one
+    :return: DataFrame with a row per node run
+    """
+    with open(run_log) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    df = pd.json_normalize(records)
+
+    if run_id == "latest" and not df.empty:
+        run_id = df["run_id"].iloc[-1]
+    if run_id is not None:
+        df = df[df["run_id"] == run_id].reset_index(drop=True)
+
+    return df
+
+
+def reset_peak_memory() -> None:
+    """
+    Reset the peak resident memory of the process, so that `peak_memory` covers
+        what runs next, e.g., a pipeline node in a reused worker process. Only
+        supported on Linux, elsewhere the peak covers the process lifetime.
+    """
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_memory() -> Optional[int]:
+    """
+    Get the peak resident memory of the process since `reset_peak_memory`.
+
+    :return: Peak resident memory in bytes, or None if it isn't available
+    """
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    # Bytes on macOS, kibibytes elsewhere
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _cpu_time() -> float:
+    """
+    Get the CPU time of the process and of its terminated child processes.
+
+    :return: User and system CPU seconds
+    """
+    if resource is None:
+        return time.process_time()
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _append(run_log: Path, record: Dict[str, Any]) -> None:
+    """
+    Append a record to the run log as a single write, so that lines of
+    concurrent worker processes don't interleave.
+
+    :param run_log: Path to the JSON lines run log
+    :param record: Record to append
+    """
+    run_log.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+
+    fd = os.open(run_log, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
@@ -1,13 +1,96 @@
-from feature.pipeline import run_feature_pipeline
-from intermediate.pipeline import run_intermediate_pipeline
-from primary.pipeline import run_primary_pipeline
+import argparse
+import logging
 
+from feature.pipeline import (
+    get_feature_runner,
+    get_feature_steps,
+    run_incremental_feature_pipeline,
+)
+from intermediate.nodes import preprocess_raw_data
+from intermediate.pipeline import get_intermediate_steps
+from primary.pipeline import (
+    get_primary_steps,
+    run_incremental_primary_node,
+    run_primary_node,
+)
+from src.cache import DEFAULT_CACHE_DIR
+from src.metrics import DEFAULT_PROFILE_DIR, DEFAULT_RUN_LOG, instrument, new_run_id
+from src.scheduler import run_dag
 
-def run_pipeline():
-    run_intermediate_pipeline()
-    run_primary_pipeline()
-    run_feature_pipeline()
+
+def run_pipeline(
+    incremental: bool = False,
+    max_workers: int = None,
+    use_cache: bool = True,
+    profile: bool = False,
+):
+    # Record metrics of every node of this run, see `src.metrics`
+    run_id = new_run_id()
+    profile_dir = DEFAULT_PROFILE_DIR if profile else None
+
+    # Gather nodes of all layers and let the scheduler order them
+    nodes = [(preprocess_raw_data, step) for step in get_intermediate_steps()]
+    # Primary outputs and the master DataFrame are versioned by full runs too,
+    # so that the next incremental run only reads what changed since
+    primary_runner = run_incremental_primary_node if incremental else run_primary_node
+    nodes += [(primary_runner, step) for step in get_primary_steps()]
+    if not incremental:
+        nodes += [(get_feature_runner(step), step) for step in get_feature_steps()]
+
+    run_dag(
+        nodes,
+        max_workers=max_workers,
+        cache_dir=DEFAULT_CACHE_DIR if use_cache else None,
+        run_log=DEFAULT_RUN_LOG,
+        run_id=run_id,
+        profile_dir=profile_dir,
+    )
+
+    if incremental:
+        with instrument(
+            "run_incremental_feature_pipeline",
+            [step["output"] for step in get_primary_steps()],
+            [step["output"] for step in get_feature_steps()],
+            run_id=run_id,
+            profile_dir=profile_dir,
+        ):
+            run_incremental_feature_pipeline()
 
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Only merge new primary layer data into the latest records, and "
+            "recompute feature layer rows and periods touched by it"
+        ),
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Maximum number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rerun every node instead of restoring unchanged ones from the cache",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"Write a cProfile capture of each node to {DEFAULT_PROFILE_DIR}",
+    )
+    args = parser.parse_args()
+
+    # Report progress of nodes, e.g., their runtime and peak memory, see `src.metrics`
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    run_pipeline(
+        incremental=args.incremental,
+        max_workers=args.max_workers,
+        use_cache=not args.no_cache,
+        profile=args.profile,
+    )
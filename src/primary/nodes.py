@@ -9,13 +9,19 @@ Feature engineering, such as calculating correlations, etc.,
 should be left for feature layer
 """
 
-from typing import List
+from typing import List, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
 
 def keep_latest_data(
-    df: pd.DataFrame, group_cols: List[str], timestamp_col: str = "timestamp"
+    df: pd.DataFrame,
+    group_cols: List[str],
+    timestamp_col: str = "timestamp",
+    method: str = "sort",
+    drop_timestamp: bool = True,
 ) -> pd.DataFrame:
     """
     Keep only the latest data for each group based on the specified timestamp column.
@@ -23,8 +29,13 @@ def keep_latest_data(
     :param df: The input DataFrame
     :param group_cols: List of column names to group by
     :param timestamp_col: The name of the timestamp column (default: 'timestamp')
+    :param method: 'sort' to sort all rows by timestamp, or 'max' to keep rows
+        matching the maximum timestamp of their group in linear time, where rows
+        keep their input order and ties go to the last row
+    :param drop_timestamp: Whether to drop the timestamp column (default: True)
     :return: The DataFrame with only the latest data for each group
     :raises KeyError: If required columns are missing from the input DataFrame
+    :raises ValueError: If the method is not supported
     """
     # Check if the dataset has the required columns
     required_columns = group_cols + [timestamp_col]
@@ -33,39 +44,144 @@ def keep_latest_data(
     if missing_columns:
         raise KeyError(f"DataFrame is missing the following columns: {missing_columns}")
 
-    # Sort by timestamp and keep the latest
-    latest_df = (
-        df.sort_values(timestamp_col)
-        .drop_duplicates(subset=group_cols, keep="last")
-        .drop(columns=timestamp_col)
-        .reset_index(drop=True)
+    if method == "sort":
+        # Sort by timestamp and keep the latest
+        latest_df = df.sort_values(timestamp_col).drop_duplicates(
+            subset=group_cols, keep="last"
+        )
+    elif method == "max":
+        # Hash rows into groups once, then compare with the group's maximum,
+        # where groups without any timestamp keep their rows to choose from
+        grouped = df.groupby(group_cols, sort=False, dropna=False, observed=True)
+        max_timestamps = grouped[timestamp_col].transform("max")
+        is_latest = (df[timestamp_col] == max_timestamps) | max_timestamps.isna()
+
+        # Break ties between rows sharing the maximum timestamp
+        positions = np.flatnonzero(is_latest.to_numpy())
+        group_codes = pd.Series(grouped.ngroup().to_numpy()[positions])
+        positions = positions[~group_codes.duplicated(keep="last").to_numpy()]
+        latest_df = df.iloc[positions]
+    else:
+        raise ValueError(f"Unsupported method: {method}")
+
+    if drop_timestamp:
+        latest_df = latest_df.drop(columns=timestamp_col)
+
+    return latest_df.reset_index(drop=True)
+
+
+def update_latest_data(
+    latest_df: pd.DataFrame,
+    batch_df: pd.DataFrame,
+    group_cols: List[str],
+    timestamp_col: str = "timestamp",
+) -> pd.DataFrame:
+    """
+    Update the latest data for each group with a new batch of data, so that
+        restatements don't require deduplicating all history again.
+
+    :param latest_df: Latest data from a previous run, with the timestamp column,
+        see `keep_latest_data` with drop_timestamp=False
+    :param batch_df: New rows, e.g., restatements received since the previous run
+    :param group_cols: List of column names to group by
+    :param timestamp_col: The name of the timestamp column (default: 'timestamp')
+    :return: The updated latest data, with the timestamp column, where batch rows
+        win ties with previous rows
+    """
+    return keep_latest_data(
+        pd.concat([latest_df, batch_df], ignore_index=True),
+        group_cols,
+        timestamp_col,
+        method="max",
+        drop_timestamp=False,
     )
 
-    return latest_df
+
+def join_dimension(
+    df: pd.DataFrame,
+    dimension: Union[pd.DataFrame, pa.Table],
+    on: List[str],
+) -> pd.DataFrame:
+    """
+    Left join a dimension table with unique keys, e.g., the sec master, by looking
+        up the row of each key and taking the dimension columns at those rows.
+        Unlike a merge, only the key columns of the dimension are hashed and
+        rows are taken by position, without sorting or shuffling the input.
+
+    :param df: The input DataFrame
+    :param dimension: The dimension DataFrame, or a pyarrow Table, e.g., memory-mapped
+        with `src.io.read_feather_mmap` so that worker processes share its pages
+    :param on: List of key column names to join on
+    :return: The joined DataFrame, as returned by `df.merge(dimension, how="left")`
+    """
+    if isinstance(dimension, pa.Table):
+        # Skip index columns stored by pandas, which are restored as the index
+        index_cols = (dimension.schema.pandas_metadata or {}).get("index_columns", [])
+        columns = [col for col in dimension.column_names if col not in index_cols]
+        dim_keys = dimension.select(on).to_pandas()
+    else:
+        columns = dimension.columns.to_list()
+        dim_keys = dimension[on]
+    value_cols = [col for col in columns if col not in on]
+
+    # Lookups need unique keys and no clashing columns, otherwise merge as usual
+    if (
+        len(dim_keys) == 0
+        or dim_keys.duplicated().any()
+        or set(value_cols) & set(df.columns)
+    ):
+        if isinstance(dimension, pa.Table):
+            dimension = dimension.to_pandas()
+        return df.merge(dimension, how="left", on=on)
+
+    # Look up the dimension row of each key, -1 where it's missing
+    if len(on) == 1:
+        indexer = pd.Index(dim_keys[on[0]]).get_indexer(df[on[0]])
+    else:
+        indexer = pd.MultiIndex.from_frame(dim_keys).get_indexer(
+            pd.MultiIndex.from_frame(df[on])
+        )
+    missing = indexer < 0
+
+    # Only the dimension itself is converted, as taking Python objects by
+    # reference is much faster than converting taken Arrow strings row by row
+    if isinstance(dimension, pa.Table):
+        dimension = dimension.select(value_cols).to_pandas()
+
+    # Take dimension rows, where rows of missing keys are filled with NaN
+    values_df = dimension[value_cols].take(np.where(missing, 0, indexer))
+    values_df = values_df.reset_index(drop=True)
+    if missing.any():
+        values_df.loc[missing] = np.nan
+
+    return pd.concat([df.reset_index(drop=True), values_df], axis=1, copy=False)
 
 
 def enrich_int_data(
     int_df: pd.DataFrame,
-    int_sec_master: pd.DataFrame,
+    int_sec_master: Union[pd.DataFrame, pa.Table],
     group_cols: List[str],
     timestamp_col: str = "timestamp",
+    method: str = "sort",
 ) -> pd.DataFrame:
     """
     Enrich the input DataFrame with company info from the sec master.
 
     :param int_df: The input DataFrame
-    :param int_sec_master: The intermediate sec master DataFrame
+    :param int_sec_master: The intermediate sec master DataFrame, or a
+        memory-mapped pyarrow Table, see `join_dimension`
     :param group_cols: List of column names to group by
     :param timestamp_col: The name of the timestamp column (default: 'timestamp')
+    :param method: Method to keep the latest data, see `keep_latest_data`
     :return: The enriched DataFrame
     """
     # Keep only the latest data based on timestamp column
-    df = keep_latest_data(int_df, group_cols, timestamp_col)
+    df = keep_latest_data(int_df, group_cols, timestamp_col, method)
 
     # Remove date column before joining
     group_cols.remove("date")
 
     # Enrich dataframe with sec master info
-    enriched_df = df.merge(int_sec_master, how="left", on=group_cols)
+    enriched_df = join_dimension(df, int_sec_master, on=group_cols)
 
     return enriched_df
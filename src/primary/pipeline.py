@@ -1,48 +1,228 @@
+import hashlib
+import json
+import uuid
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
+from typing import Any, Dict, List
 
-from src.io import run_node
+import numpy as np
+import pandas as pd
 
-from .nodes import enrich_int_data
+from src.io import (
+    append_changes,
+    atomic_path,
+    clear_changes,
+    feather_batch_offsets,
+    hash_feather_rows,
+    read_feather,
+    read_feather_metadata,
+    read_feather_mmap,
+    read_feather_rows,
+    write_feather,
+)
+from src.metrics import count_rows, new_run_id, phase, run_instrumented
+
+from .nodes import enrich_int_data, keep_latest_data, update_latest_data
 
 
 def run_primary_pipeline() -> None:
+    # Create primary directory if it doesn't exist
+    Path("data/03_primary").mkdir(parents=True, exist_ok=True)
+
+    # Leverage parallel processing, recording metrics of each node in its worker
+    with Pool() as pool:
+        pool.map(
+            partial(run_instrumented, run_primary_node, run_id=new_run_id()),
+            get_primary_steps(),
+        )
+
+
+def run_primary_node(args: Dict[str, Any]) -> None:
+    """
+    Run a primary layer step from scratch, versioning its output and persisting
+    its latest data index like `run_incremental_primary_node`, so that the next
+    incremental run updates the output instead of rebuilding it, and the feature
+    layer reads its changes instead of rebuilding it too.
+
+    :param args: Step dictionary, see `get_primary_steps`
+    """
+    run_incremental_primary_node(args, rebuild=True)
+
+
+def run_incremental_primary_node(args: Dict[str, Any], rebuild: bool = False) -> None:
+    """
+    Run a primary layer step, keeping the latest intermediate data in a persisted
+    index next to its output, '<output>_latest.feather'. Instead of deduplicating
+    all history, only the record batches holding intermediate rows appended since
+    the previous run, e.g., new restatement batches, are read and merged into it.
+    The index is rebuilt whenever any of the rows seen by the previous run
+    changed, i.e., the intermediate data was rewritten rather than appended to.
+
+    Each output is written with a new version in its metadata, and the output
+    rows of keys in the new batch are recorded in its change log, see
+    `src.io.append_changes`, unless the index, the sec master, or the previous
+    output changed otherwise, in which case the change log is cleared and the
+    feature layer rebuilt. Without any appended rows, the output is left as is.
+
+    Only deduplication is limited to the new rows: when rows were appended, the
+    latest data is still enriched, sorted, and written as a whole, and all
+    intermediate rows are still hashed to check that none was rewritten.
+
+    :param args: Step dictionary, see `get_primary_steps`
+    :param rebuild: Whether to build the latest data from all intermediate rows,
+        even if the previous index could be updated
+    """
+    args = dict(args)
+    function, (int_path, sec_master_path), output = (
+        args.pop("function"),
+        args.pop("inputs"),
+        Path(args.pop("output")),
+    )
+    write_kwargs = args.pop("write_kwargs", {})
+    sort_cols = args.pop("sort_cols", None)
+    mmap_inputs = {Path(path) for path in args.pop("mmap_inputs", [])}
+    group_cols = list(args["group_cols"])
+    timestamp_col = args.get("timestamp_col", "timestamp")
+
+    index_path = output.with_name(f"{output.stem}_latest.feather")
+    state_path = output.with_name(f"{output.stem}_latest.json")
+    with phase("read"):
+        offsets = feather_batch_offsets(int_path)
+        n_rows = int(offsets[-1])
+        sec_master_hash = hashlib.sha256(Path(sec_master_path).read_bytes()).hexdigest()
+
+        # Rows seen by the previous run must be unchanged, checked on a hash of
+        # all of them, in the same pass as the hash of all rows for the next run
+        state = None
+        if not rebuild and index_path.exists() and state_path.exists():
+            state = json.loads(state_path.read_text())
+        previous_hash, prefix_hash = hash_feather_rows(
+            int_path, [state["rows"] if state is not None else 0, n_rows], offsets
+        )
+        if previous_hash is None or state.get("prefix_hash") != previous_hash:
+            state = None
+
+        # Only read the record batches holding rows appended since then
+        if state is not None:
+            index_df = pd.read_feather(index_path)
+            int_df = read_feather_rows(
+                int_path, np.arange(state["rows"], n_rows), offsets
+            )
+        else:
+            int_df = pd.read_feather(int_path)
+
+        # Other rows of the output only stay the same if it's the one written
+        # along with the index, rather than, e.g., restored from the node cache,
+        # and with the same sec master
+        previous_version = read_feather_metadata(output).get("version")
+        is_appended = (
+            state is not None
+            and state.get("version") == previous_version
+            and state.get("sec_master_hash") == sec_master_hash
+        )
+        version = uuid.uuid4().hex
+
+    # Nothing appended to an output that's still the one of the index
+    if is_appended and n_rows == state["rows"]:
+        return
+
+    # Update the latest data with the new batch, or build it from scratch
+    with phase("compute"):
+        if state is not None:
+            latest_df = update_latest_data(index_df, int_df, group_cols, timestamp_col)
+        else:
+            latest_df = keep_latest_data(
+                int_df, group_cols, timestamp_col, method="max", drop_timestamp=False
+            )
+    with phase("write"):
+        with atomic_path(index_path) as tmp_path:
+            latest_df.to_feather(tmp_path)
+        state = dict(
+            rows=n_rows,
+            prefix_hash=prefix_hash,
+            sec_master_hash=sec_master_hash,
+            version=version,
+        )
+        with atomic_path(state_path) as tmp_path:
+            tmp_path.write_text(json.dumps(state))
+
+    # Enrich the latest data as usual, where deduplicating it again is cheap. The
+    # sec master may be memory-mapped, as intermediate outputs are only ever
+    # replaced rather than rewritten in place, see `src.io.atomic_path`
+    with phase("read"):
+        if Path(sec_master_path) in mmap_inputs:
+            int_sec_master = read_feather_mmap(sec_master_path)
+        else:
+            int_sec_master = read_feather(sec_master_path)
+    with phase("compute"):
+        processed_df = function(
+            latest_df, int_sec_master, **dict(args, group_cols=list(group_cols))
+        )
+    count_rows(inputs=len(int_df) + len(int_sec_master), outputs=len(processed_df))
+
+    # Version the output and record the rows of keys in the new batch, so that
+    # the feature layer only reads those, see `src.io.read_changes`
+    with phase("write"):
+        write_feather(
+            processed_df,
+            output,
+            sort_cols,
+            metadata=dict(version=version),
+            **write_kwargs,
+        )
+        if is_appended and previous_version is not None:
+            is_changed = pd.MultiIndex.from_frame(processed_df[group_cols]).isin(
+                pd.MultiIndex.from_frame(int_df[group_cols])
+            )
+            append_changes(output, processed_df[is_changed], previous_version, version)
+        else:
+            clear_changes(output)
+
+
+def get_primary_steps() -> List[Dict[str, Any]]:
     # TODO: with a proper config parser, the filepaths
     # and parameters below should be controlled via
     # conf/catalog.yml and conf/parameters.yml
     int_dir = Path("data/02_intermediate")
     pri_dir = Path("data/03_primary")
 
-    # Create primary directory if it doesn't exist
-    pri_dir.mkdir(parents=True, exist_ok=True)
+    # Sort outputs consistently, so that the feature layer can join them in
+    # one ordered pass, see `src.feature.nodes.fea_join_all`
+    sort_cols = ["company_name", "date", "consumer_id"]
 
     # Declare each step to enrich intermediate data
     # into primary layer data
-    steps = [
+    return [
         dict(
             function=enrich_int_data,
             inputs=[int_dir / "consumer.feather", int_dir / "sec_master.feather"],
             output=pri_dir / "consumer.feather",
             group_cols=["consumer_id", "date"],
+            method="max",
+            sort_cols=sort_cols,
+            mmap_inputs=[int_dir / "sec_master.feather"],
         ),
         dict(
             function=enrich_int_data,
             inputs=[int_dir / "prices.feather", int_dir / "sec_master.feather"],
             output=pri_dir / "prices.feather",
             group_cols=["price_id", "date"],
+            method="max",
+            sort_cols=sort_cols,
+            mmap_inputs=[int_dir / "sec_master.feather"],
         ),
         dict(
             function=enrich_int_data,
             inputs=[int_dir / "web.feather", int_dir / "sec_master.feather"],
             output=pri_dir / "web.feather",
             group_cols=["web_id", "date"],
+            method="max",
+            sort_cols=sort_cols,
+            mmap_inputs=[int_dir / "sec_master.feather"],
         ),
     ]
 
-    # Leverage parallel processing
-    with Pool() as pool:
-        pool.map(run_node, steps)
-
 
 if __name__ == "__main__":
     run_primary_pipeline()
@@ -1,4 +1,7 @@
+import os
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 import dash
 import dash_bootstrap_components as dbc
@@ -9,14 +12,130 @@ import plotly.graph_objects as go
 from dash import dash_table, dcc, html
 from dash.dependencies import Input, Output
 
-# Read in corresponding dataframes
+from src.io import read_feather_mmap
+from src.reporting.jobs import make_job_manager
+from src.reporting.memo import data_version, memoize
+from src.reporting.queries import (
+    cluster_order,
+    column_names,
+    company_corr,
+    index_dt_labels,
+    partition_rows,
+    query_agg,
+    query_rows,
+    rank_rows,
+    window_corr,
+)
+
+# Read in corresponding datasets, memory-mapped by default so that dashboard
+# workers share pages and callbacks only materialize the columns and rows they
+# need, set DASHBOARD_MMAP=0 to read them into memory instead
 fea_dir = Path("data/04_feature")
-corr_df = pd.read_feather(fea_dir / "master_df.feather")
-agg_df = pd.read_feather(fea_dir / "agg_by_freq.feather")
+read_feature = (
+    pd.read_feather if os.environ.get("DASHBOARD_MMAP") == "0" else read_feather_mmap
+)
+feature_paths = [
+    fea_dir / "corr_stats.feather",
+    fea_dir / "agg_by_freq.feather",
+    fea_dir / "rolling.feather",
+    fea_dir / "company_pivot.feather",
+]
+version = data_version(feature_paths)
+
+
+@lru_cache(maxsize=None)
+def load_data() -> Tuple[pd.DataFrame, ...]:
+    """
+    Read the feature outputs, once per process.
+
+    Background job workers call this as they start, importing this module along
+    with its callbacks, so that each of them reads and indexes the data once,
+    before its first job, rather than for every job, see `src.reporting.jobs`.
+
+    :return: Correlation statistics, aggregates, rolling features, and pivot
+    """
+    return tuple(read_feature(path) for path in feature_paths)
+
+
+corr_stats, agg_data, rolling_data, pivot_data = load_data()
+
+# Memoize callback outputs and filtered frames by their inputs and the version
+# of the data read above, sharing them across dashboard workers through a disk
+# store, set DASHBOARD_CACHE_DIR to move it or to an empty value to disable it
+cache_dir = os.environ.get("DASHBOARD_CACHE_DIR", "data/.dashboard_cache") or None
+memoize_results = memoize(version, cache_dir=cache_dir)
+
+# Run heavy callbacks as background jobs in a pool of worker processes, which
+# load the data once and report their results through files in a local
+# directory, so that they don't hold up request threads, see
+# `src.reporting.jobs`. Memoized results are returned without running a job.
+# Set DASHBOARD_JOBS_DIR to move the directory or to an empty value to run
+# callbacks inline
+jobs_dir = os.environ.get("DASHBOARD_JOBS_DIR", "data/.dashboard_jobs") or None
+background_manager = make_job_manager(jobs_dir, initializer=load_data)
+
+# Index data once so that callbacks don't scan it on every request
+corr_partitions = partition_rows(corr_stats, ["company_name"])
+agg_partitions = partition_rows(agg_data, ["company_name", "agg_freq"])
+agg_dt_labels = index_dt_labels(agg_data)
+period_partitions = partition_rows(agg_data, ["agg_freq", "dt_label"])
+rolling_partitions = partition_rows(rolling_data, ["company_name"])
+pivot_partitions = partition_rows(pivot_data, ["metric"])
+
+corr_companies = list(corr_partitions)
+agg_companies = list(dict.fromkeys(company for company, _ in agg_partitions))
+rolling_companies = list(rolling_partitions)
+pivot_metrics = list(pivot_partitions)
+pivot_companies = [
+    col for col in column_names(pivot_data) if col not in ["metric", "date"]
+]
+
+# Period-over-period deltas precomputed by `fea_aggregate`, by column suffix,
+# which are looked up for comparisons rather than offered as metrics
+period_deltas = {
+    "prev": "Previous Period",
+    "yoy": "Same Period Last Year",
+    "ytd": "Year to Date",
+}
+delta_suffixes = tuple(
+    f"_{baseline}{suffix}"
+    for baseline in period_deltas
+    for suffix in ["", "_diff", "_pct"]
+)
+agg_metrics = [
+    col for col in column_names(agg_data) if not col.endswith(delta_suffixes)
+]
+screener_metrics = [
+    col
+    for col in column_names(agg_data)
+    if col
+    not in [
+        "date",
+        "company_name",
+        "symbol",
+        "agg_freq",
+        "year",
+        "quarter",
+        "month",
+        "week",
+        "dt_label",
+    ]
+]
+rolling_features = [
+    col
+    for col in column_names(rolling_data)
+    if col not in ["company_name", "symbol", "date"]
+]
+min_date = pd.Timestamp(min(dates[0] for _, dates in corr_partitions.values()))
+max_date = pd.Timestamp(max(dates[-1] for _, dates in corr_partitions.values()))
 
 external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+app = dash.Dash(
+    __name__,
+    external_stylesheets=external_stylesheets,
+    background_callback_manager=background_manager,
+)
 
 # Design dashboard components
 app.layout = html.Div(
@@ -38,18 +157,16 @@ app.layout = html.Div(
                                         id="company-dropdown",
                                         options=[
                                             {"label": c, "value": c}
-                                            for c in corr_df["company_name"].unique()
+                                            for c in corr_companies
                                         ],
-                                        value=corr_df["company_name"].unique()[0],
+                                        value=corr_companies[0],
                                     ),
                                     html.Label("Start Date:"),
                                     dcc.DatePickerSingle(
-                                        id="start-date", date=corr_df["date"].min()
+                                        id="start-date", date=min_date
                                     ),
                                     html.Label("End Date:"),
-                                    dcc.DatePickerSingle(
-                                        id="end-date", date=corr_df["date"].max()
-                                    ),
+                                    dcc.DatePickerSingle(id="end-date", date=max_date),
                                     dcc.Graph(id="corr-heatmap"),
                                     dash_table.DataTable(id="correlation-data-table"),
                                 ]
@@ -73,19 +190,17 @@ app.layout = html.Div(
                                                 "label": company_name,
                                                 "value": company_name,
                                             }
-                                            for company_name in agg_df[
-                                                "company_name"
-                                            ].unique()
+                                            for company_name in agg_companies
                                         ],
                                         multi=True,
-                                        value=[agg_df["company_name"].unique()[0]],
+                                        value=[agg_companies[0]],
                                     ),
                                     html.Label("Analysis Metric:"),
                                     dcc.Dropdown(
                                         id="metric-dropdown",
                                         options=[
                                             {"label": col, "value": col}
-                                            for col in agg_df.columns
+                                            for col in agg_metrics
                                             if col
                                             # TODO: this should be
                                             # dynamically controlled
@@ -116,12 +231,10 @@ app.layout = html.Div(
                                     ),
                                     html.Label("Start Date:"),
                                     dcc.DatePickerSingle(
-                                        id="start-date2", date=corr_df["date"].min()
+                                        id="start-date2", date=min_date
                                     ),
                                     html.Label("End Date:"),
-                                    dcc.DatePickerSingle(
-                                        id="end-date2", date=corr_df["date"].max()
-                                    ),
+                                    dcc.DatePickerSingle(id="end-date2", date=max_date),
                                     dcc.Graph(id="historical-trend"),
                                 ]
                             ),
@@ -144,18 +257,16 @@ app.layout = html.Div(
                                                 "label": company_name,
                                                 "value": company_name,
                                             }
-                                            for company_name in agg_df[
-                                                "company_name"
-                                            ].unique()
+                                            for company_name in agg_companies
                                         ],
-                                        value=agg_df["company_name"].unique()[0],
+                                        value=agg_companies[0],
                                     ),
                                     html.Label("Analysis Metric:"),
                                     dcc.Dropdown(
                                         id="metric-dropdown2",
                                         options=[
                                             {"label": col, "value": col}
-                                            for col in agg_df.columns
+                                            for col in agg_metrics
                                             if col
                                             not in [
                                                 "date",
@@ -191,6 +302,165 @@ app.layout = html.Div(
                                     ),
                                     dcc.Graph(id="cmp-bar-chart"),
                                     dash_table.DataTable(id="cmp-data-table"),
+                                    html.Label("Period-over-Period (Point 2):"),
+                                    dash_table.DataTable(id="cmp-delta-table"),
+                                ]
+                            ),
+                        )
+                    ],
+                ),
+                # Rolling window statistics dashboard
+                dcc.Tab(
+                    label="Rolling Statistics",
+                    children=[
+                        dbc.Container(
+                            html.Div(
+                                [
+                                    html.H2("Dashboard 4: Rolling Statistics"),
+                                    html.Label("Companies:"),
+                                    dcc.Dropdown(
+                                        id="company-dropdown4",
+                                        options=[
+                                            {
+                                                "label": company_name,
+                                                "value": company_name,
+                                            }
+                                            for company_name in rolling_companies
+                                        ],
+                                        multi=True,
+                                        value=[rolling_companies[0]],
+                                    ),
+                                    html.Label("Rolling Feature:"),
+                                    dcc.Dropdown(
+                                        id="rolling-feature-dropdown",
+                                        options=[
+                                            {"label": col, "value": col}
+                                            for col in rolling_features
+                                        ],
+                                        value=rolling_features[0],
+                                    ),
+                                    html.Label("Start Date:"),
+                                    dcc.DatePickerSingle(
+                                        id="start-date4", date=min_date
+                                    ),
+                                    html.Label("End Date:"),
+                                    dcc.DatePickerSingle(id="end-date4", date=max_date),
+                                    dcc.Graph(id="rolling-chart"),
+                                ]
+                            ),
+                        )
+                    ],
+                ),
+                # Cross-sectional screener dashboard
+                dcc.Tab(
+                    label="Screener",
+                    children=[
+                        dbc.Container(
+                            html.Div(
+                                [
+                                    html.H2("Dashboard 5: Screener"),
+                                    html.Label("Ranking Metric:"),
+                                    dcc.Dropdown(
+                                        id="screener-metric-dropdown",
+                                        options=[
+                                            {"label": col, "value": col}
+                                            for col in screener_metrics
+                                        ],
+                                        value=(
+                                            "website_visits_mean_prev_pct"
+                                            if "website_visits_mean_prev_pct"
+                                            in screener_metrics
+                                            else "price_mean"
+                                        ),
+                                    ),
+                                    html.Label("Analysis Frequency:"),
+                                    dcc.Dropdown(
+                                        id="screener-frequency-dropdown",
+                                        options=[
+                                            {"label": "Yearly", "value": "Y"},
+                                            {"label": "Quarterly", "value": "Q"},
+                                            {"label": "Monthly", "value": "M"},
+                                            {"label": "Weekly", "value": "W"},
+                                            {"label": "Daily", "value": "D"},
+                                        ],
+                                        value="Q",
+                                    ),
+                                    html.Label("Period:"),
+                                    dcc.Dropdown(
+                                        id="screener-period-dropdown",
+                                        options=[],
+                                        value=None,
+                                    ),
+                                    html.Label("Ranking:"),
+                                    dcc.RadioItems(
+                                        id="screener-direction",
+                                        options=[
+                                            {"label": "Top", "value": "top"},
+                                            {"label": "Bottom", "value": "bottom"},
+                                        ],
+                                        value="top",
+                                    ),
+                                    html.Label("Number of Companies:"),
+                                    dcc.Input(
+                                        id="screener-n",
+                                        type="number",
+                                        min=1,
+                                        max=100,
+                                        value=20,
+                                    ),
+                                    dcc.Graph(id="screener-chart"),
+                                    dash_table.DataTable(id="screener-data-table"),
+                                ]
+                            ),
+                        )
+                    ],
+                ),
+                # Company by company correlation dashboard
+                dcc.Tab(
+                    label="Company Correlations",
+                    children=[
+                        dbc.Container(
+                            html.Div(
+                                [
+                                    html.H2("Dashboard 6: Company Correlations"),
+                                    html.Label("Metric:"),
+                                    dcc.Dropdown(
+                                        id="pivot-metric-dropdown",
+                                        options=[
+                                            {"label": metric, "value": metric}
+                                            for metric in pivot_metrics
+                                        ],
+                                        value=pivot_metrics[0],
+                                    ),
+                                    html.Label("Companies (all if empty):"),
+                                    dcc.Dropdown(
+                                        id="company-dropdown6",
+                                        options=[
+                                            {
+                                                "label": company_name,
+                                                "value": company_name,
+                                            }
+                                            for company_name in pivot_companies
+                                        ],
+                                        multi=True,
+                                        value=pivot_companies[:20],
+                                    ),
+                                    html.Label("Order:"),
+                                    dcc.RadioItems(
+                                        id="company-corr-order",
+                                        options=[
+                                            {"label": "Company", "value": "company"},
+                                            {"label": "Clustered", "value": "cluster"},
+                                        ],
+                                        value="cluster",
+                                    ),
+                                    html.Label("Start Date:"),
+                                    dcc.DatePickerSingle(
+                                        id="start-date6", date=min_date
+                                    ),
+                                    html.Label("End Date:"),
+                                    dcc.DatePickerSingle(id="end-date6", date=max_date),
+                                    dcc.Graph(id="company-corr-heatmap"),
                                 ]
                             ),
                         )
@@ -202,6 +472,27 @@ app.layout = html.Div(
 )
 
 
+def background_job(graph_id: str) -> Dict[str, Any]:
+    """
+    Build the arguments of `app.callback` running a callback as a background job.
+
+    A job still running when the callback's inputs change is terminated by dash
+    before the job of the new inputs starts, and switching tabs cancels it, as
+    its output isn't shown anymore. The graph is dimmed while its job runs.
+
+    :param graph_id: Id of the graph the callback updates
+    :return: Callback arguments, none if background jobs are disabled
+    """
+    if background_manager is None:
+        return {}
+
+    return dict(
+        background=True,
+        running=[(Output(graph_id, "style"), {"opacity": 0.5}, {"opacity": 1})],
+        cancel=[Input("dashboard-tabs", "value")],
+    )
+
+
 # Callbacks for updating the plots
 # Correlation plot
 @app.callback(
@@ -210,21 +501,21 @@ app.layout = html.Div(
     Input("company-dropdown", "value"),
     Input("start-date", "date"),
     Input("end-date", "date"),
+    **background_job("corr-heatmap"),
 )
+@memoize_results
 def update_corr_heatmap(company_name, start_date, end_date):
-    # Filter data to specific company and time range
-    filtered_df = corr_df[
-        (corr_df["company_name"] == company_name)
-        & (corr_df["date"] >= start_date)
-        & (corr_df["date"] <= end_date)
-    ]
-
-    # Calculate correlation, removing self-correlation
-    corr = filtered_df.corr(numeric_only=True)
+    # Calculate correlation within the time range from precomputed statistics,
+    # removing self-correlation on a copy, as memoized frames are shared
+    corr = filter_corr(company_name, start_date, end_date).copy()
+    if corr.empty:
+        return go.Figure().to_dict(), []
     np.fill_diagonal(corr.values, None)
 
+    # Return figures as dictionaries, which are much cheaper to unpickle from
+    # the memoization disk store than figure objects
     fig = px.imshow(corr, x=corr.columns, y=corr.columns)
-    return fig, corr.to_dict("records")
+    return fig.to_dict(), corr.to_dict("records")
 
 
 # Historical trend plot
@@ -235,38 +526,39 @@ def update_corr_heatmap(company_name, start_date, end_date):
     Input("metric-dropdown", "value"),
     Input("start-date2", "date"),
     Input("end-date2", "date"),
+    **background_job("historical-trend"),
 )
+@memoize_results
 def update_historical_trend(
     selected_companies, selected_freq, selected_metric, start_date, end_date
 ):
-    # Filter data to selected subset only
-    filtered_df = agg_df[
-        (agg_df["company_name"].isin(selected_companies))
-        & (agg_df["agg_freq"] == selected_freq)
-        & (agg_df["date"] >= start_date)
-        & (agg_df["date"] <= end_date)
-    ][["company_name", "dt_label", selected_metric]]
-
-    # Add lineplot for each company
+    # Add lineplot for each company, looking up its selected subset only
     traces = []
     for company in selected_companies:
+        filtered_df = filter_agg(
+            company,
+            selected_freq,
+            start_date,
+            end_date,
+            columns=["dt_label", selected_metric],
+        )
         traces.append(
             go.Scatter(
-                x=filtered_df[filtered_df["company_name"] == company]["dt_label"],
-                y=filtered_df[filtered_df["company_name"] == company][selected_metric],
+                x=filtered_df["dt_label"],
+                y=filtered_df[selected_metric],
                 mode="lines",
                 name=company,
             )
         )
 
-    return {
-        "data": traces,
-        "layout": go.Layout(
+    return go.Figure(
+        data=traces,
+        layout=go.Layout(
             xaxis={"title": "Time Period"},
             yaxis={"title": selected_metric},
             title="Historical Trend",
         ),
-    }
+    ).to_dict()
 
 
 # Point-to-point comparison
@@ -281,9 +573,7 @@ def update_datapoint_dropdown_options(selected_freq):
     if selected_freq:
         options = [
             {"label": label, "value": label}
-            for label in agg_df[agg_df["agg_freq"] == selected_freq][
-                "dt_label"
-            ].unique()
+            for label in agg_dt_labels.get(selected_freq, [])
         ]
     return options, options
 
@@ -291,23 +581,28 @@ def update_datapoint_dropdown_options(selected_freq):
 @app.callback(
     Output("cmp-bar-chart", "figure"),
     Output("cmp-data-table", "data"),
+    Output("cmp-delta-table", "data"),
     Input("company-dropdown3", "value"),
     Input("frequency-dropdown2", "value"),
     Input("metric-dropdown2", "value"),
     Input("datapoint-dropdown", "value"),
     Input("datapoint-dropdown2", "value"),
 )
+@memoize_results
 def update_comparison_chart(
     selected_company, selected_freq, selected_metric, data_point_1, data_point_2
 ):
     if data_point_1 is None or data_point_2 is None:
-        return go.Figure(), []
+        return go.Figure().to_dict(), [], []
 
     # Filter data to selected datapoints
-    selected_data = agg_df[
-        (agg_df["company_name"] == selected_company)
-        & (agg_df["agg_freq"] == selected_freq)
-        & (agg_df["dt_label"].isin([data_point_1, data_point_2]))
+    partition_df = filter_agg(
+        selected_company,
+        selected_freq,
+        columns=["company_name", "dt_label", selected_metric],
+    )
+    selected_data = partition_df[
+        partition_df["dt_label"].isin([data_point_1, data_point_2])
     ]
 
     # Create bar plot
@@ -323,8 +618,176 @@ def update_comparison_chart(
 
     # Find difference statistics
     point_diff = _find_point_diff(selected_data, selected_metric)
+    point_deltas = _find_period_deltas(
+        selected_company, selected_freq, selected_metric, data_point_2
+    )
+
+    return bar_chart.to_dict(), _table_records(point_diff), point_deltas
+
+
+# Rolling statistics plot
+@app.callback(
+    Output("rolling-chart", "figure"),
+    Input("company-dropdown4", "value"),
+    Input("rolling-feature-dropdown", "value"),
+    Input("start-date4", "date"),
+    Input("end-date4", "date"),
+)
+@memoize_results
+def update_rolling_chart(selected_companies, selected_feature, start_date, end_date):
+    # Add lineplot for each company, reading its precomputed window features
+    traces = []
+    for company in selected_companies:
+        filtered_df = filter_rolling(
+            company, start_date, end_date, columns=["date", selected_feature]
+        )
+        traces.append(
+            go.Scatter(
+                x=filtered_df["date"],
+                y=filtered_df[selected_feature],
+                mode="lines",
+                name=company,
+            )
+        )
+
+    return go.Figure(
+        data=traces,
+        layout=go.Layout(
+            xaxis={"title": "Date"},
+            yaxis={"title": selected_feature},
+            title="Rolling Statistics",
+        ),
+    ).to_dict()
+
+
+# Screener
+# Make period selection dropdown conditional on frequency selection, defaulting
+# to the latest period
+@app.callback(
+    Output("screener-period-dropdown", "options"),
+    Output("screener-period-dropdown", "value"),
+    Input("screener-frequency-dropdown", "value"),
+)
+def update_screener_period_options(selected_freq):
+    labels = agg_dt_labels.get(selected_freq, []) if selected_freq else []
+    options = [{"label": label, "value": label} for label in labels]
+    return options, labels[-1] if labels else None
+
+
+@app.callback(
+    Output("screener-chart", "figure"),
+    Output("screener-data-table", "data"),
+    Input("screener-metric-dropdown", "value"),
+    Input("screener-frequency-dropdown", "value"),
+    Input("screener-period-dropdown", "value"),
+    Input("screener-direction", "value"),
+    Input("screener-n", "value"),
+)
+@memoize_results
+def update_screener(selected_metric, selected_freq, selected_period, direction, n):
+    if not (selected_metric and selected_freq and selected_period and n):
+        return go.Figure().to_dict(), []
+
+    # Rank all companies of the period, reading only the metric and top rows
+    ranked_df = rank_rows(
+        agg_data,
+        period_partitions,
+        (selected_freq, selected_period),
+        selected_metric,
+        n=int(n),
+        ascending=direction == "bottom",
+        columns=["company_name", "symbol", "dt_label", selected_metric],
+    )
+
+    # Build the figure from graph objects, which is much cheaper than plotly
+    # express for the small frames of a ranking
+    bar_chart = go.Figure(
+        data=go.Bar(
+            x=ranked_df["company_name"],
+            y=ranked_df[selected_metric],
+            hovertext=ranked_df["symbol"],
+        ),
+        layout=go.Layout(
+            xaxis={"title": "Company"},
+            yaxis={"title": selected_metric},
+            title=f"{direction.title()} {len(ranked_df)} by {selected_metric}, "
+            f"{selected_period}",
+        ),
+    )
+
+    return bar_chart.to_dict(), _table_records(ranked_df)
+
+
+# Company by company correlation plot
+@app.callback(
+    Output("company-corr-heatmap", "figure"),
+    Input("pivot-metric-dropdown", "value"),
+    Input("company-dropdown6", "value"),
+    Input("company-corr-order", "value"),
+    Input("start-date6", "date"),
+    Input("end-date6", "date"),
+    **background_job("company-corr-heatmap"),
+)
+@memoize_results
+def update_company_corr_heatmap(
+    selected_metric, selected_companies, order, start_date, end_date
+):
+    # Correlate all pairs of companies at once, optionally grouping correlated
+    # companies together
+    args = (selected_metric, start_date, end_date, selected_companies or None)
+    corr = filter_company_corr(*args)
+    if order == "cluster":
+        companies = filter_cluster_order(*args)
+        corr = corr.loc[companies, companies]
+
+    return go.Figure(
+        data=go.Heatmap(
+            z=corr.to_numpy(),
+            x=corr.columns,
+            y=corr.index,
+            zmin=-1,
+            zmax=1,
+            colorscale="RdBu",
+        ),
+        layout=go.Layout(
+            title=f"Correlation of {selected_metric} between companies",
+            yaxis={"autorange": "reversed"},
+        ),
+    ).to_dict()
+
 
-    return bar_chart, point_diff.to_dict("records")
+# Lookups shared by callbacks, whose memoized frames must not be mutated
+@memoize_results
+def filter_corr(company_name, start_date, end_date):
+    return window_corr(corr_stats, corr_partitions, company_name, start_date, end_date)
+
+
+@memoize_results
+def filter_agg(company_name, freq, start_date=None, end_date=None, columns=None):
+    return query_agg(
+        agg_data, agg_partitions, company_name, freq, start_date, end_date, columns
+    )
+
+
+@memoize_results
+def filter_rolling(company_name, start_date=None, end_date=None, columns=None):
+    return query_rows(
+        rolling_data, rolling_partitions, company_name, start_date, end_date, columns
+    )
+
+
+# Matrices of all companies take several megabytes, so only their much smaller
+# orderings are shared through the disk store
+@memoize(version, maxsize=8)
+def filter_company_corr(metric, start_date=None, end_date=None, companies=None):
+    return company_corr(
+        pivot_data, pivot_partitions, metric, start_date, end_date, companies
+    )
+
+
+@memoize_results
+def filter_cluster_order(metric, start_date=None, end_date=None, companies=None):
+    return cluster_order(filter_company_corr(metric, start_date, end_date, companies))
 
 
 def _find_point_diff(df: pd.DataFrame, selected_metric: str) -> pd.DataFrame:
@@ -336,13 +799,61 @@ def _find_point_diff(df: pd.DataFrame, selected_metric: str) -> pd.DataFrame:
     # Only calculate the difference with two points
     if len(points) == 2:
         data_pt_1, data_pt_2 = points
-        df["pct_diff"] = ((df.pct_change(axis=1)[data_pt_2]) * 100).round(2).astype(
-            str
-        ) + "%"
+        df["pct_diff"] = (df.pct_change(axis=1)[data_pt_2] * 100).map(_format_pct)
         df["diff"] = (df[data_pt_2] - df[data_pt_1]).round(2)
 
     return df
 
 
+def _find_period_deltas(
+    company_name: str, freq: str, selected_metric: str, data_point: str
+) -> List[Dict[str, Any]]:
+    # Look up precomputed deltas of the data point, if there are any for the metric
+    delta_cols = [
+        f"{selected_metric}_{baseline}{suffix}"
+        for baseline in period_deltas
+        for suffix in ["", "_diff", "_pct"]
+    ]
+    if not set(delta_cols) <= set(column_names(agg_data)):
+        return []
+
+    delta_df = filter_agg(company_name, freq, columns=["dt_label"] + delta_cols)
+    delta_df = delta_df[delta_df["dt_label"] == data_point]
+    if delta_df.empty:
+        return []
+
+    row = delta_df.iloc[0]
+    return [
+        {
+            "baseline": label,
+            "value": _round(row[f"{selected_metric}_{baseline}"]),
+            "diff": _round(row[f"{selected_metric}_{baseline}_diff"]),
+            "pct_diff": _format_pct(row[f"{selected_metric}_{baseline}_pct"]),
+        }
+        for baseline, label in period_deltas.items()
+    ]
+
+
+# Deltas are missing without a baseline period, e.g., in a company's first period,
+# or undefined from a zero baseline, and are shown as blank cells or 'n/a' rather
+# than as 'nan%'
+def _round(value: float) -> Optional[float]:
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+def _format_pct(value: float) -> str:
+    return f"{value:.2f}%" if np.isfinite(value) else "n/a"
+
+
+def _table_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return [
+        {
+            col: _round(value) if isinstance(value, float) else value
+            for col, value in record.items()
+        }
+        for record in df.to_dict("records")
+    ]
+
+
 if __name__ == "__main__":
     app.run_server(debug=True)
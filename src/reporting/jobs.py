@@ -0,0 +1,494 @@
+"""
+Reporting layer background jobs.
+
+Dash runs callbacks registered with `background=True` through a background
+callback manager, which starts a job per request and is then polled for its
+progress and result. `ProcessJobManager` runs jobs in a pool of worker
+processes, which load the dashboard's data once as they start and are then
+reused across jobs, and passes their progress and results back through pickle
+files in a local directory, using the standard library only. Workers are
+started by a fork server where the platform has one, or spawned otherwise,
+rather than forked from the multithreaded dashboard process, so that they never
+inherit a lock held by one of its threads. Running jobs are tracked by marker
+files in the same directory, so that any dashboard worker process can tell
+whether a job is still running and terminate it once its request is superseded
+or cancelled, which kills the worker running it. Jobs are marked done before
+writing their result and count as running until it's read, so that polls
+never take a job finishing in between for a cancelled one.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import traceback
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from dash.exceptions import PreventUpdate
+from dash.long_callback.managers import BaseLongCallbackManager
+
+logger = logging.getLogger(__name__)
+
+# Modules the fork server imports once, so that workers forked from it only
+# import the callbacks' own modules
+FORKSERVER_PRELOAD = ["numpy", "pandas", "plotly.express", "dash"]
+
+
+def make_job_manager(
+    jobs_dir: Optional[Union[str, Path]],
+    initializer: Optional[Callable[[], Any]] = None,
+) -> Optional["ProcessJobManager"]:
+    """
+    Create a background callback manager, if background jobs are enabled.
+
+    :param jobs_dir: Directory jobs report their progress and results through,
+        None to disable background jobs
+    :param initializer: Function each worker calls once as it starts, see
+        `ProcessJobManager`
+    :return: Manager, or None if callbacks should run inline
+    """
+    if jobs_dir is None:
+        logger.warning("Background jobs are disabled, callbacks run inline")
+        return None
+
+    return ProcessJobManager(jobs_dir, initializer=initializer)
+
+
+class ProcessJobManager(BaseLongCallbackManager):
+    """
+    Background callback manager running jobs in a pool of worker processes,
+    started by a fork server if available, or spawned otherwise, e.g., on
+    Windows. A job is sent to an idle worker, and a new worker is only started
+    when all of them are busy. Workers get callbacks by reference, importing
+    their module once, so callbacks must be module-level functions, and they run
+    without a dash callback context.
+
+    Callbacks memoized with `src.reporting.memo.memoize` are looked up in their
+    cache first, so that cached results are returned without running a job.
+
+    :param jobs_dir: Directory jobs report their progress and results through
+    :param cache_by: Functions whose return values key results, see
+        `dash.DiskcacheManager`, None to discard results once read
+    :param initializer: Function each worker calls once as it starts, before
+        its first job, e.g., to load the data callbacks read, which must be a
+        module-level function as well
+    """
+
+    def __init__(
+        self,
+        jobs_dir: Union[str, Path],
+        cache_by: Optional[Callable[[], Any]] = None,
+        initializer: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        # Set up before registering the callbacks declared so far
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        else:
+            self._context = multiprocessing.get_context("spawn")
+        self._initializer = initializer
+        self._workers: Dict[int, _Worker] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        super().__init__(cache_by)
+
+    def make_job_fn(
+        self, fn: Callable, progress: bool, key: Optional[str] = None
+    ) -> Callable:
+        return partial(_run_job, fn, progress)
+
+    def call_job_fn(
+        self, key: str, job_fn: Callable, args: Any, context: Dict[str, Any]
+    ) -> str:
+        # Write memoized results right away, under a job that's never running
+        fn, progress = job_fn.args
+        if not progress:
+            try:
+                result = _read_memoized(fn, args)
+            except KeyError:
+                pass
+            else:
+                _write_value(self._result_path(key), result)
+                return f"{os.getpid()}-{next(self._job_ids)}"
+
+        # Send the job to an idle worker, or a new one if all of them are busy,
+        # dropping workers that exited, e.g., killed by another dashboard worker
+        with self._lock:
+            for pid, worker in list(self._workers.items()):
+                if not worker.process.is_alive():
+                    worker.connection.close()
+                    del self._workers[pid]
+            worker = next(
+                (worker for worker in self._workers.values() if worker.is_idle()),
+                None,
+            )
+            if worker is None:
+                worker = self._start_worker()
+
+            # Workers unmark jobs once done, then report them done
+            worker.job = f"{worker.process.pid}-{next(self._job_ids)}"
+            self._marker_path(worker.job).write_text(key)
+            worker.connection.send(
+                (worker.job, job_fn, key, self._make_progress_key(key), args)
+            )
+
+            return worker.job
+
+    def job_running(self, job: Union[str, int, None]) -> bool:
+        if not job:
+            return False
+
+        # Jobs are running while marked, whichever dashboard worker started them,
+        # and until their result is read once done, so that a job finishing
+        # between a poll's `get_result` and `job_running` isn't taken for a
+        # cancelled one. Markers are checked before done files, which replace
+        # them, so that jobs marked done in between are seen either way
+        if not self._marker_path(job).exists():
+            return self._done_path(job).exists()
+        pid = _job_pid(job)
+        with self._lock:
+            worker = self._workers.get(pid)
+
+        return worker.process.is_alive() if worker is not None else _pid_exists(pid)
+
+    def terminate_job(self, job: Union[str, int, None]) -> None:
+        if not job:
+            return
+
+        # Done jobs only leave their unread result behind
+        pid = _job_pid(job)
+        done_path = self._done_path(job)
+        try:
+            key = done_path.read_text()
+        except FileNotFoundError:
+            pass
+        else:
+            done_path.unlink(missing_ok=True)
+            self._clear_job_entries(key)
+            return
+
+        # Only workers running a marked job are killed, so that idle workers and
+        # reused pids are never hit, clearing the progress and partial files
+        # they leave behind. Workers of this process are only given another job
+        # once the lock is released
+        marker_path = self._marker_path(job)
+        with self._lock:
+            try:
+                key = marker_path.read_text()
+            except FileNotFoundError:
+                return
+            worker = self._workers.pop(pid, None)
+            _kill(pid, worker.process if worker is not None else None)
+            marker_path.unlink(missing_ok=True)
+            done_path.unlink(missing_ok=True)
+        if worker is not None:
+            worker.process.join(timeout=1)
+            worker.connection.close()
+
+        self.clear_cache_entry(self._make_progress_key(key))
+        for tmp_path in self.jobs_dir.glob(f"*.{pid}.tmp"):
+            tmp_path.unlink(missing_ok=True)
+
+    def terminate_unhealthy_job(self, job: Union[str, int, None]) -> bool:
+        # Jobs still marked after their worker exited are cleaned up
+        if job and self._marker_path(job).exists() and not self.job_running(job):
+            self.terminate_job(job)
+            return True
+
+        return False
+
+    def get_progress(self, key: str) -> Any:
+        progress_path = self._result_path(self._make_progress_key(key))
+        progress = _read_value(progress_path, None)
+        progress_path.unlink(missing_ok=True)
+
+        return progress
+
+    def result_ready(self, key: str) -> bool:
+        return self._result_path(key).exists()
+
+    def get_result(self, key: str, job: Union[str, int, None]) -> Any:
+        result = _read_value(self._result_path(key), self.UNDEFINED)
+        if result is self.UNDEFINED:
+            return self.UNDEFINED
+
+        # Jobs are marked done before writing their result, which is now read
+        self._clear_job_entries(key)
+        if job:
+            self._done_path(job).unlink(missing_ok=True)
+
+        return result
+
+    def clear_cache_entry(self, key: str) -> None:
+        self._result_path(key).unlink(missing_ok=True)
+
+    def _clear_job_entries(self, key: str) -> None:
+        # Keep results only if they're keyed for reuse
+        if self.cache_by is None:
+            self.clear_cache_entry(key)
+        self.clear_cache_entry(self._make_progress_key(key))
+
+    def _start_worker(self) -> "_Worker":
+        # Workers exit once their end of the pipe is closed, or with the
+        # dashboard process
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_work,
+            args=(worker_connection, self.jobs_dir, self._initializer),
+            daemon=True,
+        )
+        process.start()
+        worker_connection.close()
+        worker = _Worker(process, connection)
+        self._workers[process.pid] = worker
+
+        return worker
+
+    def _result_path(self, key: str) -> Path:
+        return self.jobs_dir / f"{key}.pkl"
+
+    def _marker_path(self, job: Union[str, int]) -> Path:
+        return self.jobs_dir / f"{job}.job"
+
+    def _done_path(self, job: Union[str, int]) -> Path:
+        return self.jobs_dir / f"{job}.done"
+
+
+class _Worker:
+    """
+    Worker process of a `ProcessJobManager`.
+
+    :param process: Worker process
+    :param connection: Connection jobs are sent to the worker through, and
+        reported done through
+    """
+
+    def __init__(self, process: Any, connection: Any) -> None:
+        self.process = process
+        self.connection = connection
+        self.job: Optional[str] = None
+
+    def is_idle(self) -> bool:
+        """
+        Check whether the worker is done with its last job. Workers killed while
+            running a job never report it done, even if their job is unmarked.
+
+        :return: Whether the worker can take another job
+        """
+        try:
+            while self.connection.poll():
+                if self.connection.recv() == self.job:
+                    self.job = None
+        except (EOFError, OSError):
+            return False
+
+        return self.job is None
+
+
+def _work(
+    connection: Any, jobs_dir: Path, initializer: Optional[Callable[[], Any]]
+) -> None:
+    """
+    Run jobs sent by a `ProcessJobManager` one at a time, reporting each of
+        them done, until the manager closes its end of the connection.
+
+    :param connection: Connection jobs are received and reported done through
+    :param jobs_dir: Directory to write progress and results to
+    :param initializer: Function called once before the first job
+    """
+    if initializer is not None:
+        initializer()
+
+    while True:
+        try:
+            job, job_fn, result_key, progress_key, args = connection.recv()
+        except EOFError:
+            return
+        job_fn(jobs_dir, job, result_key, progress_key, args)
+        connection.send(job)
+
+
+def _run_job(
+    fn: Callable,
+    progress: bool,
+    jobs_dir: Path,
+    job: str,
+    result_key: str,
+    progress_key: str,
+    args: Any,
+) -> None:
+    """
+    Run a callback as a job writing its progress and result to files, in the
+        format dash expects from background callback managers.
+
+    :param fn: Callback function
+    :param progress: Whether the callback takes a function to set its progress
+        as first argument
+    :param jobs_dir: Directory to write progress and results to
+    :param job: Id of the job
+    :param result_key: Key of the result
+    :param progress_key: Key of the progress
+    :param args: Arguments of the callback
+    """
+
+    def set_progress(progress_value: Any) -> None:
+        if not isinstance(progress_value, (list, tuple)):
+            progress_value = [progress_value]
+        _write_value(jobs_dir / f"{progress_key}.pkl", progress_value)
+
+    progress_args = [set_progress] if progress else []
+
+    try:
+        result = _call(fn, progress_args, args)
+    except PreventUpdate:
+        result = {"_dash_no_update": "_dash_no_update"}
+    except Exception as error:
+        result = {
+            "long_callback_error": {
+                "msg": str(error),
+                "tb": traceback.format_exc(),
+            }
+        }
+
+    # Mark the job done before writing its result, so that it's running until
+    # the result is read, unless it was terminated in the meantime
+    try:
+        (jobs_dir / f"{job}.job").replace(jobs_dir / f"{job}.done")
+    except FileNotFoundError:
+        return
+    try:
+        _write_value(jobs_dir / f"{result_key}.pkl", result)
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        result = {
+            "long_callback_error": {
+                "msg": f"Unpicklable result: {error}",
+                "tb": traceback.format_exc(),
+            }
+        }
+        _write_value(jobs_dir / f"{result_key}.pkl", result)
+
+
+def _read_memoized(fn: Callable, args: Any) -> Any:
+    """
+    Look up the result of a callback in its memoization cache, if it has one.
+
+    :param fn: Callback function
+    :param args: Arguments of the callback
+    :return: Cached result
+    :raises KeyError: If there's no cached result
+    """
+    cache_get = getattr(fn, "cache_get", None)
+    if cache_get is None:
+        raise KeyError(fn.__name__)
+
+    return _call(cache_get, [], args)
+
+
+def _call(fn: Callable, progress_args: list, args: Any) -> Any:
+    """
+    Call a callback with its arguments, as passed by dash.
+
+    :param fn: Callback function
+    :param progress_args: Arguments preceding the callback's own
+    :param args: Arguments of the callback, keyword arguments if a dictionary
+    :return: Return value of the callback
+    """
+    if isinstance(args, dict):
+        return fn(*progress_args, **args)
+    if isinstance(args, (list, tuple)):
+        return fn(*progress_args, *args)
+
+    return fn(*progress_args, args)
+
+
+def _job_pid(job: Union[str, int]) -> int:
+    """
+    Get the pid of the worker of a job.
+
+    :param job: Id of the job, made of its worker's pid and a sequence number
+    :return: Process id
+    """
+    return int(str(job).split("-")[0])
+
+
+def _write_value(path: Path, value: Any) -> None:
+    """
+    Pickle a value to a file, writing then renaming it so that readers never
+        see partial values.
+
+    :param path: Path of the file
+    :param value: Value to write
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(path)
+
+
+def _read_value(path: Path, default: Any) -> Any:
+    """
+    Unpickle a value from a file.
+
+    :param path: Path of the file
+    :param default: Value returned if there's no readable file
+    :return: Unpickled value
+    """
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return default
+
+
+def _kill(pid: int, process: Optional[Any] = None) -> None:
+    """
+    Kill a process, which may have been started by another dashboard worker.
+
+    :param pid: Process id
+    :param process: Process object, if started by this process
+    """
+    if process is not None:
+        process.kill()
+        return
+
+    # Windows has no SIGKILL, where SIGTERM terminates the process outright
+    try:
+        os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def _pid_exists(pid: int) -> bool:
+    """
+    Check whether a process exists.
+
+    :param pid: Process id
+    :return: Whether a process with this id exists, including zombies
+    """
+    # Sending a signal on Windows terminates the process, wait on it instead
+    if os.name == "nt":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x00100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            return False
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x102  # WAIT_TIMEOUT
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
@@ -0,0 +1,275 @@
+"""
+Reporting layer memoization.
+
+Dashboard callbacks and the filtered frames they build are memoized in a
+bounded in-process LRU cache and, optionally, in a local disk store shared
+by dashboard worker processes, which evicts least recently used entries once
+it exceeds its size budget. Keys are built from normalized call arguments and
+a version of the data results are computed from, see `data_version`, so that
+results of previous feature layer outputs are never served.
+"""
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAXSIZE = 256
+DEFAULT_MAX_BYTES = 512 * 1024**2
+DEFAULT_MAX_ENTRY_BYTES = 4 * 1024**2
+
+# Date strings as sent by date pickers, with or without a time
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}([ T][\d:.]+)?$")
+_MISSING = object()
+
+# Running size of each disk store written to by this process, so that stores
+# are only scanned on first use and once they exceed their size budget
+_store_bytes: Dict[Path, int] = {}
+_store_lock = threading.Lock()
+
+
+def memoize(
+    version: str,
+    maxsize: int = DEFAULT_MAXSIZE,
+    cache_dir: Optional[Union[str, Path]] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_entry_bytes: int = DEFAULT_MAX_ENTRY_BYTES,
+) -> Callable[[Callable], Callable]:
+    """
+    Memoize a function's results by its arguments and a data version.
+
+    Arguments are normalized before being hashed, so that equivalent inputs
+    share an entry, e.g., '2021-01-01' and Timestamp('2021-01-01'). Cached
+    results are shared between callers and must not be mutated. The wrapped
+    function gets `cache_info` and `cache_clear` methods for the in-process
+    cache, and a `cache_get` method looking up the result of a call without
+    making it, which raises KeyError if there's none.
+
+    :param version: Version of the data results depend on, part of every key
+    :param maxsize: Maximum number of results kept in memory per function
+    :param cache_dir: Optional directory of a disk store shared across
+        processes, results are only cached in memory if not specified
+    :param max_bytes: Size budget of the disk store, least recently used
+        entries are evicted beyond it
+    :param max_entry_bytes: Size limit of a single disk store entry, larger
+        results are only cached in memory
+    :return: Decorator memoizing a function
+    """
+
+    def decorator(function: Callable) -> Callable:
+        name = f"{function.__module__}.{function.__qualname__}"
+        memory: OrderedDict = OrderedDict()
+        stats = dict(hits=0, disk_hits=0, misses=0)
+        lock = threading.Lock()
+
+        def lookup(key: str) -> Any:
+            with lock:
+                if key in memory:
+                    memory.move_to_end(key)
+                    stats["hits"] += 1
+                    return memory[key]
+
+            # Fall back to the disk store
+            value = _MISSING
+            if cache_dir is not None:
+                value = _read_entry(Path(cache_dir) / f"{key}.pkl")
+            if value is not _MISSING:
+                stats["disk_hits"] += 1
+                remember(key, value)
+
+            return value
+
+        def remember(key: str, value: Any) -> None:
+            with lock:
+                memory[key] = value
+                memory.move_to_end(key)
+                while len(memory) > maxsize:
+                    memory.popitem(last=False)
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = _key(name, version, args, kwargs)
+            value = lookup(key)
+            if value is not _MISSING:
+                return value
+
+            value = function(*args, **kwargs)
+            stats["misses"] += 1
+            if cache_dir is not None:
+                _write_entry(Path(cache_dir), key, value, max_bytes, max_entry_bytes)
+            remember(key, value)
+
+            return value
+
+        def cache_get(*args: Any, **kwargs: Any) -> Any:
+            value = lookup(_key(name, version, args, kwargs))
+            if value is _MISSING:
+                raise KeyError(name)
+
+            return value
+
+        def cache_info() -> Dict[str, int]:
+            return dict(stats, size=len(memory))
+
+        def cache_clear() -> None:
+            with lock:
+                memory.clear()
+
+        wrapper.cache_get = cache_get
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+def data_version(paths: List[Union[str, Path]]) -> str:
+    """
+    Identify the version of data files by their modification times and sizes.
+
+    :param paths: Paths to the data files
+    :return: Hex digest changing whenever any of the files is rewritten
+    """
+    stats = []
+    for path in paths:
+        stat = Path(path).stat()
+        stats.append([str(path), stat.st_mtime_ns, stat.st_size])
+
+    return hashlib.sha256(json.dumps(stats).encode()).hexdigest()[:16]
+
+
+def _key(name: str, version: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """
+    Build the cache key of a call.
+
+    :param name: Qualified name of the function
+    :param version: Version of the data
+    :param args: Positional arguments of the call
+    :param kwargs: Keyword arguments of the call
+    :return: Hex digest identifying the call
+    """
+    key = [name, version, _normalize(list(args)), _normalize(kwargs)]
+
+    return hashlib.sha256(
+        json.dumps(key, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    """
+    Normalize an argument into a JSON-serializable value, where equivalent
+        dates, containers, and numpy scalars map to the same value.
+
+    :param value: Argument value
+    :return: Normalized value
+    """
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(_normalize(item) for item in value)
+    if isinstance(value, (date, np.datetime64)) or (
+        isinstance(value, str) and _DATE_PATTERN.match(value)
+    ):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def _read_entry(path: Path) -> Any:
+    """
+    Read an entry of the disk store, marking it as recently used.
+
+    :param path: Path to the entry
+    :return: Cached value, or `_MISSING` if there's no readable entry
+    """
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+        os.utime(path)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return _MISSING
+
+    return value
+
+
+def _write_entry(
+    cache_dir: Path, key: str, value: Any, max_bytes: int, max_entry_bytes: int
+) -> None:
+    """
+    Write an entry to the disk store and evict least recently used entries
+        until the store fits its size budget. Values that can't be pickled
+        or that exceed the entry size limit are only cached in memory.
+
+    :param cache_dir: Directory of the disk store
+    :param key: Key of the entry
+    :param value: Value to cache
+    :param max_bytes: Size budget of the disk store
+    :param max_entry_bytes: Size limit of a single entry
+    """
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return
+    if len(data) > max_entry_bytes:
+        return
+
+    # Write then rename, so that other processes never read partial entries
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{key}.pkl"
+    try:
+        replaced_bytes = path.stat().st_size
+    except FileNotFoundError:
+        replaced_bytes = 0
+    tmp_path = cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+    # Scanning the store also picks up entries written by other processes
+    with _store_lock:
+        total_bytes = _store_bytes.get(cache_dir)
+        if total_bytes is not None:
+            total_bytes += len(data) - replaced_bytes
+        if total_bytes is None or total_bytes > max_bytes:
+            total_bytes = _evict_entries(cache_dir, max_bytes)
+        _store_bytes[cache_dir] = total_bytes
+
+
+def _evict_entries(cache_dir: Path, max_bytes: int) -> int:
+    """
+    Evict least recently used entries of the disk store until it fits its
+        size budget.
+
+    :param cache_dir: Directory of the disk store
+    :param max_bytes: Size budget of the disk store
+    :return: Size of the remaining entries
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        Path(path).unlink(missing_ok=True)
+        total_bytes -= size
+
+    return total_bytes
@@ -0,0 +1,477 @@
+"""
+Reporting layer queries.
+
+Helpers answering dashboard requests from precomputed feature layer
+datasets, so that callbacks don't need to scan the underlying data.
+
+Datasets may be pandas DataFrames or, when memory-mapped with
+`src.io.read_feather_mmap`, pyarrow Tables. Indexes only hold row positions,
+so with Tables, columns are only materialized for the rows a query returns.
+"""
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+Data = Union[pd.DataFrame, pa.Table]
+Partition = Tuple[np.ndarray, np.ndarray]
+
+
+def partition_rows(data: Data, key_cols: List[str]) -> Dict[Any, Partition]:
+    """
+    Index rows by key, sorted by date, so that lookups are a dictionary hit
+        plus a binary search instead of a scan over the whole dataset.
+
+    :param data: Dataset with the key columns and a date column
+    :param key_cols: Columns identifying each partition, e.g., ['company_name']
+    :return: Dictionary of key value, or tuple of values for several key columns,
+        to the row positions of the partition and their dates, sorted by date
+    """
+    dates = _select_rows(data, columns=["date"])["date"].to_numpy()
+
+    # Sort once on categorical codes rather than hashing strings row by row
+    codes, uniques = zip(*[_factorize(data, col) for col in key_cols])
+    order = np.lexsort([dates] + list(codes[::-1]))
+
+    # Partitions are contiguous runs of equal codes in sorted order
+    is_start = np.zeros(len(order), dtype=bool)
+    is_start[:1] = True
+    for col_codes in codes:
+        sorted_codes = col_codes[order]
+        is_start[1:] |= sorted_codes[1:] != sorted_codes[:-1]
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(order))
+
+    partitions = {}
+    for start, end in zip(starts, ends):
+        key = tuple(
+            col_uniques[col_codes[order[start]]]
+            for col_codes, col_uniques in zip(codes, uniques)
+        )
+        positions = order[start:end]
+        partitions[key if len(key) > 1 else key[0]] = (positions, dates[positions])
+
+    return partitions
+
+
+def index_dt_labels(agg_data: Data) -> Dict[str, List[str]]:
+    """
+    Gather unique datetime labels of each frequency, in order of appearance.
+
+    :param agg_data: Output of `src.feature.nodes.fea_aggregate`
+    :return: Dictionary of agg_freq to its unique dt_label values
+    """
+    freq_codes, freqs = _factorize(agg_data, "agg_freq")
+    label_codes, labels = _factorize(agg_data, "dt_label")
+
+    # First appearance of each combination, in order of appearance
+    _, first = np.unique(
+        freq_codes.astype(np.int64) * len(labels) + label_codes, return_index=True
+    )
+    first.sort()
+
+    dt_labels = {freq: [] for freq in freqs[np.unique(freq_codes[first])]}
+    for freq_code, label_code in zip(freq_codes[first], label_codes[first]):
+        dt_labels[freqs[freq_code]].append(labels[label_code])
+
+    return dt_labels
+
+
+def query_agg(
+    agg_data: Data,
+    partitions: Dict[Any, Partition],
+    company_name: str,
+    agg_freq: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Look up aggregated data of a company and frequency between two dates,
+        inclusive.
+
+    :param agg_data: Output of `src.feature.nodes.fea_aggregate`
+    :param partitions: Partitions of agg_data by company_name and agg_freq,
+        see `partition_rows`
+    :param company_name: Company to look up
+    :param agg_freq: Aggregation frequency to look up
+    :param start_date: Start of the window (default: no lower bound)
+    :param end_date: End of the window (default: no upper bound)
+    :param columns: Columns to return (default: all)
+    :return: Matching rows sorted by date, empty if there are none
+    """
+    return query_rows(
+        agg_data, partitions, (company_name, agg_freq), start_date, end_date, columns
+    )
+
+
+def query_rows(
+    data: Data,
+    partitions: Dict[Any, Partition],
+    key: Any,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Look up rows of a partition between two dates, inclusive.
+
+    :param data: Dataset with a date column, e.g., the output of
+        `src.feature.nodes.fea_rolling`
+    :param partitions: Partitions of data, see `partition_rows`
+    :param key: Key of the partition to look up, e.g., a company_name
+    :param start_date: Start of the window (default: no lower bound)
+    :param end_date: End of the window (default: no upper bound)
+    :param columns: Columns to return (default: all)
+    :return: Matching rows sorted by date, empty if there are none
+    """
+    positions, dates = partitions.get(key, (np.array([], dtype=int), None))
+    start, end = _search_dates(dates, start_date, end_date)
+
+    return _select_rows(data, positions[start:end], columns)
+
+
+def rank_rows(
+    data: Data,
+    partitions: Dict[Any, Partition],
+    key: Any,
+    metric: str,
+    n: int = 10,
+    ascending: bool = False,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Rank the rows of a partition by a metric, e.g., all companies in a period
+        of aggregated data, partitioned by agg_freq and dt_label. Only the
+        metric of the partition's rows and the returned rows are read.
+
+    :param data: Dataset to rank rows of, e.g., the output of
+        `src.feature.nodes.fea_aggregate`
+    :param partitions: Partitions of data, see `partition_rows`
+    :param key: Key of the partition to rank, e.g., ('Q', '2021 Q3')
+    :param metric: Column to rank rows by, rows where it is missing are left out
+    :param n: Number of rows to return
+    :param ascending: True for the bottom n rows, False for the top n rows
+    :param columns: Columns to return (default: all)
+    :return: Top or bottom n rows, ranked by the metric, ties in row order
+    """
+    positions, _ = partitions.get(key, (np.array([], dtype=int), None))
+    values = _select_values(data, metric, positions)
+
+    # Sort the partition's values only, ranking missing values last
+    is_valid = ~np.isnan(values)
+    positions, values = positions[is_valid], values[is_valid]
+    order = np.argsort(values if ascending else -values, kind="stable")[:n]
+
+    return _select_rows(data, positions[order], columns).reset_index(drop=True)
+
+
+def window_corr(
+    corr_stats: Data,
+    partitions: Dict[Any, Partition],
+    company_name: str,
+    start_date: str,
+    end_date: str,
+) -> pd.DataFrame:
+    """
+    Compute the Pearson correlation matrix of a company between two dates,
+        inclusive, from cumulative statistics. The cost depends on the number
+        of metrics only, not on the length of the window.
+
+    :param corr_stats: Output of `src.feature.nodes.fea_corr_stats`
+    :param partitions: Partitions of corr_stats by company_name,
+        see `partition_rows`
+    :param company_name: Company to compute correlations for
+    :param start_date: Start of the window
+    :param end_date: End of the window
+    :return: Correlation matrix, as returned by `DataFrame.corr(numeric_only=True)`,
+        empty if the company has no statistics
+    """
+    # Unknown or cleared companies have no statistics to correlate
+    partition = partitions.get(company_name)
+    if partition is None:
+        return pd.DataFrame()
+    positions, dates = partition
+    start, end = _search_dates(dates, start_date, end_date)
+    stat_cols = [col for col in column_names(corr_stats) if "__" in col]
+
+    # Window statistics are the difference of the cumulative ones at its bounds
+    window = np.zeros(len(stat_cols))
+    if end > start:
+        bounds = [end - 1] if start == 0 else [end - 1, start - 1]
+        bounds_df = _select_rows(corr_stats, positions[bounds], stat_cols)
+        window += bounds_df.iloc[0].to_numpy()
+        if start > 0:
+            window -= bounds_df.iloc[1].to_numpy()
+    window = pd.Series(window, index=stat_cols)
+
+    # Recover metric pairs from column names, e.g., 'n__price__website_visits'
+    pairs = [col.split("__")[1:] for col in stat_cols if col[:3] == "n__"]
+    metrics = [x for x, y in pairs if x == y]
+    stats = {
+        stat: window[[f"{stat}__{x}__{y}" for x, y in pairs]].to_numpy()
+        for stat in ["n", "sx", "sy", "sxx", "syy", "sxy"]
+    }
+
+    # Pearson correlation from sums, requiring two observations and a non-zero
+    # variance, where tiny variances are leftovers of cancelling constant values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = stats["n"]
+        cov = stats["sxy"] - stats["sx"] * stats["sy"] / n
+        var_x = stats["sxx"] - stats["sx"] ** 2 / n
+        var_y = stats["syy"] - stats["sy"] ** 2 / n
+        valid = (
+            (n >= 2) & (var_x > 1e-12 * stats["sxx"]) & (var_y > 1e-12 * stats["syy"])
+        )
+        corr = np.where(valid, cov / np.sqrt(var_x * var_y), np.nan).clip(-1, 1)
+
+    # Fill both triangles of the symmetric matrix
+    rows = [metrics.index(x) for x, _ in pairs]
+    cols = [metrics.index(y) for _, y in pairs]
+    matrix = np.full((len(metrics), len(metrics)), np.nan)
+    matrix[rows, cols] = matrix[cols, rows] = corr
+
+    return pd.DataFrame(matrix, index=metrics, columns=metrics)
+
+
+def company_corr(
+    pivot_data: Data,
+    partitions: Dict[Any, Partition],
+    metric: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    companies: Optional[List[str]] = None,
+    min_periods: int = 2,
+) -> pd.DataFrame:
+    """
+    Compute the Pearson correlation matrix of a metric between companies
+        between two dates, inclusive, over pairwise complete dates, as
+        `DataFrame.corr` would. All pairs are computed at once from a few
+        masked matrix products rather than pair by pair.
+
+    :param pivot_data: Output of `src.feature.nodes.fea_company_pivot`
+    :param partitions: Partitions of pivot_data by metric, see `partition_rows`
+    :param metric: Metric to correlate
+    :param start_date: Start of the window (default: no lower bound)
+    :param end_date: End of the window (default: no upper bound)
+    :param companies: Companies to correlate (default: all)
+    :param min_periods: Minimum number of dates both companies have data on,
+        correlations of pairs with fewer are missing
+    :return: Company by company correlation matrix
+    """
+    if companies is None:
+        companies = [
+            col for col in column_names(pivot_data) if col not in ["metric", "date"]
+        ]
+    positions, dates = partitions.get(metric, (np.array([], dtype=int), None))
+    start, end = _search_dates(dates, start_date, end_date)
+    values = _select_rows(pivot_data, positions[start:end], companies).to_numpy(
+        dtype=float
+    )
+
+    # Center by company means, which leaves correlations unchanged but limits
+    # loss of precision, and zero missing values so that masks drop them
+    mask = ~np.isnan(values)
+    weights = mask.astype(float)
+    counts = weights.sum(axis=0)
+    means = np.where(mask, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    x = np.where(mask, values - means, 0.0)
+
+    # Sums over dates where both companies have data, e.g., sx[i, j] sums
+    # company i's values where company j's are present as well
+    n = weights.T @ weights
+    sx = x.T @ weights
+    sxx = (x * x).T @ weights
+    sxy = x.T @ x
+
+    # Pearson correlation from sums, requiring a non-zero variance, where tiny
+    # variances are leftovers of cancelling constant values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_x = sxx - sx**2 / n
+        var_y = var_x.T
+        valid = (
+            (n >= max(min_periods, 2)) & (var_x > 1e-12 * sxx) & (var_y > 1e-12 * sxx.T)
+        )
+        corr = np.where(valid, cov / np.sqrt(var_x * var_y), np.nan).clip(-1, 1)
+    corr[np.diag_indices_from(corr)] = np.where(np.diag(valid), 1.0, np.nan)
+
+    return pd.DataFrame(corr, index=companies, columns=companies)
+
+
+def cluster_order(corr: pd.DataFrame) -> List[Any]:
+    """
+    Order the rows of a correlation matrix so that clusters of correlated rows
+        are adjacent, as the leaves of a hierarchical clustering with average
+        linkage of 1 - correlation. Clusters are merged with the nearest
+        neighbor chain algorithm, each step of which is a vectorized pass over
+        one row of distances, rather than a search over all pairs.
+
+    :param corr: Correlation matrix, missing correlations are taken as 0
+    :return: Row labels in cluster order
+    """
+    n = len(corr)
+    if n < 2:
+        return corr.index.to_list()
+
+    distances = 1 - np.nan_to_num(corr.to_numpy(dtype=float))
+    np.fill_diagonal(distances, np.inf)
+    sizes = np.ones(n)
+    is_active = np.ones(n, dtype=bool)
+    leaves = {i: [i] for i in range(n)}
+
+    chain = []
+    for _ in range(n - 1):
+        # Follow nearest neighbors until two clusters are each other's nearest
+        while True:
+            if not chain:
+                chain.append(int(np.flatnonzero(is_active)[0]))
+            a = chain[-1]
+            row = np.where(is_active, distances[a], np.inf)
+            b = int(np.argmin(row))
+            if len(chain) > 1 and row[chain[-2]] <= row[b]:
+                b = chain[-2]
+            if len(chain) > 1 and b == chain[-2]:
+                break
+            chain.append(b)
+        chain = chain[:-2]
+
+        # Merge b into a, averaging distances weighted by cluster sizes
+        merged = (sizes[a] * distances[a] + sizes[b] * distances[b]) / (
+            sizes[a] + sizes[b]
+        )
+        distances[a], distances[:, a] = merged, merged
+        distances[a, a] = np.inf
+        sizes[a] += sizes[b]
+        is_active[b] = False
+        leaves[a] += leaves.pop(b)
+
+    return corr.index[leaves[int(np.flatnonzero(is_active)[0])]].to_list()
+
+
+def column_names(data: Data) -> List[str]:
+    """
+    Get the column names of a DataFrame or pyarrow Table.
+
+    :param data: DataFrame or pyarrow Table
+    :return: List of column names
+    """
+    if isinstance(data, pa.Table):
+        return data.column_names
+
+    return data.columns.to_list()
+
+
+def _factorize(data: Data, col: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode a column as integer codes into its sorted unique values. With pyarrow
+        Tables, only the unique values are converted to Python objects.
+
+    :param data: DataFrame or pyarrow Table
+    :param col: Column to encode
+    :return: Codes of each row and the sorted unique values they point to
+    """
+    if isinstance(data, pa.Table):
+        encoded = data.column(col).combine_chunks().dictionary_encode()
+        uniques = np.asarray(encoded.dictionary.to_pylist(), dtype=object)
+        codes = encoded.indices.to_numpy()
+
+        # Dictionaries are in order of appearance, remap codes to sorted order
+        ranks = np.empty(len(uniques), dtype=np.int64)
+        ranks[np.argsort(uniques, kind="stable")] = np.arange(len(uniques))
+        return ranks[codes], np.sort(uniques)
+
+    codes, uniques = pd.factorize(data[col], sort=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _search_dates(
+    dates: Optional[np.ndarray],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Tuple[int, int]:
+    """
+    Find the bounds of a date window, inclusive, in sorted dates.
+
+    :param dates: Sorted dates, or None for an empty partition
+    :param start_date: Start of the window (default: no lower bound)
+    :param end_date: End of the window (default: no upper bound)
+    :return: Start and end positions of the window
+    """
+    if dates is None:
+        return 0, 0
+
+    start = 0
+    if start_date is not None:
+        start = dates.searchsorted(np.datetime64(pd.Timestamp(start_date)))
+    end = len(dates)
+    if end_date is not None:
+        end = dates.searchsorted(np.datetime64(pd.Timestamp(end_date)), side="right")
+
+    return start, end
+
+
+def _select_values(data: Data, col: str, positions: np.ndarray) -> np.ndarray:
+    """
+    Read the values of a numeric column at some row positions.
+
+    :param data: DataFrame or pyarrow Table
+    :param col: Numeric column to read
+    :param positions: Row positions to read
+    :return: Float array of values, NaN where missing
+    """
+    if not isinstance(data, pa.Table):
+        return data[col].to_numpy()[positions].astype(float, copy=False)
+
+    # Take from each chunk holding any of the rows, whereas taking from the
+    # column would concatenate all of its chunks first
+    chunks = data.column(col).chunks
+    offsets = np.cumsum([0] + [len(chunk) for chunk in chunks])
+    chunk_ids = np.searchsorted(offsets, positions, side="right") - 1
+
+    values = np.empty(len(positions))
+    for chunk_id in np.unique(chunk_ids):
+        mask = chunk_ids == chunk_id
+        chunk_positions = pa.array(positions[mask] - offsets[chunk_id])
+        values[mask] = (
+            chunks[chunk_id].take(chunk_positions).to_numpy(zero_copy_only=False)
+        )
+
+    return values
+
+
+def _select_rows(
+    data: Data,
+    positions: Optional[np.ndarray] = None,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Materialize rows and columns of a dataset as a DataFrame, where categorical
+        columns are decoded to strings, as plotting libraries expect them.
+
+    :param data: DataFrame or pyarrow Table
+    :param positions: Row positions to select (default: all)
+    :param columns: Columns to select (default: all)
+    :return: DataFrame with the selected rows and columns
+    """
+    if isinstance(data, pa.Table):
+        table = data if columns is None else data.select(columns)
+        if positions is not None:
+            # Slice runs of consecutive rows, which is zero-copy, whereas take
+            # would concatenate the chunks of each column first
+            runs = np.split(positions, np.flatnonzero(np.diff(positions) != 1) + 1)
+            table = pa.concat_tables(
+                [table.slice(run[0], len(run)) for run in runs if len(run)]
+                or [table.slice(0, 0)]
+            )
+        df = table.to_pandas()
+    else:
+        df = data if columns is None else data[columns]
+        if positions is not None:
+            df = df.iloc[positions]
+
+    categorical_cols = df.select_dtypes("category").columns
+    if len(categorical_cols):
+        df = df.astype({col: object for col in categorical_cols})
+    return df
@@ -0,0 +1,129 @@
+"""
+Dependency-aware scheduler to run pipeline nodes across layers.
+
+Instead of running each layer as a whole and waiting for its slowest
+node, each node is dispatched as soon as the nodes producing its inputs
+are done, so the end-to-end runtime is close to the critical path.
+Nodes fanning out to their own executor, such as `fea_aggregate`, are
+handed the cores other running nodes leave free, so that nested pools
+don't oversubscribe the CPUs.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from src.cache import run_cached
+from src.metrics import new_run_id, run_instrumented
+
+Node = Tuple[Callable[[Dict[str, Any]], None], Dict[str, Any]]
+
+
+def run_dag(
+    nodes: List[Node],
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    run_log: Optional[Union[str, Path]] = None,
+    run_id: Optional[str] = None,
+    profile_dir: Optional[Union[str, Path]] = None,
+) -> None:
+    """
+    Run pipeline nodes in a bounded process pool, in dependency order.
+
+    Dependencies are inferred from file paths: a node depends on every
+    node whose `output` is one of its `inputs` (or its `input`). Inputs
+    not produced by any node, such as raw data, are expected to exist.
+
+    :param nodes: List of (runner, step) tuples, where the runner is called
+        with the step dictionary, e.g., (run_node, step) or
+        (preprocess_raw_data, step)
+    :param max_workers: Maximum number of worker processes (default: CPU count),
+        which also bounds the workers of nodes declaring an `executor`: such a
+        node gets the cores not taken by other running nodes as its
+        `max_workers`, or its step's own `max_workers` if lower, and holds them
+        until it's done
+    :param cache_dir: Optional directory of the node cache, nodes whose inputs,
+        function, and parameters are unchanged are restored from it instead of
+        being rerun, see `src.cache.run_cached`
+    :param run_log: Optional path to a JSON lines run log to append metrics of
+        each node to, see `src.metrics.run_instrumented`
+    :param run_id: Identifier of the run in the run log (default: a new one)
+    :param profile_dir: Optional directory to write a cProfile capture of each
+        node to, only used with a run log
+    :raises ValueError: If two nodes write the same output or dependencies are cyclic
+    """
+    dependencies = _infer_dependencies(nodes)
+    run_id = run_id or new_run_id()
+    n_cores = max_workers or os.cpu_count() or 1
+
+    pending, done = set(range(len(nodes))), set()
+    running: Dict[Future, Tuple[int, int]] = {}
+    busy_cores = 0
+
+    with ProcessPoolExecutor(max_workers=n_cores) as executor:
+        while pending or running:
+            # Dispatch nodes whose upstream nodes are all done, while cores are free
+            ready = [i for i in sorted(pending) if dependencies[i] <= done]
+            for i in ready:
+                if busy_cores >= n_cores:
+                    break
+                runner, step = nodes[i]
+                cores = 1
+                if step.get("executor") is not None:
+                    free_cores = n_cores - busy_cores
+                    cores = min(step.get("max_workers") or free_cores, free_cores)
+                    step = dict(step, max_workers=cores)
+                Path(step["output"]).parent.mkdir(parents=True, exist_ok=True)
+                if run_log is not None:
+                    future = executor.submit(
+                        run_instrumented,
+                        runner,
+                        dict(step),
+                        run_log,
+                        run_id,
+                        profile_dir,
+                        cache_dir,
+                    )
+                elif cache_dir is None:
+                    future = executor.submit(runner, dict(step))
+                else:
+                    future = executor.submit(run_cached, runner, dict(step), cache_dir)
+                running[future] = (i, cores)
+                busy_cores += cores
+                pending.remove(i)
+
+            if not running:
+                raise ValueError("Pipeline nodes have cyclic dependencies")
+
+            # Wait for any node to finish, raising its error if it failed
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                future.result()
+                i, cores = running.pop(future)
+                busy_cores -= cores
+                done.add(i)
+
+
+def _infer_dependencies(nodes: List[Node]) -> List[Set[int]]:
+    """
+    Infer upstream nodes of each node by matching input and output paths.
+
+    :param nodes: List of (runner, step) tuples
+    :return: Set of upstream node indices for each node
+    :raises ValueError: If two nodes write the same output
+    """
+    producers: Dict[Path, int] = {}
+    for i, (_, step) in enumerate(nodes):
+        output = Path(step["output"])
+        if output in producers:
+            raise ValueError(f"Multiple nodes write to {output}")
+        producers[output] = i
+
+    dependencies = []
+    for _, step in nodes:
+        inputs = step["inputs"] if "inputs" in step else [step["input"]]
+        dependencies.append(
+            {producers[Path(path)] for path in inputs if Path(path) in producers}
+        )
+
+    return dependencies
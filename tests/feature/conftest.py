@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -176,3 +177,43 @@ def master_df_agg():
         ],
     }
     return pd.DataFrame(data)
+
+
+@pytest.fixture
+def updated_pri_data(pri_consumer, pri_prices, pri_web):
+    # Restate the price of company B and add a new day of data for company A
+    updated_prices = pri_prices.copy()
+    updated_prices.loc[1, "price"] = 250
+
+    new_day = {"consumer_id": 1, "date": pd.Timestamp("2021-01-04")}
+    return [
+        pd.concat(
+            [df, df.head(1).assign(**new_day)],
+            ignore_index=True,
+        )
+        for df in [pri_consumer.copy(), updated_prices, pri_web.copy()]
+    ]
+
+
+@pytest.fixture
+def rolling_master_df():
+    # Companies with different numbers of days, a missing price and constant visits
+    rng = np.random.default_rng(0)
+    company_name = np.repeat(["A", "B", "C"], [30, 12, 25])
+    df = pd.DataFrame(
+        {
+            "company_name": company_name,
+            "symbol": company_name,
+            "date": np.concatenate(
+                [pd.date_range("2021-01-01", periods=n) for n in [30, 12, 25]]
+            ),
+            "spend": rng.normal(1000, 100, len(company_name)),
+            "price": rng.lognormal(4, 0.1, len(company_name)),
+            "web_data": rng.integers(0, 50, len(company_name)).astype(float),
+        }
+    )
+    df.loc[5, "price"] = np.nan
+    df.loc[df["company_name"] == "C", "web_data"] = 7.0
+
+    # Rows come in any order
+    return df.sample(frac=1, random_state=0).reset_index(drop=True)
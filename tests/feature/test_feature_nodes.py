@@ -1,6 +1,22 @@
+import numpy as np
+import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 
-from src.feature.nodes import fea_aggregate, fea_join_all
+from src.feature.nodes import (
+    _build_dt_labels,
+    fea_aggregate,
+    fea_company_pivot,
+    fea_corr_stats,
+    fea_join_all,
+    fea_rolling,
+    fea_update_aggregate,
+    fea_update_company_pivot,
+    fea_update_corr_stats,
+    fea_update_master,
+    fea_update_rolling,
+)
+from src.reporting.queries import partition_rows, window_corr
 
 
 def test_fea_join_all(pri_consumer, pri_prices, pri_web, master_df):
@@ -8,8 +24,332 @@ def test_fea_join_all(pri_consumer, pri_prices, pri_web, master_df):
     assert_frame_equal(result, master_df)
 
 
+def test_fea_join_all_sorted(pri_consumer, pri_prices, pri_web, master_df):
+    # Primary layer outputs record their sort order, enabling the ordered join
+    for pri_df in [pri_consumer, pri_prices, pri_web]:
+        pri_df.attrs["sorted_by"] = ["company_name", "date", "consumer_id"]
+    pri_web = pri_web.iloc[[0, 2]]
+
+    result = fea_join_all(pri_consumer, pri_prices, pri_web)
+    assert_frame_equal(result, master_df.iloc[[0, 2]].reset_index(drop=True))
+
+
 def test_fea_aggregate(master_df, master_df_agg):
     frequencies = ["Y", "Q", "M", "W"]
     result = fea_aggregate(master_df, frequencies)
 
     assert_frame_equal(result, master_df_agg)
+
+
+def test_fea_aggregate_rollup(master_df, master_df_agg):
+    frequencies = ["Y", "Q", "M", "W"]
+    result = fea_aggregate(master_df, frequencies, engine="rollup")
+
+    assert_frame_equal(result, master_df_agg)
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_fea_aggregate_sharded(master_df, master_df_agg, executor):
+    frequencies = ["Y", "Q", "M", "W"]
+
+    # Shards of contiguous companies are concatenated back in order
+    result = fea_aggregate(
+        master_df.iloc[::-1], frequencies, executor=executor, max_workers=2, n_shards=2
+    )
+    assert_frame_equal(result, master_df_agg)
+
+    result = fea_aggregate(
+        master_df, frequencies, "rollup", executor=executor, max_workers=2, n_shards=5
+    )
+    assert_frame_equal(result, master_df_agg)
+
+    with pytest.raises(ValueError, match="executor"):
+        fea_aggregate(master_df, frequencies, executor="cluster")
+
+
+def test_fea_aggregate_deltas():
+    # Company B has no data in June 2020
+    dates = pd.bdate_range("2019-12-01", "2021-03-31")
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(["B", "A"], len(dates)),
+            "symbol": np.repeat(["B", "A"], len(dates)),
+            "date": np.tile(dates, 2),
+            "price": np.arange(1, 2 * len(dates) + 1, dtype=float),
+        }
+    )
+    master_df = master_df[
+        (master_df["company_name"] == "A") | (master_df["date"].dt.month != 6)
+    ]
+
+    result = fea_aggregate(master_df, ["Q", "M", "D"], deltas=["mean"])
+    assert_frame_equal(
+        result.drop(columns=[col for col in result.columns if "_mean_" in col]),
+        fea_aggregate(master_df, ["Q", "M", "D"]),
+    )
+
+    def lookup(company_name, agg_freq, date, col="price_mean"):
+        is_row = (
+            (result["company_name"] == company_name)
+            & (result["agg_freq"] == agg_freq)
+            & (result["date"] == date)
+        )
+        return result.loc[is_row, col].item()
+
+    # Previous periods with data, the same period a year earlier, and the last
+    # period of the previous year
+    for company_name, agg_freq, date, prev, yoy, ytd in [
+        ("B", "M", "2020-07-31", "2020-05-31", None, "2019-12-31"),
+        ("B", "M", "2021-02-28", "2021-01-31", "2020-02-29", "2020-12-31"),
+        ("A", "Q", "2021-03-31", "2020-12-31", "2020-03-31", "2020-12-31"),
+        ("A", "D", "2021-03-01", "2021-02-26", "2020-02-28", "2020-12-31"),
+    ]:
+        value = lookup(company_name, agg_freq, date)
+        for baseline, baseline_date in [("prev", prev), ("yoy", yoy), ("ytd", ytd)]:
+            col = f"price_mean_{baseline}"
+            if baseline_date is None:
+                assert np.isnan(lookup(company_name, agg_freq, date, col))
+                continue
+            expected = lookup(company_name, agg_freq, baseline_date)
+            assert lookup(company_name, agg_freq, date, col) == expected
+            assert lookup(company_name, agg_freq, date, f"{col}_diff") == pytest.approx(
+                value - expected
+            )
+            assert lookup(company_name, agg_freq, date, f"{col}_pct") == pytest.approx(
+                (value / expected - 1) * 100
+            )
+
+    # Baselines don't cross companies
+    first_rows = result.groupby(["company_name", "agg_freq"]).head(1)
+    assert first_rows["price_mean_prev"].isna().all()
+
+
+def test_build_dt_labels(master_df_agg):
+    daily_df = master_df_agg.head(1).assign(agg_freq="D")
+    df = pd.concat([master_df_agg, daily_df], ignore_index=True)
+
+    result = _build_dt_labels(df)
+    assert result.to_list() == master_df_agg["dt_label"].to_list() + ["01/31/2021"]
+
+
+def test_fea_update_master(pri_consumer, pri_prices, pri_web, updated_pri_data):
+    master_df = fea_join_all(pri_consumer, pri_prices, pri_web)
+    changed_keys = pd.DataFrame(
+        {
+            "consumer_id": [2, 1],
+            "company_name": ["B", "A"],
+            "date": pd.to_datetime(["2021-01-02", "2021-01-04"]),
+        }
+    )
+
+    result = fea_update_master(master_df, *updated_pri_data, changed_keys)
+    expected = fea_join_all(*[df.copy() for df in updated_pri_data])
+    assert_frame_equal(result, expected)
+
+
+def test_fea_update_master_consumer_ids(pri_consumer, pri_prices, pri_web):
+    # Company A has two consumer ids on the same date, only one of them changes
+    pri_dfs = [
+        df.assign(company_name=["A", "B", "A"], date=df["date"].iloc[0])
+        for df in [pri_consumer, pri_prices, pri_web]
+    ]
+    master_df = fea_join_all(*[df.copy() for df in pri_dfs])
+    pri_dfs[1].loc[0, "price"] = 150
+    changed_keys = pri_dfs[1].loc[[0], ["consumer_id", "company_name", "date"]]
+
+    result = fea_update_master(master_df, *pri_dfs, changed_keys)
+    expected = fea_join_all(*[df.copy() for df in pri_dfs])
+    assert len(result) == 3
+    assert_frame_equal(result, expected)
+
+
+def test_fea_update_aggregate(master_df):
+    frequencies = ["Y", "Q", "M", "W", "D"]
+    agg_df = fea_aggregate(master_df.copy(), frequencies)
+
+    # Restate one day of company B and add a new day of data for company A
+    updated_df = pd.concat(
+        [master_df, master_df.head(1).assign(date=pd.Timestamp("2021-01-04"))],
+        ignore_index=True,
+    )
+    updated_df.loc[1, "price"] = 250
+    changed_keys = pd.DataFrame(
+        {
+            "company_name": ["B", "A"],
+            "date": pd.to_datetime(["2021-01-02", "2021-01-04"]),
+        }
+    )
+
+    result = fea_update_aggregate(agg_df, updated_df, changed_keys, frequencies)
+    expected = fea_aggregate(updated_df, frequencies)
+    assert_frame_equal(result, expected)
+
+    # Deltas of periods following changed ones are updated as well
+    agg_df = fea_aggregate(master_df.copy(), frequencies, deltas=["mean"])
+    result = fea_update_aggregate(
+        agg_df, updated_df, changed_keys, frequencies, deltas=["mean"]
+    )
+    expected = fea_aggregate(updated_df, frequencies, deltas=["mean"])
+    assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("min_periods", [None, 3])
+def test_fea_rolling(rolling_master_df, min_periods):
+    metrics = ["spend", "price", "web_data"]
+    result = fea_rolling(rolling_master_df, [5, 20], metrics, "price", min_periods)
+
+    # Compare against rolling windows computed company by company
+    expected_dfs = []
+    sorted_df = rolling_master_df.sort_values(["company_name", "date"])
+    for _, company_df in sorted_df.groupby("company_name"):
+        expected = company_df[["company_name", "symbol", "date"]].copy()
+        price = company_df["price"]
+        for window in [5, 20]:
+            rolling = company_df[metrics].rolling(window, min_periods or window)
+            expected[f"price_return_{window}"] = price / price.shift(window) - 1
+            expected[f"price_volatility_{window}"] = (
+                (price / price.shift(1) - 1)
+                .rolling(window, min_periods or window)
+                .std()
+            )
+            for metric in metrics:
+                expected[f"{metric}_mean_{window}"] = rolling[metric].mean()
+                expected[f"{metric}_std_{window}"] = rolling[metric].std()
+            for x, y in [
+                ("spend", "price"),
+                ("spend", "web_data"),
+                ("price", "web_data"),
+            ]:
+                expected[f"{x}_{y}_corr_{window}"] = rolling[x].corr(company_df[y])
+        expected_dfs.append(expected)
+    expected = pd.concat(expected_dfs, ignore_index=True)
+
+    # Constant values have no correlation, rather than a numerical artifact
+    expected = expected.replace([np.inf, -np.inf], np.nan)
+    assert result["spend_web_data_corr_5"][result["company_name"] == "C"].isna().all()
+    assert_frame_equal(result[expected.columns], expected, check_like=True, atol=1e-8)
+
+
+def test_fea_update_rolling(rolling_master_df):
+    metrics = ["spend", "price"]
+    rolling_df = fea_rolling(rolling_master_df, [5], metrics)
+
+    # Restate one day of company B and add a new day of data for company A
+    updated_df = pd.concat(
+        [
+            rolling_master_df,
+            rolling_master_df[rolling_master_df["company_name"] == "A"]
+            .head(1)
+            .assign(date=pd.Timestamp("2021-03-01")),
+        ],
+        ignore_index=True,
+    )
+    updated_df.loc[updated_df["company_name"] == "B", "price"] += 1
+    changed_keys = pd.DataFrame(
+        {
+            "company_name": ["B", "A"],
+            "date": pd.to_datetime(["2021-01-02", "2021-03-01"]),
+        }
+    )
+
+    result = fea_update_rolling(
+        rolling_df, updated_df, changed_keys, [5], metrics=metrics
+    )
+    expected = fea_rolling(updated_df, [5], metrics)
+    assert_frame_equal(result, expected)
+
+
+def test_fea_company_pivot(rolling_master_df):
+    result = fea_company_pivot(rolling_master_df, ["spend", "price"])
+
+    expected = (
+        rolling_master_df.melt(
+            id_vars=["company_name", "date"],
+            value_vars=["spend", "price"],
+            var_name="metric",
+        )
+        .pivot(index=["metric", "date"], columns="company_name", values="value")
+        .reindex(["spend", "price"], level="metric")
+        .reset_index()
+    )
+    expected.columns.name = None
+    assert_frame_equal(result, expected)
+
+
+def test_fea_corr_stats(master_df):
+    result = fea_corr_stats(master_df)
+
+    # Statistics accumulate per company over dates, centered by company mean
+    assert result[["company_name", "date"]].equals(master_df[["company_name", "date"]])
+    assert result["n__spend__price"].to_list() == [1, 1, 1]
+    assert result["sxy__spend__price"].to_list() == [0, 0, 0]
+
+
+@pytest.fixture
+def updated_master_df(rolling_master_df):
+    # Restate prices of company B from a date on, add a new day of data for
+    # company A, and a new company D
+    updated_df = pd.concat(
+        [
+            rolling_master_df,
+            rolling_master_df[rolling_master_df["company_name"] == "A"]
+            .head(1)
+            .assign(date=pd.Timestamp("2021-03-01")),
+            rolling_master_df[rolling_master_df["company_name"] == "C"]
+            .head(3)
+            .assign(company_name="D", symbol="D"),
+        ],
+        ignore_index=True,
+    )
+    is_restated = (updated_df["company_name"] == "B") & (
+        updated_df["date"] >= "2021-01-06"
+    )
+    updated_df.loc[is_restated, "price"] += 1
+    changed_keys = pd.DataFrame(
+        {
+            "company_name": ["B", "A", "D"],
+            "date": pd.to_datetime(["2021-01-06", "2021-03-01", "2021-01-01"]),
+        }
+    )
+    return updated_df, changed_keys
+
+
+def test_fea_update_corr_stats(rolling_master_df, updated_master_df):
+    updated_df, changed_keys = updated_master_df
+    corr_df = fea_corr_stats(rolling_master_df)
+
+    result = fea_update_corr_stats(corr_df, updated_df, changed_keys)
+    expected = fea_corr_stats(updated_df)
+    assert_frame_equal(
+        result[["company_name", "date"]], expected[["company_name", "date"]]
+    )
+
+    # Centers of companies seen before are kept, which leaves correlations of
+    # windows before, around, and after the changed dates unchanged
+    result_partitions = partition_rows(result, ["company_name"])
+    expected_partitions = partition_rows(expected, ["company_name"])
+    for company_name in ["A", "B", "C", "D"]:
+        for start_date, end_date in [
+            ("2021-01-01", "2021-01-05"),
+            ("2021-01-03", "2021-01-10"),
+            ("2021-01-01", "2021-03-01"),
+        ]:
+            assert_frame_equal(
+                window_corr(
+                    result, result_partitions, company_name, start_date, end_date
+                ),
+                window_corr(
+                    expected, expected_partitions, company_name, start_date, end_date
+                ),
+            )
+
+
+def test_fea_update_company_pivot(rolling_master_df, updated_master_df):
+    updated_df, changed_keys = updated_master_df
+    pivot_df = fea_company_pivot(rolling_master_df, ["spend", "price"])
+
+    result = fea_update_company_pivot(
+        pivot_df, updated_df, changed_keys, ["spend", "price"]
+    )
+    expected = fea_company_pivot(updated_df, ["spend", "price"])
+    assert_frame_equal(result, expected)
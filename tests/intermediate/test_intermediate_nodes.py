@@ -1,6 +1,14 @@
+import pandas as pd
+import pytest
 from pandas.testing import assert_frame_equal
 
-from src.intermediate.nodes import clean_column_names, preprocess
+from src.intermediate.nodes import (
+    clean_column_names,
+    preprocess,
+    preprocess_raw_data,
+    read_csv,
+)
+from src.io import read_feather_mmap
 
 
 def test_clean_column_names(uncleaned_df):
@@ -14,3 +22,151 @@ def test_preprocess(mock_raw_price_data, expected_int_price_data):
 
     result = preprocess(mock_raw_price_data, rename, datetime_cols)
     assert_frame_equal(result, expected_int_price_data)
+
+
+@pytest.mark.parametrize("schema", [None, {"Date": "timestamp[ns]", "value": "int64"}])
+def test_preprocess_raw_data_chunked(
+    tmp_path, mock_raw_price_data, expected_int_price_data, schema
+):
+    # Repeat rows so that duplicates span several chunks
+    input, output = tmp_path / "prices.csv", tmp_path / "prices.feather"
+    pd.concat([mock_raw_price_data] * 2).to_csv(input, index=False)
+
+    preprocess_raw_data(
+        dict(
+            input=input,
+            output=output,
+            chunksize=2,
+            schema=schema,
+            rename={"value": "Price Value"},
+            datetime_cols=["Date", "TimeStamp"],
+        )
+    )
+    assert_frame_equal(pd.read_feather(output), expected_int_price_data)
+
+
+@pytest.mark.parametrize("schema", [None, {"value": "int64"}])
+def test_preprocess_raw_data_chunked_dtypes(tmp_path, mock_raw_price_data, schema):
+    # Later chunks have missing integers and strings in an empty column
+    input = tmp_path / "prices.csv"
+    raw_df = mock_raw_price_data.assign(note=[None, None, None, "restated", None])
+    raw_df["value"] = raw_df["value"].astype("Int64")
+    raw_df.loc[3, "value"] = None
+    raw_df.to_csv(input, index=False)
+
+    args = dict(input=input, schema=schema, datetime_cols=["Date", "TimeStamp"])
+    preprocess_raw_data(dict(args, output=tmp_path / "expected.feather"))
+    preprocess_raw_data(dict(args, output=tmp_path / "prices.feather", chunksize=2))
+    assert_frame_equal(
+        pd.read_feather(tmp_path / "prices.feather"),
+        pd.read_feather(tmp_path / "expected.feather"),
+    )
+
+
+def test_preprocess_raw_data_chunked_compact(tmp_path):
+    # Chunks have different symbols and ranges of ids
+    input = tmp_path / "consumer.csv"
+    pd.DataFrame(
+        {
+            "consumer_id": [1, 2, 300, 4, 5],
+            "Symbol": ["B", "A", "C", None, "A"],
+            "Transaction Count": [10, 20, 30, 40, 50],
+        }
+    ).to_csv(input, index=False)
+
+    preprocess_raw_data(dict(input=input, output=tmp_path / "expected.feather"))
+    preprocess_raw_data(
+        dict(input=input, output=tmp_path / "consumer.feather", chunksize=2)
+    )
+    result = pd.read_feather(tmp_path / "consumer.feather")
+    assert_frame_equal(result, pd.read_feather(tmp_path / "expected.feather"))
+    assert result.dtypes.to_dict() == {
+        "consumer_id": "int16",
+        "symbol": pd.CategoricalDtype(["A", "B", "C"]),
+        "transaction_count": "int8",
+    }
+
+
+def test_preprocess_raw_data_chunked_collisions(
+    tmp_path, monkeypatch, mock_raw_price_data, expected_int_price_data
+):
+    # Every row hashes the same, so only comparing values tells rows apart
+    monkeypatch.setattr(
+        pd.util,
+        "hash_pandas_object",
+        lambda df, index: pd.Series(0, index=df.index, dtype="uint64"),
+    )
+    input, output = tmp_path / "prices.csv", tmp_path / "prices.feather"
+    pd.concat([mock_raw_price_data] * 2).to_csv(input, index=False)
+
+    preprocess_raw_data(
+        dict(
+            input=input,
+            output=output,
+            chunksize=2,
+            rename={"value": "Price Value"},
+            datetime_cols=["Date", "TimeStamp"],
+        )
+    )
+    assert_frame_equal(pd.read_feather(output), expected_int_price_data)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "prices.csv",
+        "prices.feather",
+    ]
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_preprocess_raw_data_while_mapped(tmp_path, mock_raw_price_data, chunksize):
+    input, output = tmp_path / "prices.csv", tmp_path / "prices.feather"
+    args = dict(
+        input=input,
+        output=output,
+        chunksize=chunksize,
+        write_kwargs=dict(compression="uncompressed"),
+    )
+    mock_raw_price_data.to_csv(input, index=False)
+    preprocess_raw_data(dict(args))
+    table = read_feather_mmap(output)
+    expected = table.to_pandas()
+
+    # Rerunning replaces a mapped output, where the mapping keeps the old data
+    mock_raw_price_data.head(1).to_csv(input, index=False)
+    preprocess_raw_data(dict(args))
+    assert_frame_equal(table.to_pandas(), expected)
+    assert len(pd.read_feather(output)) == 1
+
+
+def test_read_csv_arrow(tmp_path, mock_raw_price_data):
+    input = tmp_path / "prices.csv"
+    mock_raw_price_data.to_csv(input)
+
+    schema = {"ID": "int64", "Date": "timestamp[ns]", "TimeStamp": "timestamp[ns]"}
+    result = read_csv(input, schema)
+
+    expected = pd.read_csv(input)
+    expected["Date"] = pd.to_datetime(expected["Date"])
+    expected["TimeStamp"] = pd.to_datetime(expected["TimeStamp"])
+    assert_frame_equal(result, expected)
+
+
+def test_read_csv_arrow_timestamp_formats(tmp_path):
+    input = tmp_path / "prices.csv"
+    pd.DataFrame({"Date": ["02/01/2023"]}).to_csv(input, index=False)
+
+    # Dates are parsed with the declared format, day first here
+    result = read_csv(input, {"Date": "timestamp[ns]"}, ["%d/%m/%Y"])
+    assert result["Date"].tolist() == [pd.Timestamp("2023-01-02")]
+
+    # Dates in another format are rejected rather than guessed
+    with pytest.warns(UserWarning, match="instead of pyarrow"):
+        result = read_csv(input, {"Date": "timestamp[ns]"}, ["%Y-%m-%d"])
+    assert result["Date"].tolist() == ["02/01/2023"]
+
+
+def test_read_csv_arrow_fallback(tmp_path, mock_raw_price_data):
+    input = tmp_path / "prices.csv"
+    mock_raw_price_data.to_csv(input)
+
+    with pytest.warns(UserWarning, match="instead of pyarrow"):
+        result = read_csv(input, {"Missing": "int64"})
+    assert_frame_equal(result, pd.read_csv(input))
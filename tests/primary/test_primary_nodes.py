@@ -1,6 +1,14 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
 from pandas.testing import assert_frame_equal
 
-from src.primary.nodes import enrich_int_data, keep_latest_data
+from src.primary.nodes import (
+    enrich_int_data,
+    join_dimension,
+    keep_latest_data,
+    update_latest_data,
+)
 
 
 def test_keep_latest_data(mock_int_price_data, expected_latest_price_data):
@@ -26,3 +34,58 @@ def test_enrich_int_data(
         timestamp_col,
     )
     assert_frame_equal(result, expected_pri_price_data)
+
+
+def test_keep_latest_data_max(mock_int_price_data, expected_latest_price_data):
+    group_cols = ["company_name", "date"]
+    df = pd.concat(
+        [
+            mock_int_price_data.assign(date=pd.Timestamp("2023-01-02")),
+            mock_int_price_data.iloc[::-1],
+            mock_int_price_data.iloc[[4]].assign(price_value=600),
+        ],
+        ignore_index=True,
+    )
+
+    # Rows keep their input order, and ties go to the last row
+    result = keep_latest_data(df, group_cols, method="max")
+    expected = pd.concat(
+        [
+            expected_latest_price_data.assign(date=pd.Timestamp("2023-01-02")),
+            expected_latest_price_data.assign(price_value=600),
+        ],
+        ignore_index=True,
+    )
+    assert_frame_equal(result, expected)
+
+
+def test_update_latest_data(mock_int_price_data):
+    group_cols = ["company_name", "date"]
+    latest_df = keep_latest_data(
+        mock_int_price_data.iloc[:3], group_cols, method="max", drop_timestamp=False
+    )
+
+    result = update_latest_data(latest_df, mock_int_price_data.iloc[3:], group_cols)
+    expected = keep_latest_data(
+        mock_int_price_data, group_cols, method="max", drop_timestamp=False
+    )
+    assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("as_table", [False, True])
+@pytest.mark.parametrize("on", [["id"], ["company_name", "id"]])
+def test_join_dimension(mock_sec_master_data, as_table, on):
+    df = pd.DataFrame(
+        {
+            "id": [3, 1, 4, 1],
+            "company_name": ["Company C", "Company A", "Company D", "Company A"],
+            "price_value": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+    dimension = mock_sec_master_data.assign(n_shares=[10, 20, 30])
+    expected = df.merge(dimension, how="left", on=on)
+    if as_table:
+        dimension = pa.Table.from_pandas(dimension, preserve_index=False)
+
+    result = join_dimension(df, dimension, on)
+    assert_frame_equal(result, expected)
@@ -0,0 +1,101 @@
+import json
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.io import read_changes, read_feather, read_feather_metadata, write_feather
+from src.primary.pipeline import run_incremental_primary_node, run_primary_node
+
+
+def run_step(tmp_path, int_df, sec_master_df, runner=run_incremental_primary_node):
+    int_df.to_feather(tmp_path / "prices.feather", chunksize=4)
+    sec_master_df.to_feather(tmp_path / "sec_master.feather")
+    runner(
+        dict(
+            function=lambda df, sec_master, **kwargs: df.merge(sec_master),
+            inputs=[tmp_path / "prices.feather", tmp_path / "sec_master.feather"],
+            output=tmp_path / "pri_prices.feather",
+            group_cols=["id", "date"],
+            sort_cols=["date", "id"],
+        )
+    )
+    return read_feather(tmp_path / "pri_prices.feather")
+
+
+def test_run_incremental_primary_node(tmp_path, mock_sec_master_data):
+    int_df = pd.DataFrame(
+        {
+            "id": [1, 2, 3] * 4,
+            "date": pd.to_datetime(["2023-01-01"] * 6 + ["2023-01-02"] * 6),
+            "timestamp": pd.date_range("2023-01-01", periods=12, freq="H"),
+            "price_value": range(12),
+        }
+    )
+    state_path = tmp_path / "pri_prices_latest.json"
+    result = run_step(tmp_path, int_df, mock_sec_master_data)
+    assert result["price_value"].to_list() == [3, 4, 5, 9, 10, 11]
+    assert json.loads(state_path.read_text())["rows"] == 12
+    version = read_feather_metadata(tmp_path / "pri_prices.feather")["version"]
+
+    # Appended restatements are merged into the latest data
+    batch_df = int_df.iloc[[0, 10]].assign(
+        timestamp=pd.Timestamp("2023-02-01"), price_value=[12, 13]
+    )
+    appended_df = pd.concat([int_df, batch_df], ignore_index=True)
+    result = run_step(tmp_path, appended_df, mock_sec_master_data)
+    assert result["price_value"].to_list() == [12, 4, 5, 9, 13, 11]
+    assert json.loads(state_path.read_text())["rows"] == 14
+
+    # Changed rows are logged for downstream nodes
+    changes_df = read_changes(tmp_path / "pri_prices.feather", version)
+    assert sorted(changes_df["price_value"]) == [12, 13]
+
+    # Rewritten rows seen before are caught by the prefix hash, rebuilding from scratch
+    rewritten_df = appended_df.copy()
+    rewritten_df.loc[4, "price_value"] = 14
+    rewritten_df = pd.concat([rewritten_df, batch_df.iloc[[0]]], ignore_index=True)
+    result = run_step(tmp_path, rewritten_df, mock_sec_master_data)
+    assert result["price_value"].to_list() == [12, 14, 5, 9, 13, 11]
+    assert json.loads(state_path.read_text())["rows"] == 15
+    assert read_changes(tmp_path / "pri_prices.feather", version) is None
+
+    # Outputs replaced behind the index's back, e.g., restored from the node
+    # cache, aren't changed by the appended rows alone
+    write_feather(result, tmp_path / "pri_prices.feather", metadata=dict(version="0"))
+    rewritten_df = pd.concat([rewritten_df, batch_df.iloc[[1]]], ignore_index=True)
+    result = run_step(tmp_path, rewritten_df, mock_sec_master_data)
+    assert read_changes(tmp_path / "pri_prices.feather", "0") is None
+
+    (tmp_path / "full").mkdir()
+    assert_frame_equal(
+        result, run_step(tmp_path / "full", rewritten_df, mock_sec_master_data)
+    )
+
+
+def test_run_primary_node(tmp_path, mock_sec_master_data):
+    int_df = pd.DataFrame(
+        {
+            "id": [1, 2, 3] * 2,
+            "date": pd.to_datetime(["2023-01-01"] * 6),
+            "timestamp": pd.date_range("2023-01-01", periods=6, freq="H"),
+            "price_value": range(6),
+        }
+    )
+    output = tmp_path / "pri_prices.feather"
+
+    # Full runs version their output, so that the next incremental run updates it
+    run_step(tmp_path, int_df, mock_sec_master_data, run_primary_node)
+    version = read_feather_metadata(output)["version"]
+    batch_df = int_df.iloc[[0]].assign(timestamp=pd.Timestamp("2023-02-01"))
+    appended_df = pd.concat([int_df, batch_df], ignore_index=True)
+    run_step(tmp_path, appended_df, mock_sec_master_data)
+    assert read_changes(output, version)["price_value"].to_list() == [0]
+
+    # Without appended rows, the output is left as is
+    version = read_feather_metadata(output)["version"]
+    run_step(tmp_path, appended_df, mock_sec_master_data)
+    assert read_feather_metadata(output)["version"] == version
+
+    # Full runs rebuild the output even if it could be updated
+    run_step(tmp_path, appended_df, mock_sec_master_data, run_primary_node)
+    assert read_changes(output, version) is None
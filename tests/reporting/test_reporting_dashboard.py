@@ -0,0 +1,170 @@
+import importlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature.pipeline import get_feature_steps
+from src.io import run_node, write_feather
+from src.reporting.jobs import ProcessJobManager
+
+HEAVY_CALLBACKS = {
+    "corr-heatmap": "update_corr_heatmap",
+    "historical-trend": "update_historical_trend",
+    "company-corr-heatmap": "update_company_corr_heatmap",
+}
+
+
+@pytest.fixture(scope="module")
+def dashboard(tmp_path_factory):
+    # Build feature outputs of a few companies where the dashboard reads them
+    tmp_path = tmp_path_factory.mktemp("dashboard")
+    rng = np.random.default_rng(0)
+    companies = [f"Company {i}" for i in range(4)]
+    master_df = pd.DataFrame(
+        {
+            "date": np.tile(pd.date_range("2021-01-01", periods=400), 4),
+            "credit_card_spend": rng.normal(1e5, 1e4, 1600),
+            "transaction_count": rng.integers(0, 100, 1600),
+            "company_name": np.repeat(companies, 400),
+            "symbol": np.repeat(companies, 400),
+            "price": rng.normal(50, 5, 1600),
+            "website_visits": rng.integers(0, 1000, 1600),
+        }
+    )
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    os.environ["DASHBOARD_CACHE_DIR"] = ""
+    os.environ["DASHBOARD_JOBS_DIR"] = str(tmp_path / "jobs")
+    try:
+        os.makedirs("data/04_feature")
+        write_feather(master_df, "data/04_feature/master_df.feather")
+        for step in get_feature_steps()[1:5]:
+            run_node(dict(step, executor="thread") if "executor" in step else step)
+
+        sys.modules.pop("src.reporting.dashboard", None)
+        yield importlib.import_module("src.reporting.dashboard")
+    finally:
+        sys.modules.pop("src.reporting.dashboard", None)
+        del os.environ["DASHBOARD_CACHE_DIR"], os.environ["DASHBOARD_JOBS_DIR"]
+        os.chdir(cwd)
+
+
+def callback_request(dashboard, graph_id, values):
+    # Request body the renderer sends when the inputs of a callback change
+    callback = next(
+        callback
+        for callback in dashboard.app.callback_map.values()
+        if callback["callback"].__name__ == HEAVY_CALLBACKS[graph_id]
+    )
+    output = next(
+        key for key, value in dashboard.app.callback_map.items() if value is callback
+    )
+    outputs = [
+        dict(zip(["id", "property"], spec.strip(".").split(".")))
+        for spec in output.split("...")
+    ]
+    return dict(
+        output=output,
+        outputs=outputs if len(outputs) > 1 else outputs[0],
+        inputs=[
+            dict(spec, value=value) for spec, value in zip(callback["inputs"], values)
+        ],
+        changedPropIds=[],
+        state=[],
+    )
+
+
+def test_dashboard_background_jobs(dashboard):
+    app = dashboard.app
+    assert isinstance(dashboard.background_manager, ProcessJobManager)
+    assert app._background_manager is dashboard.background_manager
+    client = app.server.test_client()
+
+    # Heavy callbacks are registered as background jobs, which dim their graph
+    # while running and are cancelled by switching tabs
+    requests = {
+        "corr-heatmap": [dashboard.corr_companies[0], "2021-01-01", "2021-12-31"],
+        "historical-trend": [
+            dashboard.agg_companies[:2],
+            "M",
+            "price_mean",
+            "2021-01-01",
+            "2021-12-31",
+        ],
+        "company-corr-heatmap": ["price", [], "cluster", "2021-01-01", "2021-12-31"],
+    }
+    for graph_id, values in requests.items():
+        body = callback_request(dashboard, graph_id, values)
+        job = client.post("/_dash-update-component", json=body).get_json()
+        assert job["running"] == {f"{graph_id}.style": {"opacity": 0.5}}
+        assert job["runningOff"] == {f"{graph_id}.style": {"opacity": 1}}
+        assert job["cancel"] == [{"id": "dashboard-tabs", "property": "value"}]
+
+        # Poll the job until its result is ready, as the renderer does
+        url = f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}"
+        for _ in range(500):
+            response = client.post(url, json=body)
+            assert response.status_code != 204, f"{graph_id} job was cancelled"
+            if "response" in response.get_json():
+                break
+            time.sleep(0.01)
+        assert graph_id in response.get_json()["response"]
+
+    # Jobs of superseded inputs are terminated
+    body = callback_request(dashboard, "historical-trend", requests["historical-trend"])
+    old_job = client.post("/_dash-update-component", json=body).get_json()["job"]
+    client.post(f"/_dash-update-component?oldJob={old_job}", json=body)
+    assert not dashboard.background_manager.job_running(old_job)
+
+    # Jobs are cancelled when switching tabs
+    job = client.post("/_dash-update-component", json=body).get_json()["job"]
+    cancel_body = dict(
+        output="..dashboard-tabs.id..",
+        outputs=[dict(id="dashboard-tabs", property="id")],
+        inputs=[dict(id="dashboard-tabs", property="value", value="tab-3")],
+        changedPropIds=["dashboard-tabs.value"],
+        state=[],
+    )
+    response = client.post(f"/_dash-update-component?cancelJob={job}", json=cancel_body)
+    assert response.status_code == 204
+    assert not dashboard.background_manager.job_running(job)
+
+    # Other callbacks run inline
+    inline_callbacks = [
+        callback["callback"].__name__
+        for callback in app.callback_map.values()
+        if callback.get("long") is None
+    ]
+    assert "update_screener" in inline_callbacks
+    assert not set(HEAVY_CALLBACKS.values()) & set(inline_callbacks)
+
+
+def test_dashboard_missing_deltas(dashboard):
+    # A company's first period has no previous period to compare against
+    company = dashboard.agg_companies[0]
+    first_label, second_label = dashboard.agg_dt_labels["M"][:2]
+    deltas = dashboard._find_period_deltas(company, "M", "price_mean", first_label)
+    assert [delta["pct_diff"] for delta in deltas] == ["n/a"] * 3
+    assert deltas[0]["value"] is None and deltas[0]["diff"] is None
+
+    deltas = dashboard._find_period_deltas(company, "M", "price_mean", second_label)
+    assert deltas[0]["pct_diff"].endswith("%") and deltas[0]["pct_diff"] != "nan%"
+    assert isinstance(deltas[0]["value"], float)
+
+    # Undefined changes between two points are shown as 'n/a' as well
+    point_df = pd.DataFrame(
+        {
+            "dt_label": [first_label, second_label],
+            "price_mean": [np.nan, 1.0],
+        }
+    )
+    point_diff = dashboard._find_point_diff(point_df, "price_mean")
+    assert point_diff["pct_diff"].to_list() == ["n/a"]
+    assert dashboard._table_records(point_diff) == [
+        {first_label: None, second_label: 1.0, "pct_diff": "n/a", "diff": None}
+    ]
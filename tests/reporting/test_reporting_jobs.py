@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+
+from src.reporting.jobs import ProcessJobManager
+from src.reporting.memo import memoize
+
+lock = threading.Lock()
+initialized = []
+
+
+def double(set_progress, value):
+    set_progress(f"doubling {value}")
+    if value is None:
+        raise ValueError("no value")
+    time.sleep(value)
+    return value * 2
+
+
+def locked(value):
+    with lock:
+        return value
+
+
+def initialize():
+    initialized.append(os.getpid())
+
+
+def worker_state():
+    return os.getpid(), len(initialized)
+
+
+@memoize("v1")
+def triple(value):
+    return value * 3
+
+
+def wait_for_result(manager, key, job, timeout=10):
+    start = time.time()
+    while time.time() - start < timeout:
+        result = manager.get_result(key, job)
+        if result is not manager.UNDEFINED:
+            return result
+        time.sleep(0.01)
+
+
+def test_process_job_manager(tmp_path):
+    manager = ProcessJobManager(tmp_path / "jobs")
+    job_fn = manager.make_job_fn(double, progress=True)
+
+    # Jobs report their progress and result, which are only read once
+    job = manager.call_job_fn("a", job_fn, [0.1], {})
+    assert manager.job_running(job)
+    while not manager.result_ready("a"):
+        time.sleep(0.01)
+    assert manager.get_progress("a") == ["doubling 0.1"]
+    assert manager.get_result("a", job) == 0.2
+    assert not manager.job_running(job)
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+    # Errors are reported as results
+    job = manager.call_job_fn("b", job_fn, [None], {})
+    assert (
+        "no value" in wait_for_result(manager, "b", job)["long_callback_error"]["msg"]
+    )
+
+    # Superseded or cancelled jobs are terminated without a result
+    job = manager.call_job_fn("c", job_fn, [60], {})
+    manager.terminate_job(job)
+    assert not manager.job_running(job)
+    assert manager.get_result("c", job) is manager.UNDEFINED
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+    # Jobs started by other dashboard workers are tracked through their markers
+    job = manager.call_job_fn("d", job_fn, [60], {})
+    other_manager = ProcessJobManager(tmp_path / "jobs")
+    assert other_manager.job_running(job)
+    other_manager.terminate_job(job)
+    assert not other_manager.job_running(job)
+    assert not manager.job_running(job)
+
+    # Jobs don't inherit locks held by other threads of the dashboard process
+    with lock:
+        job = manager.call_job_fn("e", manager.make_job_fn(locked, False), [1], {})
+        assert wait_for_result(manager, "e", job) == 1
+
+
+def test_process_job_manager_poll(tmp_path):
+    manager = ProcessJobManager(tmp_path / "jobs")
+    job_fn = manager.make_job_fn(double, progress=True)
+
+    # Jobs finishing between a poll's result and running checks, which dash
+    # makes in this order, still count as running until their result is read
+    job = manager.call_job_fn("a", job_fn, [0.2], {})
+    assert manager.get_result("a", job) is manager.UNDEFINED
+    while not manager.result_ready("a"):
+        time.sleep(0.01)
+    assert manager.job_running(job)
+    assert manager.get_result("a", job) == 0.4
+    assert not manager.job_running(job)
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+    # Results of done jobs that are superseded before being read are cleared
+    job = manager.call_job_fn("b", job_fn, [0], {})
+    while not manager.result_ready("b"):
+        time.sleep(0.01)
+    manager.terminate_job(job)
+    assert not manager.job_running(job)
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+
+def test_process_job_manager_reuse(tmp_path):
+    manager = ProcessJobManager(tmp_path / "jobs", initializer=initialize)
+    job_fn = manager.make_job_fn(worker_state, progress=False)
+
+    # Workers are initialized once, then reused by later jobs
+    job = manager.call_job_fn("a", job_fn, [], {})
+    pid, n_initialized = wait_for_result(manager, "a", job)
+    assert n_initialized == 1
+    job = manager.call_job_fn("b", job_fn, [], {})
+    assert wait_for_result(manager, "b", job) == (pid, 1)
+
+    # Workers busy with a job aren't given another one
+    busy_job = manager.call_job_fn("c", manager.make_job_fn(double, True), [60], {})
+    job = manager.call_job_fn("d", job_fn, [], {})
+    other_pid, n_initialized = wait_for_result(manager, "d", job)
+    assert other_pid != pid and n_initialized == 1
+    manager.terminate_job(busy_job)
+    assert list((tmp_path / "jobs").iterdir()) == []
+
+
+def test_process_job_manager_memoized(tmp_path):
+    manager = ProcessJobManager(tmp_path / "jobs")
+    job_fn = manager.make_job_fn(triple, progress=False)
+
+    # Memoized results are returned without running a job
+    assert triple(2) == 6
+    job = manager.call_job_fn("a", job_fn, [2], {})
+    assert manager.result_ready("a") and not manager.job_running(job)
+    assert manager.get_result("a", job) == 6
+    assert manager._workers == {}
+
+    # Others are computed by a worker
+    job = manager.call_job_fn("b", job_fn, [3], {})
+    assert wait_for_result(manager, "b", job) == 9
+    assert len(manager._workers) == 1
@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+
+from src.reporting.memo import data_version, memoize
+
+calls = []
+
+
+def filter_prices(company_name, start_date, columns=None):
+    calls.append(company_name)
+    return pd.DataFrame({"company_name": [company_name], "date": [start_date]})
+
+
+def test_memoize():
+    calls.clear()
+    cached = memoize("v1", maxsize=2)(filter_prices)
+
+    # Equivalent inputs share an entry
+    result = cached("A", "2021-01-01", columns=("price",))
+    assert cached("A", pd.Timestamp("2021-01-01"), columns=["price"]) is result
+    assert cached.cache_info() == dict(hits=1, disk_hits=0, misses=1, size=1)
+
+    # Least recently used entries are evicted beyond maxsize
+    cached("B", "2021-01-01")
+    cached("C", "2021-01-01")
+    cached("A", "2021-01-01", columns=["price"])
+    assert calls == ["A", "B", "C", "A"]
+
+    # Other data versions don't share entries
+    memoize("v2")(filter_prices)("A", "2021-01-01", columns=["price"])
+    assert calls == ["A", "B", "C", "A", "A"]
+
+
+def test_memoize_disk_store(tmp_path):
+    calls.clear()
+    cache_dir = tmp_path / "cache"
+
+    # Entries are shared with other processes through the disk store
+    result = memoize("v1", cache_dir=cache_dir)(filter_prices)("A", "2021-01-01")
+    cached = memoize("v1", cache_dir=cache_dir)(filter_prices)
+    pd.testing.assert_frame_equal(cached("A", "2021-01-01"), result)
+    assert calls == ["A"]
+    assert cached.cache_info()["disk_hits"] == 1
+
+    # Least recently used entries are evicted beyond the size budget
+    entry_bytes = sum(path.stat().st_size for path in cache_dir.glob("*.pkl"))
+    cached = memoize("v1", cache_dir=cache_dir, max_bytes=entry_bytes * 1.5)(
+        filter_prices
+    )
+    cached("B", "2021-01-01")
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+    cached.cache_clear()
+    cached("A", "2021-01-01")
+    assert calls == ["A", "B", "A"]
+
+    # Entries beyond the entry size limit are only cached in memory
+    cached = memoize("v1", cache_dir=cache_dir, max_entry_bytes=entry_bytes - 1)(
+        filter_prices
+    )
+    cached("C", "2021-01-01")
+    cached("C", "2021-01-01")
+    assert len(list(cache_dir.glob("*.pkl"))) == 1
+    assert calls == ["A", "B", "A", "C"]
+
+
+def test_memoize_disk_store_size(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    # The store is only scanned on first use and once over its size budget
+    cached = memoize("v1", cache_dir=cache_dir)(filter_prices)
+    cached("A", "2021-01-01")
+    cached("B", "2021-01-01")
+    assert len(scans) == 1
+
+    entry_bytes = max(path.stat().st_size for path in cache_dir.glob("*.pkl"))
+    scans.clear()
+    cached = memoize("v1", cache_dir=cache_dir, max_bytes=entry_bytes * 2.5)(
+        filter_prices
+    )
+    cached("C", "2021-01-01")
+    assert len(scans) == 1
+    assert len(list(cache_dir.glob("*.pkl"))) == 2
+
+
+def test_data_version(tmp_path):
+    path = tmp_path / "agg_by_freq.feather"
+    path.write_text("a")
+    version = data_version([path])
+    assert data_version([path]) == version
+
+    path.write_text("ab")
+    assert data_version([path]) != version
@@ -0,0 +1,260 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from src.feature.nodes import (
+    fea_aggregate,
+    fea_company_pivot,
+    fea_corr_stats,
+    fea_rolling,
+)
+from src.io import read_feather_mmap
+from src.reporting.queries import (
+    cluster_order,
+    company_corr,
+    index_dt_labels,
+    partition_rows,
+    query_agg,
+    query_rows,
+    rank_rows,
+    window_corr,
+)
+
+
+def load(df, tmp_path, mmap):
+    # Round trip through an uncompressed feather file to memory-map it
+    if not mmap:
+        return df
+    df.to_feather(tmp_path / "data.feather", compression="uncompressed")
+    return read_feather_mmap(tmp_path / "data.feather")
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_window_corr(tmp_path, mmap):
+    rng = np.random.default_rng(0)
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(["A", "B"], 50),
+            "symbol": np.repeat(["A", "B"], 50),
+            "date": np.tile(pd.date_range("2021-01-01", periods=25), 4),
+            "spend": rng.normal(1e6, 1, 100),
+            "price": rng.normal(size=100),
+            "web_data": rng.integers(0, 10, 100),
+        }
+    )
+    master_df.loc[::7, "price"] = np.nan
+    corr_stats = load(fea_corr_stats(master_df), tmp_path, mmap)
+    partitions = partition_rows(corr_stats, ["company_name"])
+
+    for start_date, end_date in [
+        ("2020-01-01", "2022-01-01"),
+        ("2021-01-05", "2021-01-15"),
+        ("2021-01-10", "2021-01-10"),
+    ]:
+        filtered_df = master_df[
+            (master_df["company_name"] == "B")
+            & (master_df["date"] >= start_date)
+            & (master_df["date"] <= end_date)
+        ]
+        assert_frame_equal(
+            window_corr(corr_stats, partitions, "B", start_date, end_date),
+            filtered_df.corr(numeric_only=True),
+        )
+
+    # Unknown or cleared companies have an empty matrix
+    for company_name in ["C", None]:
+        assert window_corr(
+            corr_stats, partitions, company_name, "2021-01-01", "2021-01-31"
+        ).empty
+
+
+# pandas warns about windows with fewer than two observations
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_window_corr_series():
+    # Company B has gaps between dates, including a long one, and missing values
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2021-01-01", periods=60)
+    b_dates = dates[
+        (dates.day % 5 != 0) & ((dates < "2021-01-20") | (dates > "2021-02-05"))
+    ]
+    master_df = pd.DataFrame(
+        {
+            "company_name": ["A"] * len(dates) + ["B"] * len(b_dates),
+            "date": dates.append(b_dates),
+        }
+    )
+    master_df["symbol"] = master_df["company_name"]
+    master_df["spend"] = rng.normal(1e5, 1e3, len(master_df))
+    master_df["price"] = rng.lognormal(4, 0.1, len(master_df))
+    master_df["web_data"] = rng.integers(0, 100, len(master_df)).astype(float)
+    is_b = master_df["company_name"] == "B"
+    master_df.loc[
+        is_b & master_df["date"].between("2021-02-10", "2021-02-15"), "price"
+    ] = np.nan
+    master_df.loc[master_df.index[is_b][::4], "web_data"] = np.nan
+    corr_stats = fea_corr_stats(master_df)
+    partitions = partition_rows(corr_stats, ["company_name"])
+
+    # Every pair matches pandas over pairwise complete observations, where
+    # windows with fewer than two of them have no correlation
+    metrics = ["spend", "price", "web_data"]
+    for company_name in ["A", "B"]:
+        for start_date, end_date in [
+            ("2020-12-01", "2021-12-31"),
+            ("2020-12-01", "2021-01-03"),
+            ("2021-01-18", "2021-02-08"),
+            ("2021-01-21", "2021-02-04"),
+            ("2021-02-09", "2021-02-16"),
+            ("2021-03-01", "2021-03-01"),
+        ]:
+            result = window_corr(
+                corr_stats, partitions, company_name, start_date, end_date
+            )
+            filtered_df = master_df[
+                (master_df["company_name"] == company_name)
+                & master_df["date"].between(start_date, end_date)
+            ]
+            for x in metrics:
+                for y in metrics:
+                    np.testing.assert_allclose(
+                        result.loc[x, y],
+                        filtered_df[x].corr(filtered_df[y]),
+                        rtol=1e-8,
+                        err_msg=f"{company_name} {start_date} {end_date} {x} {y}",
+                    )
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_query_agg(tmp_path, mmap):
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(["B", "A"], 60),
+            "symbol": np.repeat(["B", "A"], 60),
+            "date": np.tile(pd.date_range("2021-01-01", periods=60), 2),
+            "spend": np.arange(120),
+        }
+    )
+    agg_df = fea_aggregate(master_df, ["M", "W", "D"])
+    agg_data = load(agg_df, tmp_path, mmap)
+    partitions = partition_rows(agg_data, ["company_name", "agg_freq"])
+
+    for company_name, agg_freq, start_date, end_date in [
+        ("A", "W", "2021-01-10", "2021-02-07"),
+        ("B", "D", "2021-02-01", "2021-02-01"),
+        ("B", "M", None, None),
+        ("C", "M", None, None),
+    ]:
+        expected = agg_df[
+            (agg_df["company_name"] == company_name)
+            & (agg_df["agg_freq"] == agg_freq)
+            & (agg_df["date"] >= (start_date or agg_df["date"].min()))
+            & (agg_df["date"] <= (end_date or agg_df["date"].max()))
+        ]
+        result = query_agg(
+            agg_data, partitions, company_name, agg_freq, start_date, end_date
+        )
+        assert_frame_equal(
+            result.reset_index(drop=True), expected.reset_index(drop=True)
+        )
+
+    assert index_dt_labels(agg_data)["M"] == ["2021 M1", "2021 M2", "2021 M3"]
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_query_rows(tmp_path, mmap):
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(["B", "A"], 30),
+            "symbol": np.repeat(["B", "A"], 30),
+            "date": np.tile(pd.date_range("2021-01-01", periods=30), 2),
+            "price": np.arange(1, 61, dtype=float),
+        }
+    )
+    rolling_df = fea_rolling(master_df, [5], metrics=["price"])
+    rolling_data = load(rolling_df, tmp_path, mmap)
+    partitions = partition_rows(rolling_data, ["company_name"])
+
+    result = query_rows(
+        rolling_data, partitions, "B", "2021-01-10", "2021-01-20", ["price_mean_5"]
+    )
+    expected = rolling_df.loc[
+        (rolling_df["company_name"] == "B")
+        & rolling_df["date"].between("2021-01-10", "2021-01-20"),
+        ["price_mean_5"],
+    ]
+    assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+    assert query_rows(rolling_data, partitions, "C").empty
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_rank_rows(tmp_path, mmap):
+    rng = np.random.default_rng(0)
+    companies = [f"Company {i:02d}" for i in range(30)]
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(companies, 90),
+            "symbol": np.repeat(companies, 90),
+            "date": np.tile(pd.date_range("2021-01-01", periods=90), 30),
+            "spend": rng.integers(0, 5, 30 * 90).astype(float),
+        }
+    )
+    master_df.loc[master_df["company_name"] == "Company 03", "spend"] = np.nan
+    agg_df = fea_aggregate(master_df, ["M"], deltas=["sum"])
+    agg_data = load(agg_df, tmp_path, mmap)
+    partitions = partition_rows(agg_data, ["agg_freq", "dt_label"])
+
+    period_df = agg_df[(agg_df["dt_label"] == "2021 M2")].dropna(subset="spend_sum")
+    for metric, ascending in [("spend_sum", False), ("spend_sum_prev_pct", True)]:
+        result = rank_rows(
+            agg_data,
+            partitions,
+            ("M", "2021 M2"),
+            metric,
+            n=5,
+            ascending=ascending,
+            columns=["company_name", metric],
+        )
+        expected = period_df.sort_values(metric, ascending=ascending, kind="stable")
+        assert_frame_equal(
+            result,
+            expected[["company_name", metric]].head(5).reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    assert rank_rows(agg_data, partitions, ("M", "2022 M1"), "spend_sum").empty
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_company_corr(tmp_path, mmap):
+    # Companies in three groups driven by common factors, with gaps
+    rng = np.random.default_rng(0)
+    companies = [f"Company {i:02d}" for i in range(12)]
+    groups = rng.permutation(np.repeat([0, 1, 2], 4))
+    dates = pd.date_range("2021-01-01", periods=100)
+    values = rng.normal(size=(100, 3))[:, groups] + 0.3 * rng.normal(size=(100, 12))
+    master_df = pd.DataFrame(
+        {
+            "company_name": np.repeat(companies, 100),
+            "date": np.tile(dates, 12),
+            "price": values.T.ravel(),
+        }
+    ).sample(frac=0.9, random_state=0)
+    master_df.loc[master_df["company_name"] == "Company 05", "price"] = 1.0
+    pivot_df = fea_company_pivot(master_df, ["price"])
+    pivot_data = load(pivot_df, tmp_path, mmap)
+    partitions = partition_rows(pivot_data, ["metric"])
+
+    result = company_corr(pivot_data, partitions, "price", "2021-01-10", "2021-03-01")
+    window_df = pivot_df[pivot_df["date"].between("2021-01-10", "2021-03-01")]
+    assert_frame_equal(result, window_df[companies].corr(), check_names=False)
+
+    # Correlated companies are ordered next to each other
+    order = cluster_order(result.drop(index="Company 05", columns="Company 05"))
+    company_groups = dict(zip(companies, groups))
+    ordered_groups = [company_groups[company] for company in order]
+    assert sum(a != b for a, b in zip(ordered_groups, ordered_groups[1:])) == 2
+
+    # Matrices without pairs to merge keep their order
+    assert cluster_order(result.iloc[:0, :0]) == []
+    assert cluster_order(result.iloc[:1, :1]) == ["Company 00"]
@@ -0,0 +1,119 @@
+import importlib
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.cache import path_size, run_cached
+from src.io import read_feather_mmap, write_feather
+
+
+def copy_upper(args):
+    # Write the upper-cased content of the input
+    Path(args["output"]).write_text(Path(args["input"]).read_text().upper())
+
+
+def test_run_cached(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (tmp_path / "raw.txt").write_text("abc")
+    args = dict(input=tmp_path / "raw.txt", output=tmp_path / "out.txt")
+
+    assert not run_cached(copy_upper, args, cache_dir)
+    (tmp_path / "out.txt").unlink()
+
+    # Unchanged inputs restore the output from the cache
+    assert run_cached(copy_upper, args, cache_dir)
+    assert (tmp_path / "out.txt").read_text() == "ABC"
+
+    # Changed inputs or parameters rerun the node
+    (tmp_path / "raw.txt").write_text("abcd")
+    assert not run_cached(copy_upper, args, cache_dir)
+    assert (tmp_path / "out.txt").read_text() == "ABCD"
+    assert not run_cached(copy_upper, dict(args, sep=","), cache_dir)
+
+    # Parameters keyed by paths, e.g., input_columns, are part of the key too
+    columns_args = dict(args, input_columns={tmp_path / "raw.txt": ["a"]})
+    assert not run_cached(copy_upper, columns_args, cache_dir)
+    assert run_cached(copy_upper, columns_args, cache_dir)
+
+
+def test_run_cached_helper_edit(tmp_path, monkeypatch):
+    # A node calling a helper defined in another project module
+    cache_dir = tmp_path / "cache"
+    (tmp_path / "cached_helpers.py").write_text(
+        "def transform(text):\n    return text\n"
+    )
+    (tmp_path / "cached_nodes.py").write_text(
+        "from pathlib import Path\n"
+        "\n"
+        "from cached_helpers import transform\n"
+        "\n"
+        "\n"
+        "def transform_file(args):\n"
+        "    text = Path(args['input']).read_text()\n"
+        "    Path(args['output']).write_text(transform(text))\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    transform_file = importlib.import_module("cached_nodes").transform_file
+
+    (tmp_path / "raw.txt").write_text("abc")
+    args = dict(input=tmp_path / "raw.txt", output=tmp_path / "out.txt")
+    assert not run_cached(transform_file, args, cache_dir)
+    assert run_cached(transform_file, args, cache_dir)
+
+    # Editing the helper invalidates the cached output of the node
+    (tmp_path / "cached_helpers.py").write_text(
+        "def transform(text):\n    return text.upper()\n"
+    )
+    assert not run_cached(transform_file, args, cache_dir)
+
+
+def test_run_cached_eviction(tmp_path):
+    cache_dir = tmp_path / "cache"
+    for name in ["a", "b"]:
+        (tmp_path / f"{name}.txt").write_text(name * 10)
+        args = dict(input=tmp_path / f"{name}.txt", output=tmp_path / f"{name}.out")
+        run_cached(copy_upper, args, cache_dir, max_bytes=15)
+
+    # Only the most recently used entry fits the budget
+    args = dict(input=tmp_path / "a.txt", output=tmp_path / "a.out")
+    assert not run_cached(copy_upper, args, cache_dir, max_bytes=15)
+    assert run_cached(copy_upper, args, cache_dir, max_bytes=15)
+
+
+def write_range(args):
+    # Write a frame of the length read from the input
+    n = int(Path(args["input"]).read_text())
+    write_feather(
+        pd.DataFrame({"value": range(n)}), args["output"], compression="uncompressed"
+    )
+
+
+def test_run_cached_while_mapped(tmp_path):
+    cache_dir = tmp_path / "cache"
+    output = tmp_path / "out.feather"
+    (tmp_path / "n.txt").write_text("1000")
+    args = dict(input=tmp_path / "n.txt", output=output)
+    run_cached(write_range, args, cache_dir)
+
+    # Restoring a mapped output replaces it, where the mapping keeps the old data
+    (tmp_path / "n.txt").write_text("10")
+    run_cached(write_range, args, cache_dir)
+    table = read_feather_mmap(output)
+    (tmp_path / "n.txt").write_text("1000")
+    assert run_cached(write_range, args, cache_dir)
+    assert table.column("value").to_pylist() == list(range(10))
+    assert read_feather_mmap(output).num_rows == 1000
+
+
+def test_path_size(tmp_path):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "a.txt").write_text("abc")
+    (tmp_path / "data" / "b.txt").write_text("de")
+    assert path_size(tmp_path / "data" / "a.txt") == 3
+    assert path_size(tmp_path / "data") == 5
+
+    # Missing paths count as empty only if asked to
+    assert path_size(tmp_path / "missing.txt", missing_ok=True) == 0
+    with pytest.raises(FileNotFoundError):
+        path_size(tmp_path / "missing.txt")
@@ -0,0 +1,273 @@
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+from pandas.testing import assert_frame_equal
+
+from src.io import (
+    append_changes,
+    clear_changes,
+    compact_dtypes,
+    feather_batch_offsets,
+    hash_feather_rows,
+    read_changes,
+    read_dataset,
+    read_feather,
+    read_feather_metadata,
+    read_feather_mmap,
+    read_feather_rows,
+    run_node,
+    write_dataset,
+    write_feather,
+)
+from src.metrics import peak_memory
+
+
+@pytest.fixture
+def agg_df():
+    dates = pd.date_range("2021-01-01", periods=40)
+    return pd.DataFrame(
+        {
+            "date": dates.repeat(6),
+            "company_name": list("ABC") * 80,
+            "agg_freq": (["D"] * 3 + ["M"] * 3) * 40,
+            "price_mean": range(240),
+        }
+    )
+
+
+def test_read_dataset(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.parquet"
+    write_dataset(
+        agg_df, path, ["agg_freq", "company_bucket"], n_buckets=2, rows_per_group=8
+    )
+
+    # Round trip restores rows, column order, and compact dtypes
+    result = read_dataset(path).sort_values(["date", "agg_freq", "company_name"])
+    assert_frame_equal(
+        result.reset_index(drop=True),
+        compact_dtypes(
+            agg_df.sort_values(["date", "agg_freq", "company_name"])
+        ).reset_index(drop=True),
+    )
+
+    result = read_dataset(
+        path,
+        columns=["date", "price_mean"],
+        company_name=["B"],
+        agg_freq="M",
+        start_date="2021-01-10",
+        end_date="2021-01-12",
+    )
+    expected = agg_df[
+        (agg_df["company_name"] == "B")
+        & (agg_df["agg_freq"] == "M")
+        & (agg_df["date"] >= "2021-01-10")
+        & (agg_df["date"] <= "2021-01-12")
+    ][["date", "price_mean"]]
+    assert_frame_equal(result, expected.reset_index(drop=True))
+
+
+def test_write_dataset_partitions(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.parquet"
+    write_dataset(agg_df, path, ["agg_freq", "company_bucket"], n_buckets=2)
+
+    # Each company lives in a single bucket across frequencies
+    partitions_df = (
+        ds.dataset(path, partitioning="hive")
+        .to_table(columns=["company_name", "agg_freq", "company_bucket"])
+        .to_pandas()
+    )
+    assert (
+        partitions_df.groupby("company_name")["company_bucket"].nunique() == 1
+    ).all()
+    assert len(list(path.glob("agg_freq=*/company_bucket=*/*.parquet"))) == len(
+        partitions_df.drop_duplicates(["agg_freq", "company_bucket"])
+    )
+
+    with pytest.raises(ValueError, match="n_buckets"):
+        write_dataset(agg_df, path, ["company_bucket"])
+
+
+def test_write_dataset_companies(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.parquet"
+    write_dataset(agg_df, path, ["agg_freq", "company_bucket"], n_buckets=2)
+    files = {file: file.stat().st_ino for file in path.rglob("*.parquet")}
+
+    # Only the bucket of a changed company is rewritten
+    updated_df = agg_df[(agg_df["company_name"] != "B") | (agg_df["date"].dt.day > 1)]
+    updated_df = updated_df.assign(
+        price_mean=updated_df["price_mean"].where(updated_df["company_name"] != "B", 0)
+    )
+    write_dataset(
+        updated_df,
+        path,
+        ["agg_freq", "company_bucket"],
+        n_buckets=2,
+        companies=["B"],
+    )
+    sort_cols = ["date", "agg_freq", "company_name"]
+    assert_frame_equal(
+        read_dataset(path).sort_values(sort_cols).reset_index(drop=True),
+        compact_dtypes(updated_df.sort_values(sort_cols)).reset_index(drop=True),
+    )
+    unchanged = [
+        file for file in path.rglob("*.parquet") if file.stat().st_ino == files[file]
+    ]
+    assert 0 < len(unchanged) < len(files)
+
+    # Rows not fitting the previous schema rewrite the whole dataset instead
+    updated_df = updated_df.assign(
+        price_mean=updated_df["price_mean"].mask(
+            updated_df["company_name"] == "B", 100000
+        )
+    )
+    write_dataset(
+        updated_df,
+        path,
+        ["agg_freq", "company_bucket"],
+        n_buckets=2,
+        companies=["B"],
+    )
+    assert_frame_equal(
+        read_dataset(path).sort_values(sort_cols).reset_index(drop=True),
+        compact_dtypes(updated_df.sort_values(sort_cols)).reset_index(drop=True),
+    )
+
+
+def test_write_feather_sorted(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.feather"
+    write_feather(agg_df, path, sort_cols=["company_name", "date"])
+
+    # The sort order is recorded alongside the sorted rows
+    result = read_feather(path)
+    assert result.attrs["sorted_by"] == ["company_name", "date"]
+    assert_frame_equal(
+        result,
+        compact_dtypes(
+            agg_df.sort_values(["company_name", "date"], kind="stable")
+        ).reset_index(drop=True),
+    )
+
+    write_feather(agg_df, path)
+    assert read_feather(path).attrs == {}
+
+
+def test_write_feather_while_mapped(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.feather"
+    write_feather(agg_df, path, compression="uncompressed")
+    table = read_feather_mmap(path)
+
+    # Rewriting a mapped file replaces it, where the mapping keeps the old data
+    write_feather(agg_df.head(10), path, compression="uncompressed")
+    assert table.column("price_mean").to_pylist() == list(range(240))
+    assert len(read_feather(path)) == 10
+    assert [file.name for file in tmp_path.iterdir()] == [path.name]
+
+
+def test_read_feather_rows(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.feather"
+    agg_df.to_feather(path, chunksize=100)
+    offsets = feather_batch_offsets(path)
+    assert offsets.tolist() == [0, 100, 200, 240]
+
+    # Runs of rows and scattered rows are read from the batches holding them
+    for positions in [range(150, 240), [0, 99, 100, 239], []]:
+        assert_frame_equal(
+            read_feather_rows(path, positions, offsets),
+            agg_df.iloc[list(positions)].reset_index(drop=True),
+            check_index_type=False,
+        )
+    assert_frame_equal(read_feather_rows(path, range(240)), agg_df)
+
+
+def test_hash_feather_rows(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.feather"
+    agg_df.to_feather(path, chunksize=100)
+    hashes = hash_feather_rows(path, [150, 240, 0, 241])
+    assert hashes[2:] == [None, None]
+
+    # Hashes of the same rows don't depend on their record batches
+    agg_df.iloc[:150].to_feather(path, chunksize=64)
+    assert hash_feather_rows(path, [150]) == hashes[:1]
+
+    # Any rewritten row changes the hash
+    agg_df.iloc[:150].assign(
+        price_mean=lambda df: df["price_mean"].where(df.index != 77, -1)
+    ).to_feather(path, chunksize=64)
+    assert hash_feather_rows(path, [150]) != hashes[:1]
+
+
+def test_change_log(tmp_path, agg_df):
+    path = tmp_path / "agg_by_freq.feather"
+    write_feather(agg_df, path, metadata=dict(version="1"))
+    assert read_feather_metadata(path)["version"] == "1"
+    assert read_changes(path, "1").empty
+    assert read_changes(path, None) is None
+
+    # Changes of consecutive versions accumulate
+    write_feather(agg_df, path, metadata=dict(version="2"))
+    append_changes(path, agg_df.head(2), "1", "2")
+    write_feather(agg_df, path, metadata=dict(version="3"))
+    append_changes(path, agg_df.tail(1), "2", "3")
+    assert_frame_equal(
+        read_changes(path, "1"),
+        compact_dtypes(agg_df.iloc[[0, 1, -1]]).reset_index(drop=True),
+    )
+
+    # Changes since other versions aren't known
+    assert read_changes(path, "2") is None
+    clear_changes(path)
+    assert read_changes(path, "1") is None
+    assert [file.name for file in tmp_path.iterdir()] == [path.name]
+
+
+def test_compact_dtypes(tmp_path, agg_df):
+    df = agg_df.assign(month=agg_df["date"].dt.month, price_mean=0.1)
+    result = compact_dtypes(df)
+
+    # Strings become categoricals with sorted categories, integers are downcast
+    assert result["company_name"].cat.categories.to_list() == ["A", "B", "C"]
+    assert result["agg_freq"].dtype == "category"
+    assert result["month"].dtype == "int8"
+    assert result["price_mean"].dtype == "float64"
+    assert df["company_name"].dtype == object
+    assert_frame_equal(result.astype(df.dtypes), df)
+
+    # Categoricals survive round trips, and filters and concats are compacted again
+    path = tmp_path / "agg_by_freq.feather"
+    write_feather(result, path)
+    assert_frame_equal(read_feather(path), result)
+
+    concat_df = pd.concat([result[result["company_name"] == "C"], df.iloc[:1]])
+    write_feather(concat_df.reset_index(drop=True), path)
+    assert read_feather(path)["company_name"].cat.categories.to_list() == ["A", "C"]
+
+
+@pytest.mark.parametrize("copy_free", [True, False])
+def test_run_node_input_columns(tmp_path, agg_df, copy_free):
+    left_path, right_path = tmp_path / "left.feather", tmp_path / "right.feather"
+    write_feather(agg_df, left_path)
+    write_feather(agg_df, right_path)
+
+    def read_columns(left_df, right_df):
+        return pd.DataFrame(
+            {"columns": [left_df.columns.to_list(), right_df.columns.to_list()]}
+        )
+
+    run_node(
+        dict(
+            function=read_columns,
+            inputs=[left_path, right_path],
+            output=tmp_path / "columns.feather",
+            input_columns={right_path: ["date", "price_mean"]},
+            copy_free=copy_free,
+        )
+    )
+
+    # Only declared columns are read in copy-free mode
+    result = read_feather(tmp_path / "columns.feather")["columns"]
+    assert list(result[0]) == agg_df.columns.to_list()
+    assert list(result[1]) == (
+        ["date", "price_mean"] if copy_free else agg_df.columns.to_list()
+    )
+    assert peak_memory() > 0
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.io import run_node, write_feather
+from src.metrics import read_run_log, run_instrumented
+from src.scheduler import run_dag
+
+
+def double_price(df):
+    return df.assign(price=df["price"] * 2)
+
+
+def fail(args):
+    raise RuntimeError("node failed")
+
+
+def test_run_instrumented(tmp_path):
+    run_log = tmp_path / "logs" / "run_log.jsonl"
+    input_path = tmp_path / "prices.feather"
+    write_feather(pd.DataFrame({"price": [1.0, 2.0, 3.0]}), input_path)
+    step = dict(
+        function=double_price, inputs=[input_path], output=tmp_path / "out.feather"
+    )
+
+    record = run_instrumented(
+        run_node, step, run_log, run_id="run-1", profile_dir=tmp_path / "profiles"
+    )
+
+    # Rows, bytes, and phases of the node are recorded
+    assert record["node"] == "double_price[out]"
+    assert record["input_rows"] == record["output_rows"] == 3
+    assert record["input_bytes"] == input_path.stat().st_size
+    assert record["output_bytes"] == (tmp_path / "out.feather").stat().st_size
+    assert set(record["phases"]) == {"read", "compute", "write"}
+    assert record["wall_seconds"] >= sum(
+        phase["wall_seconds"] for phase in record["phases"].values()
+    )
+    assert Path(record["profile"]).exists()
+
+    # Failures are recorded before being raised
+    with pytest.raises(RuntimeError, match="node failed"):
+        run_instrumented(fail, dict(inputs=[], output=tmp_path / "x"), run_log)
+
+    run_log_df = read_run_log(run_log)
+    assert run_log_df["node"].to_list() == ["double_price[out]", "fail[x]"]
+    assert run_log_df["status"].to_list() == ["ok", "error"]
+    assert run_log_df.loc[0, "phases.compute.wall_seconds"] > 0
+    assert len(read_run_log(run_log, run_id="run-1")) == 1
+
+
+def test_run_dag_run_log(tmp_path):
+    run_log = tmp_path / "run_log.jsonl"
+    write_feather(pd.DataFrame({"price": [1.0]}), tmp_path / "a.feather")
+    nodes = [
+        (
+            run_node,
+            dict(
+                function=double_price,
+                inputs=[tmp_path / f"{source}.feather"],
+                output=tmp_path / f"{target}.feather",
+            ),
+        )
+        for source, target in [("a", "b"), ("b", "c")]
+    ]
+
+    # Nodes run in worker processes append to the same run log
+    run_dag(nodes, max_workers=2, run_log=run_log)
+    run_log_df = read_run_log(run_log, run_id="latest")
+    assert run_log_df["node"].to_list() == ["double_price[b]", "double_price[c]"]
+    assert run_log_df["run_id"].nunique() == 1
+    assert (run_log_df["output_rows"] == 1).all()
@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+
+from src.scheduler import run_dag
+
+
+def concat_files(args):
+    # Write the concatenated contents of the inputs, tagged with the node name
+    contents = [Path(path).read_text() for path in args["inputs"]]
+    Path(args["output"]).write_text("+".join(contents) + args["name"])
+
+
+def test_run_dag(tmp_path):
+    (tmp_path / "raw.txt").write_text("raw-")
+    nodes = [
+        # Declared before its upstream nodes on purpose
+        (
+            concat_files,
+            dict(
+                inputs=[tmp_path / "a" / "a.txt", tmp_path / "b" / "b.txt"],
+                output=tmp_path / "c" / "c.txt",
+                name="c",
+            ),
+        ),
+        (
+            concat_files,
+            dict(
+                inputs=[tmp_path / "raw.txt"], output=tmp_path / "a" / "a.txt", name="a"
+            ),
+        ),
+        (
+            concat_files,
+            dict(
+                inputs=[tmp_path / "raw.txt"], output=tmp_path / "b" / "b.txt", name="b"
+            ),
+        ),
+    ]
+
+    run_dag(nodes, max_workers=2)
+    assert (tmp_path / "c" / "c.txt").read_text() == "raw-a+raw-bc"
+
+
+def record_workers(args):
+    # Write the number of workers the node was given
+    Path(args["output"]).write_text(str(args.get("max_workers")))
+
+
+def test_run_dag_max_workers(tmp_path):
+    (tmp_path / "raw.txt").write_text("raw-")
+    nodes = [
+        (
+            concat_files,
+            dict(inputs=[tmp_path / "raw.txt"], output=tmp_path / "a.txt", name="a"),
+        ),
+        (
+            record_workers,
+            dict(
+                inputs=[tmp_path / "raw.txt"],
+                output=tmp_path / "b.txt",
+                executor="process",
+                max_workers=8,
+            ),
+        ),
+        (
+            record_workers,
+            dict(
+                inputs=[tmp_path / "a.txt", tmp_path / "b.txt"],
+                output=tmp_path / "c.txt",
+                executor="process",
+            ),
+        ),
+    ]
+
+    # Nodes with their own executor get the cores left free by other nodes, even
+    # if their step asks for more
+    run_dag(nodes, max_workers=3)
+    assert (tmp_path / "b.txt").read_text() == "2"
+    assert (tmp_path / "c.txt").read_text() == "3"
+
+
+def test_run_dag_max_workers_none(tmp_path):
+    (tmp_path / "raw.txt").write_text("raw-")
+    nodes = [
+        (
+            record_workers,
+            dict(
+                inputs=[tmp_path / "raw.txt"],
+                output=tmp_path / "a.txt",
+                executor="process",
+                max_workers=None,
+            ),
+        ),
+    ]
+
+    # An explicit None, the default of the nodes' parameter, means all free cores
+    run_dag(nodes, max_workers=2)
+    assert (tmp_path / "a.txt").read_text() == "2"
+
+
+def test_run_dag_cycle(tmp_path):
+    nodes = [
+        (
+            concat_files,
+            dict(inputs=[tmp_path / "a.txt"], output=tmp_path / "b.txt", name="b"),
+        ),
+        (
+            concat_files,
+            dict(inputs=[tmp_path / "b.txt"], output=tmp_path / "a.txt", name="a"),
+        ),
+    ]
+
+    with pytest.raises(ValueError, match="cyclic"):
+        run_dag(nodes, max_workers=1)